@@ -0,0 +1,155 @@
+"""
+Bulk CSV import of expenses.
+
+Users, items, categories, brands and shops are resolved once per batch:
+the distinct names in the batch are fetched with one query per lookup
+table and missing items/categories/brands/shops are bulk-created. Rows are
+then validated against those in-memory maps and written with
+``bulk_create``, so an upload costs a few queries per batch instead of five
+lookups plus a serializer round trip per row.
+"""
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Expense, Category, Item, Brand, Shop
+
+User = get_user_model()
+
+REQUIRED_HEADERS = ["Date", "Item", "Category", "Brand", "Shop", "Qty", "Unit", "Price", "Remarks", "Who"]
+
+EXPENSE_BATCH_SIZE = 500
+
+# Name lookup tables: row column -> (model, default when blank)
+LOOKUPS = {
+    "Item": (Item, None),
+    "Category": (Category, None),
+    "Brand": (Brand, "N.A"),
+    "Shop": (Shop, "N.A"),
+}
+
+# Expense fields validated by the lookups above rather than by clean_fields()
+_RESOLVED_FIELDS = ["who_spent", "item", "category", "brand", "shop", "rate"]
+
+
+def _resolve_names(model, names, cache):
+    """Fill ``cache`` (name -> id) for ``names``, bulk-creating the missing ones."""
+    missing = set(names) - cache.keys()
+    if not missing:
+        return
+    cache.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+    new = missing - cache.keys()
+    if new:
+        model.objects.bulk_create([model(name=name) for name in new], ignore_conflicts=True)
+        cache.update(model.objects.filter(name__in=new).values_list('name', 'id'))
+
+
+def _resolve_users(usernames, cache):
+    missing = set(usernames) - cache.keys()
+    if missing:
+        field = User.USERNAME_FIELD
+        cache.update(User.objects.filter(**{f"{field}__in": missing}).values_list(field, 'id'))
+
+
+def _parse_row(i, row, errors):
+    """Return the stripped values of a row, or None after recording why it is invalid."""
+    values = {column: (row.get(column) or "").strip() for column in REQUIRED_HEADERS}
+
+    if not values["Item"] or not values["Category"] or not values["Who"]:
+        errors.append((i, f"Row {i}: 'Item', 'Category', and 'Who' are required."))
+        return None
+
+    missing = [field for field in ["Date", "Qty", "Unit", "Price"] if not row.get(field)]
+    if missing:
+        errors.append((i, f"Row {i}: Missing required fields: {missing}"))
+        return None
+
+    for column, (model, default) in LOOKUPS.items():
+        values[column] = values[column] or default
+        max_length = model._meta.get_field('name').max_length
+        if len(values[column]) > max_length:
+            errors.append((i, f"Row {i}: '{column}' must be at most {max_length} characters."))
+            return None
+
+    return values
+
+
+def _build_expenses(batch, caches, errors):
+    """Resolve a batch of parsed rows and return the valid, unsaved Expense objects."""
+    _resolve_users({values["Who"] for _, values in batch}, caches["Who"])
+    for column, (model, _) in LOOKUPS.items():
+        _resolve_names(model, {values[column] for _, values in batch}, caches[column])
+
+    expenses = []
+    for i, values in batch:
+        user_id = caches["Who"].get(values["Who"])
+        if user_id is None:
+            errors.append((i, f"Row {i}: User '{values['Who']}' does not exist."))
+            continue
+
+        expense = Expense(
+            who_spent_id=user_id,
+            item_id=caches["Item"][values["Item"]],
+            category_id=caches["Category"][values["Category"]],
+            brand_id=caches["Brand"][values["Brand"]],
+            shop_id=caches["Shop"][values["Shop"]],
+            date_of_purchase=values["Date"],
+            quantity=values["Qty"],
+            unit=values["Unit"],
+            price=values["Price"],
+            remarks=values["Remarks"] or "N.A",
+        )
+        try:
+            expense.clean_fields(exclude=_RESOLVED_FIELDS)
+            if expense.quantity <= 0:
+                raise ValidationError({"quantity": ["Quantity must be greater than 0."]})
+        except ValidationError as e:
+            errors.append((i, f"Row {i}: {e.message_dict}"))
+            continue
+
+        # bulk_create bypasses Expense.save(), so compute the rate here
+        expense.rate = expense.price / expense.quantity
+        expenses.append(expense)
+    return expenses
+
+
+def import_expenses(reader, batch_size=EXPENSE_BATCH_SIZE, progress=None):
+    """
+    Import expenses from a csv.DictReader-like iterable of rows.
+
+    The import is all-or-nothing: returns ``(created_count, errors)`` and
+    nothing is written when ``errors`` is non-empty. ``progress``, if given,
+    is called with the running counts after every batch.
+    """
+    caches = {column: {} for column in ["Who", *LOOKUPS]}
+    created_count = 0
+    rows_processed = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal created_count
+        expenses = _build_expenses(batch, caches, errors)
+        if not errors:
+            Expense.objects.bulk_create(expenses)
+            created_count += len(expenses)
+        batch.clear()
+        if progress:
+            progress(rows_processed=rows_processed, created=created_count, failed=len(errors))
+
+    with transaction.atomic():
+        for i, row in enumerate(reader, start=1):
+            rows_processed = i
+            values = _parse_row(i, row, errors)
+            if values is not None:
+                batch.append((i, values))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        if errors:
+            transaction.set_rollback(True)
+            return 0, [message for _, message in sorted(errors, key=lambda error: error[0])]
+
+    return created_count, []
@@ -1,3 +1,67 @@
+import csv
+import io
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .importers import REQUIRED_HEADERS, import_expenses
+from .models import Brand, Expense, Item, Shop
+
+User = get_user_model()
+
+
+def expense_rows(*rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REQUIRED_HEADERS)
+    writer.writerows(rows)
+    buffer.seek(0)
+    return csv.DictReader(buffer)
+
+
+class ImportExpensesTests(TestCase):
+    """Expense CSVs are resolved per batch and written all-or-nothing."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='buyer@example.com', password='x')
+        Item.objects.create(name='Cement')
+
+    def row(self, item='Cement', qty='4', price='10', who=None, brand='', shop=''):
+        return ['2024-01-01', item, 'Materials', brand, shop, qty, 'kg', price, '', who or self.user.email]
+
+    def test_rows_are_created_with_their_lookups(self):
+        created, errors = import_expenses(expense_rows(
+            self.row(), self.row(item='Sand', brand='Acme'), self.row(item='Sand', qty='3', price='10'),
+        ), batch_size=2)
+
+        self.assertEqual((created, errors), (3, []))
+        self.assertEqual(Item.objects.filter(name__in=['Cement', 'Sand']).count(), 2)
+        self.assertEqual(sorted(Brand.objects.values_list('name', flat=True)), ['Acme', 'N.A'])
+        self.assertEqual(Shop.objects.get().name, 'N.A')
+        # bulk_create skips Expense.save(), so the importer computes the rate
+        rates = sorted(Expense.objects.values_list('rate', flat=True))
+        self.assertEqual(rates, [Decimal('2.50'), Decimal('2.50'), Decimal('3.33')])
+
+    def test_any_error_rolls_back_the_upload(self):
+        created, errors = import_expenses(expense_rows(
+            self.row(), self.row(who='nobody@example.com'), self.row(qty='0'), self.row(item=''),
+        ), batch_size=2)
+
+        self.assertEqual(created, 0)
+        self.assertEqual([error.split(':')[0] for error in errors], ['Row 2', 'Row 3', 'Row 4'])
+        self.assertIn("User 'nobody@example.com' does not exist.", errors[0])
+        self.assertFalse(Expense.objects.exists())
 
-# Create your tests here.
+    def test_query_count_does_not_grow_with_rows(self):
+        # Create the category, brand and shop first so both runs only look them up
+        import_expenses(expense_rows(self.row()))
+        with CaptureQueriesContext(connection) as few:
+            import_expenses(expense_rows(*[self.row() for _ in range(3)]))
+        with CaptureQueriesContext(connection) as many:
+            import_expenses(expense_rows(*[self.row() for _ in range(40)]))
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(Expense.objects.count(), 44)
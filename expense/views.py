@@ -2,29 +2,32 @@ from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .models import Expense, Category, Item, Brand, Shop
-from django.contrib.auth.models import User
+from .importers import import_expenses, REQUIRED_HEADERS
 from .serializers import ExpenseSerializer, CategorySerializer, ItemSerializer, BrandSerializer, ShopSerializer
-import csv
-import io
+from imports.background import should_run_in_background, enqueue_import
+from webdjango.csv_ingest import csv_dict_reader
+from webdjango.pagination import cursor_pagination
+from webdjango.streaming import StreamingExportMixin
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(StreamingExportMixin, viewsets.ModelViewSet):
     queryset = Expense.objects.all().order_by('-date_of_purchase')
     serializer_class = ExpenseSerializer
+    pagination_class = cursor_pagination('-id')
 
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+    queryset = Category.objects.order_by('id')
     serializer_class = CategorySerializer
 
 class ItemViewSet(viewsets.ModelViewSet):
-    queryset = Item.objects.all()
+    queryset = Item.objects.order_by('id')
     serializer_class = ItemSerializer
 
 class BrandViewSet(viewsets.ModelViewSet):
-    queryset = Brand.objects.all()
+    queryset = Brand.objects.order_by('id')
     serializer_class = BrandSerializer
 
 class ShopViewSet(viewsets.ModelViewSet):
-    queryset = Shop.objects.all()
+    queryset = Shop.objects.order_by('id')
     serializer_class = ShopSerializer
 
 class ExpenseCSVUploadView(APIView):
@@ -47,83 +50,26 @@ class ExpenseCSVUploadView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            data = file.read().decode("utf-8")
-            reader = csv.DictReader(io.StringIO(data))
-            headers = reader.fieldnames
+            # Decode and parse the upload incrementally instead of reading it all into memory
+            reader = csv_dict_reader(file)
+            headers = reader.fieldnames or []
             print("🟢 CSV Headers:", headers)
 
-            required_headers = ["Date", "Item", "Category", "Brand", "Shop", "Qty", "Unit", "Price", "Remarks", "Who"]
-            missing_headers = [h for h in required_headers if h not in headers]
+            missing_headers = [h for h in REQUIRED_HEADERS if h not in headers]
             if missing_headers:
                 return Response({"error": f"Missing required CSV headers: {missing_headers}"}, status=400)
 
-            rows = list(reader)
-            expenses_to_create = []
-            errors = []
+            # Large uploads are handed to the import worker instead of blocking this request
+            if should_run_in_background(request, file):
+                return enqueue_import(request, 'expenses', file)
 
-            for i, row in enumerate(rows, start=1):
-                print(f"\n🔹 Row {i} content:", row)
-
-                item_name = row.get("Item", "").strip()
-                category_name = row.get("Category", "").strip()
-                user_name = row.get("Who", "").strip()
-
-                if not item_name or not category_name or not user_name:
-                    errors.append(f"Row {i}: 'Item', 'Category', and 'Who' are required.")
-                    continue
-
-                try:
-                    user = User.objects.get(username=user_name)
-                except User.DoesNotExist:
-                    errors.append(f"Row {i}: User '{user_name}' does not exist.")
-                    continue
-
-                brand_name = row.get("Brand", "").strip() or "N.A"
-                shop_name = row.get("Shop", "").strip() or "N.A"
-                remarks = row.get("Remarks", "").strip() or "N.A"
-
-                required_fields = ["Date", "Qty", "Unit", "Price"]
-                missing = [field for field in required_fields if not row.get(field)]
-                if missing:
-                    errors.append(f"Row {i}: Missing required fields: {missing}")
-                    continue
-
-                try:
-                    item, _ = Item.objects.get_or_create(name=item_name)
-                    category, _ = Category.objects.get_or_create(name=category_name)
-                    brand, _ = Brand.objects.get_or_create(name=brand_name)
-                    shop, _ = Shop.objects.get_or_create(name=shop_name)
-
-                    serializer = ExpenseSerializer(data={
-                        "item_id": item.id,
-                        "category_id": category.id,
-                        "brand_id": brand.id,
-                        "shop_id": shop.id,
-                        "who_spent_id": user.id,
-                        "date_of_purchase": row["Date"],
-                        "quantity": row["Qty"],
-                        "unit": row["Unit"],
-                        "price": row["Price"],
-                        "remarks": remarks,
-                    })
-
-                    if serializer.is_valid():
-                        expenses_to_create.append(serializer)
-                    else:
-                        errors.append(f"Row {i}: {serializer.errors}")
-                        continue
-
-                except Exception as e:
-                    errors.append(f"Row {i}: {str(e)}")
-                    continue
+            # Lookups are resolved once per batch and rows are bulk-inserted; any error rolls everything back
+            created_count, errors = import_expenses(reader)
 
             if errors:
                 return Response({"error": "CSV upload failed", "details": errors}, status=status.HTTP_400_BAD_REQUEST)
 
-            for serializer in expenses_to_create:
-                serializer.save()
-
-            return Response({"message": f"{len(expenses_to_create)} expenses created successfully."}, status=status.HTTP_201_CREATED)
+            return Response({"message": f"{created_count} expenses created successfully."}, status=status.HTTP_201_CREATED)
 
         except Exception as e:
             print("🔴 CSV processing error:", str(e))
@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import ImportJob
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'user', 'original_name', 'rows_processed', 'created', 'updated', 'failed', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('original_name', 'user__email')
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'attempts', 'finished_at')
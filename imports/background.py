@@ -0,0 +1,30 @@
+"""
+Helpers for CSV upload endpoints that can hand their work to an ImportJob.
+"""
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ImportJob
+from .serializers import ImportJobSerializer
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+
+
+def should_run_in_background(request, upload):
+    """Queue the upload when the client asks for it (?background=1) or the file is large."""
+    if str(request.query_params.get('background', '')).lower() in TRUE_VALUES:
+        return True
+    return upload.size > settings.IMPORT_JOB_THRESHOLD_BYTES
+
+
+def enqueue_import(request, kind, upload):
+    """Store the upload as a pending ImportJob and return a 202 response pointing at its status."""
+    job = ImportJob.objects.create(
+        user=request.user,
+        kind=kind,
+        file=upload,
+        original_name=upload.name,
+    )
+    data = ImportJobSerializer(job, context={'request': request}).data
+    return Response(data, status=status.HTTP_202_ACCEPTED)
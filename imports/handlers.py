@@ -0,0 +1,187 @@
+"""
+Processing of queued import jobs.
+
+Each job kind maps to its required CSV columns and a handler that runs the
+app's importer over the stored upload. Progress reported while the
+import's own transaction is still open is written through a separate
+database connection (``IMPORT_PROGRESS_DB``) so that pollers can see it;
+every other job update goes through ``default``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from expense.importers import import_expenses, REQUIRED_HEADERS as EXPENSE_CSV_FIELDS
+from project.importers import (
+    import_worklogs,
+    import_deliverables,
+    WORKLOG_CSV_FIELDS,
+    DELIVERABLE_CSV_FIELDS,
+)
+from quiz.importers import import_questions, QUESTION_CSV_FIELDS
+from webdjango.csv_ingest import csv_dict_reader
+
+from .models import ImportJob
+
+# Keep the stored error list bounded; the counters still report every failure.
+MAX_STORED_ERRORS = 500
+
+
+def _import_quiz_questions(job, reader, progress):
+    result = import_questions(reader, job.user, progress=progress)
+    return {'created': result['created'], 'failed': result['failed'], 'errors': result['errors']}
+
+
+def _import_expenses(job, reader, progress):
+    created, errors = import_expenses(reader, progress=progress)
+    return {'created': created, 'failed': len(errors), 'errors': errors}
+
+
+def _import_worklogs(job, reader, progress):
+    result = import_worklogs(reader, progress=progress)
+    return {**result, 'failed': len(result['errors'])}
+
+
+def _import_deliverables(job, reader, progress):
+    result = import_deliverables(reader, progress=progress)
+    return {**result, 'failed': len(result['errors'])}
+
+
+HANDLERS = {
+    'quiz_questions': (QUESTION_CSV_FIELDS, _import_quiz_questions),
+    'expenses': (EXPENSE_CSV_FIELDS, _import_expenses),
+    'worklogs': (WORKLOG_CSV_FIELDS, _import_worklogs),
+    'deliverables': (DELIVERABLE_CSV_FIELDS, _import_deliverables),
+}
+
+
+def _progress_db():
+    """
+    SQLite allows a single writer, so there progress waits for the import's
+    commit on ``default`` instead of blocking on it.
+    """
+    alias = getattr(settings, 'IMPORT_PROGRESS_DB', 'default')
+    if alias not in connections or connections[alias].vendor == 'sqlite':
+        return 'default'
+    return alias
+
+
+def update_job(job, using='default', **fields):
+    """
+    Write job fields immediately through the ``using`` connection. Every
+    update also refreshes the job's heartbeat.
+    """
+    fields.setdefault('heartbeat_at', timezone.now())
+    for name, value in fields.items():
+        setattr(job, name, value)
+    ImportJob.objects.using(using).filter(pk=job.pk).update(**fields)
+
+
+def _discard_file(job):
+    """The upload is no longer needed once the job has finished, either way."""
+    if job.file:
+        job.file.delete(save=False)
+        update_job(job, file='')
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'IMPORT_JOB_STALE_SECONDS', 10 * 60))
+
+
+def _fail_abandoned_jobs():
+    """Give up on stale jobs that have already used all their attempts."""
+    max_attempts = getattr(settings, 'IMPORT_JOB_MAX_ATTEMPTS', 3)
+    abandoned = ImportJob.objects.filter(
+        status='running', heartbeat_at__lt=_stale_cutoff(), attempts__gte=max_attempts
+    )
+    for job in abandoned:
+        claimed = ImportJob.objects.filter(pk=job.pk, status='running', heartbeat_at=job.heartbeat_at).update(
+            status='failed',
+            message=f'Import stopped responding after {job.attempts} attempts',
+            finished_at=timezone.now(),
+        )
+        if claimed:
+            _discard_file(job)
+
+
+def claim_next_job():
+    """
+    Mark the oldest claimable job as running and return it, or None if the
+    queue is empty. Besides pending jobs, running jobs whose heartbeat is
+    older than IMPORT_JOB_STALE_SECONDS are claimed again: their worker died
+    mid-import, and as imports run in one transaction nothing of that run
+    was kept.
+    """
+    _fail_abandoned_jobs()
+    job = ImportJob.objects.filter(
+        Q(status='pending') | Q(status='running', heartbeat_at__lt=_stale_cutoff())
+    ).order_by('created_at').first()
+    if job is None:
+        return None
+    # Conditional update so two workers never pick up the same job
+    now = timezone.now()
+    claimed = ImportJob.objects.filter(pk=job.pk, status=job.status, heartbeat_at=job.heartbeat_at).update(
+        status='running',
+        started_at=now,
+        heartbeat_at=now,
+        attempts=F('attempts') + 1,
+        rows_processed=0,
+        created=0,
+        updated=0,
+        failed=0,
+        errors=[],
+        message='',
+    )
+    if not claimed:
+        return claim_next_job()
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Process a claimed job and record its outcome."""
+    required_fields, handler = HANDLERS[job.kind]
+    rows_seen = 0
+
+    def progress(rows_processed=0, created=0, updated=0, failed=0):
+        # Called from inside the import's transaction
+        update_job(
+            job, using=_progress_db(),
+            rows_processed=rows_processed, created=created, updated=updated, failed=failed,
+        )
+
+    def counted(reader):
+        nonlocal rows_seen
+        for row in reader:
+            rows_seen += 1
+            yield row
+
+    try:
+        with job.file.open('rb'):
+            reader = csv_dict_reader(job.file)
+            missing = [field for field in required_fields if field not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+            result = handler(job, counted(reader), progress)
+    except UnicodeDecodeError:
+        _discard_file(job)
+        update_job(job, status='failed', message='File must be UTF-8 encoded', finished_at=timezone.now())
+    except Exception as e:
+        _discard_file(job)
+        update_job(job, status='failed', message=str(e), finished_at=timezone.now())
+    else:
+        _discard_file(job)
+        update_job(
+            job,
+            status='completed',
+            rows_processed=rows_seen,
+            created=result.get('created', 0),
+            updated=result.get('updated', 0),
+            failed=result.get('failed', 0),
+            errors=result.get('errors', [])[:MAX_STORED_ERRORS],
+            finished_at=timezone.now(),
+        )
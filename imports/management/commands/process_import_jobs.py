@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from imports.handlers import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued CSV import jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue until empty, then exit')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f"Processing {job}")
+            run_job(job)
+            level = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+            self.stdout.write(level(
+                f"{job}: {job.rows_processed} rows, {job.created} created, "
+                f"{job.updated} updated, {job.failed} failed {job.message}".rstrip()
+            ))
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:19
+
+import imports.models
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def move_job_files_out_of_media(apps, schema_editor):
+    """
+    Move the uploads of queued jobs from MEDIA_ROOT to the private import
+    storage, and delete those left behind by failed jobs.
+    """
+    ImportJob = apps.get_model('imports', 'ImportJob')
+    private_storage = imports.models.import_job_storage()
+    for job in ImportJob.objects.exclude(file='').only('id', 'status', 'file').iterator():
+        name = job.file.name
+        if not default_storage.exists(name):
+            continue
+        if job.status in ('pending', 'running'):
+            with default_storage.open(name, 'rb') as upload:
+                stored_name = private_storage.save(name, upload)
+            if stored_name != name:
+                ImportJob.objects.filter(pk=job.pk).update(file=stored_name)
+        else:
+            ImportJob.objects.filter(pk=job.pk).update(file='')
+        default_storage.delete(name)
+    # Jobs running now get a heartbeat, so they are reclaimed if their worker is gone
+    ImportJob.objects.filter(status='running', heartbeat_at__isnull=True).update(heartbeat_at=models.F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='file',
+            field=models.FileField(storage=imports.models.import_job_storage, upload_to='imports/'),
+        ),
+        migrations.RunPython(move_job_files_out_of_media, migrations.RunPython.noop),
+    ]
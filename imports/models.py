@@ -0,0 +1,94 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+User = get_user_model()
+
+
+class ImportJobStorage(FileSystemStorage):
+    """
+    Uploads waiting for the import worker, kept in IMPORT_JOB_DIR outside
+    MEDIA_ROOT: they hold other users' data and must never be served.
+    """
+
+    @property
+    def base_location(self):
+        return getattr(settings, 'IMPORT_JOB_DIR', None) or os.path.join(tempfile.gettempdir(), 'import_jobs')
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        return None
+
+
+private_import_storage = ImportJobStorage()
+
+
+def import_job_storage():
+    return private_import_storage
+
+
+class ImportJob(models.Model):
+    """A CSV upload queued for processing by `manage.py process_import_jobs`."""
+
+    KIND_CHOICES = [
+        ('quiz_questions', 'Quiz Questions'),
+        ('expenses', 'Expenses'),
+        ('worklogs', 'Work Logs'),
+        ('deliverables', 'Deliverables'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='imports/', storage=import_job_storage)
+    original_name = models.CharField(max_length=255, blank=True)
+
+    rows_processed = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed with every progress update; a running job that stops
+    # refreshing it is reclaimed (imports.handlers.claim_next_job)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Import Job"
+        verbose_name_plural = "Import Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} import #{self.pk} ({self.get_status_display()})"
+
+
+# --- CLEANUP HANDLER ON DELETE ---
+@receiver(post_delete, sender=ImportJob)
+def delete_import_file_on_delete(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
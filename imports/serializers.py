@@ -0,0 +1,21 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from .models import ImportJob
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    kind_name = serializers.CharField(source='get_kind_display', read_only=True)
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'kind', 'kind_name', 'status', 'original_name',
+            'rows_processed', 'created', 'updated', 'failed', 'errors', 'message',
+            'created_at', 'started_at', 'finished_at', 'status_url'
+        ]
+        read_only_fields = fields
+
+    def get_status_url(self, obj):
+        return reverse('importjob-detail', args=[obj.pk], request=self.context.get('request'))
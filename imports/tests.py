@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from project.models import Deliverable, Organisation, Project
+from .handlers import claim_next_job, run_job
+from .models import ImportJob
+
+User = get_user_model()
+
+IMPORT_JOB_DIR = tempfile.mkdtemp()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+DELIVERABLES_CSV = b'Project,Name,Stage\nProject,Plan,1\nProject,Section,2\n'
+
+
+@override_settings(IMPORT_JOB_DIR=IMPORT_JOB_DIR, MEDIA_ROOT=MEDIA_ROOT, IMPORT_JOB_STALE_SECONDS=60, IMPORT_JOB_MAX_ATTEMPTS=2)
+class ImportJobTests(TransactionTestCase):
+    """Queued uploads stay private, are removed when the job ends, and survive a dead worker."""
+
+    # Progress goes through a second connection, which only sees committed rows
+    databases = {'default', 'import_progress'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='importer@example.com', password='x')
+        organisation = Organisation.objects.create(name='Org')
+        Project.objects.create(name='Project', location='Site', client_name='Client', organisation=organisation)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(IMPORT_JOB_DIR, ignore_errors=True)
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def enqueue(self, content=DELIVERABLES_CSV):
+        return ImportJob.objects.create(
+            user=self.user, kind='deliverables', file=SimpleUploadedFile('deliverables.csv', content),
+        )
+
+    def test_upload_is_stored_outside_media_root(self):
+        path = self.enqueue().file.path
+        self.assertTrue(path.startswith(IMPORT_JOB_DIR))
+        self.assertFalse(os.path.realpath(path).startswith(os.path.realpath(MEDIA_ROOT)))
+        self.assertTrue(os.path.exists(path))
+
+    def test_completed_job_deletes_its_file(self):
+        path = self.enqueue().file.path
+        job = claim_next_job()
+        run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.created, job.file.name), ('completed', 2, ''))
+        self.assertEqual(Deliverable.objects.count(), 2)
+        self.assertFalse(os.path.exists(path))
+
+    def test_failed_job_deletes_its_file(self):
+        path = self.enqueue(b'Project,Name\nProject,Plan\n').file.path
+        job = claim_next_job()
+        run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Missing required columns: Stage', job.message)
+        self.assertEqual(job.file.name, '')
+        self.assertFalse(os.path.exists(path))
+
+    def test_running_job_with_stale_heartbeat_is_reclaimed(self):
+        job = self.enqueue()
+        claimed = claim_next_job()
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 1))
+
+        # Still heartbeating: not handed to anyone else
+        self.assertIsNone(claim_next_job())
+
+        # The worker died mid-import
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5), rows_processed=40)
+        reclaimed = claim_next_job()
+        self.assertEqual((reclaimed.pk, reclaimed.status, reclaimed.attempts, reclaimed.rows_processed), (job.pk, 'running', 2, 0))
+
+        run_job(reclaimed)
+        reclaimed.refresh_from_db()
+        self.assertEqual(reclaimed.status, 'completed')
+
+    def test_job_is_failed_once_attempts_are_used_up(self):
+        job = self.enqueue()
+        path = job.file.path
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='running', attempts=2, heartbeat_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        self.assertIsNone(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('after 2 attempts', job.message)
+        self.assertFalse(os.path.exists(path))
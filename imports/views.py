@@ -0,0 +1,21 @@
+from rest_framework import viewsets
+from rest_framework.permissions import IsAuthenticated
+
+from webdjango.pagination import cursor_pagination
+
+from .models import ImportJob
+from .serializers import ImportJobSerializer
+
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status of the requesting user's background CSV imports.
+    GET /import-jobs/       - List jobs (latest first)
+    GET /import-jobs/{id}/  - Poll one job's progress
+    """
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = cursor_pagination('-created_at', '-id')
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user=self.request.user)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from .models import Project, WorkLog, Deliverable, Organisation, OrganisationMembership, Expense
+from .models import Project, WorkLog, Deliverable, DeliverableTimeRollup, Organisation, OrganisationMembership, Expense
 
 
 @admin.register(Organisation)
@@ -94,6 +94,14 @@ class DeliverableAdmin(admin.ModelAdmin):
             self.message_user(request, f"An error occurred: {str(e)}", level=messages.ERROR)
             
             
+@admin.register(DeliverableTimeRollup)
+class DeliverableTimeRollupAdmin(admin.ModelAdmin):
+    list_display = ('deliverable', 'worklog_count', 'total_duration', 'first_activity', 'last_activity', 'updated_at')
+    list_select_related = ('deliverable', 'deliverable__project')
+    search_fields = ('deliverable__name', 'deliverable__project__name')
+    readonly_fields = ('deliverable', 'total_duration', 'worklog_count', 'first_activity', 'last_activity', 'updated_at')
+
+
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'project', 'category_display', 'amount', 'date', 'remarks_short')
@@ -0,0 +1,93 @@
+"""
+Time-bucketed work log analytics.
+
+Durations are summed in SQL per (period, group) with TruncDay/TruncWeek/
+TruncMonth on start_time, backed by the (employee, start_time) and
+(deliverable, start_time) indexes on WorkLog. Results are cached per query
+signature under a work log data version that services.worklogs_changed()
+bumps, so any work log change invalidates every cached series at once.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+WORKLOG_DATA_VERSION_KEY = 'project:worklog-data-version'
+
+# Bounds staleness from changes that do not go through worklogs_changed()
+# (e.g. a project or deliverable rename) and in per-process caches.
+ANALYTICS_CACHE_TIMEOUT = 60 * 5
+
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# group_by -> (id field, name field)
+GROUPS = {
+    'employee': ('employee_id', 'employee__email'),
+    'project': ('deliverable__project_id', 'deliverable__project__name'),
+    'deliverable': ('deliverable_id', 'deliverable__name'),
+    'organisation': ('deliverable__project__organisation_id', 'deliverable__project__organisation__name'),
+}
+
+
+def bump_worklog_data_version():
+    cache.set(WORKLOG_DATA_VERSION_KEY, time.time_ns(), None)
+
+
+def get_worklog_data_version():
+    version = cache.get(WORKLOG_DATA_VERSION_KEY)
+    if version is None:
+        cache.add(WORKLOG_DATA_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(WORKLOG_DATA_VERSION_KEY, 0)
+    return version
+
+
+def worklog_time_series(worklogs, bucket='day', group_by='project'):
+    """
+    Sum the durations of completed ``worklogs`` (a WorkLog queryset) per
+    ``bucket`` period and ``group_by`` key, in one grouped query.
+    """
+    id_field, name_field = GROUPS[group_by]
+    rows = (
+        worklogs.filter(end_time__isnull=False)
+        .annotate(period=BUCKETS[bucket]('start_time'))
+        .values('period', id_field, name_field)
+        .annotate(
+            duration=Sum(ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())),
+            worklog_count=Count('id'),
+        )
+        .order_by('period', id_field)
+    )
+    return [
+        {
+            'period': row['period'].date().isoformat(),
+            'id': row[id_field],
+            'name': row[name_field],
+            'duration_seconds': row['duration'].total_seconds() if row['duration'] else 0,
+            'worklog_count': row['worklog_count'],
+        }
+        for row in rows
+    ]
+
+
+def cached_worklog_time_series(worklogs, signature, bucket='day', group_by='project'):
+    """
+    worklog_time_series() cached under ``signature``, a JSON-serialisable
+    description of everything that shaped ``worklogs`` (user, organisations,
+    filters).
+    """
+    digest = hashlib.sha256(
+        json.dumps([signature, bucket, group_by], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    key = f"project:worklog-analytics:{get_worklog_data_version()}:{digest}"
+    results = cache.get(key)
+    if results is None:
+        results = worklog_time_series(worklogs, bucket, group_by)
+        cache.set(key, results, ANALYTICS_CACHE_TIMEOUT)
+    return results
@@ -0,0 +1,254 @@
+"""
+CSV import of work logs and deliverables.
+
+Used by the upload_csv actions of WorkLogViewSet and DeliverableViewSet and
+by background import jobs.
+"""
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Project, WorkLog, Deliverable
+from .services import worklogs_changed
+
+User = get_user_model()
+
+WORKLOG_CSV_FIELDS = ['Employee', 'Project', 'Deliverable', 'Start Time']
+DELIVERABLE_CSV_FIELDS = ['Project', 'Name', 'Stage']
+
+WORKLOG_BATCH_SIZE = 1000
+
+# How often row-by-row imports report progress
+PROGRESS_EVERY = 200
+
+
+def _parse_time(value):
+    """Parse 'YYYY-MM-DD HH:MM:SS[+TZ]'; naive values are taken in the default time zone."""
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d %H:%M:%S%z')
+    except ValueError:
+        parsed = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_worklog_row(row_num, row, errors):
+    """Return the parsed values of a work log row, or None after recording why it is invalid."""
+    try:
+        employee_email = row['Employee'].strip()
+        project_name = row['Project'].strip()
+        deliverable_name = row['Deliverable'].strip()
+        start_time_str = row['Start Time'].strip()
+        end_time_str = (row.get('End Time') or '').strip()
+    except AttributeError:
+        errors.append((row_num, f"Row {row_num}: Missing values"))
+        return None
+
+    try:
+        start_time = _parse_time(start_time_str)
+    except ValueError:
+        errors.append((row_num, f"Row {row_num}: Invalid Start Time format. Use 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD HH:MM:SS+TZ'"))
+        return None
+
+    end_time = None
+    if end_time_str:
+        try:
+            end_time = _parse_time(end_time_str)
+        except ValueError:
+            errors.append((row_num, f"Row {row_num}: Invalid End Time format. Use 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD HH:MM:SS+TZ'"))
+            return None
+
+    return employee_email, project_name, deliverable_name, start_time, end_time
+
+
+class _WorkLogBatchResolver:
+    """Name -> id maps for employees, projects and deliverables, filled once per batch."""
+
+    def __init__(self):
+        self.employees = {}     # email -> user id
+        self.projects = {}      # name -> [(id, current_stage)]
+        self.deliverables = {}  # (project id, name) -> deliverable id
+
+    def resolve(self, rows):
+        emails = {row[0] for row in rows} - self.employees.keys()
+        if emails:
+            self.employees.update(User.objects.filter(email__in=emails).values_list('email', 'id'))
+
+        names = {row[1] for row in rows} - self.projects.keys()
+        if names:
+            for name in names:
+                self.projects[name] = []
+            for project_id, name, stage in Project.objects.filter(name__in=names).values_list('id', 'name', 'current_stage'):
+                self.projects[name].append((project_id, stage))
+
+        wanted = {}
+        for email, project_name, deliverable_name, _, _ in rows:
+            matches = self.projects[project_name]
+            if len(matches) == 1 and (matches[0][0], deliverable_name) not in self.deliverables:
+                wanted[(matches[0][0], deliverable_name)] = matches[0][1]
+        if wanted:
+            existing = Deliverable.objects.filter(
+                project_id__in={key[0] for key in wanted},
+                name__in={key[1] for key in wanted},
+            ).values_list('project_id', 'name', 'id')
+            for project_id, name, deliverable_id in existing:
+                if (project_id, name) in wanted:
+                    self.deliverables.setdefault((project_id, name), deliverable_id)
+            missing = [
+                Deliverable(project_id=project_id, name=name, stage=stage, status='ongoing')
+                for (project_id, name), stage in wanted.items()
+                if (project_id, name) not in self.deliverables
+            ]
+            for deliverable in Deliverable.objects.bulk_create(missing):
+                self.deliverables[(deliverable.project_id, deliverable.name)] = deliverable.pk
+
+
+def import_worklogs(reader, batch_size=WORKLOG_BATCH_SIZE, progress=None):
+    """
+    Create or update work logs from a csv.DictReader-like iterable of rows.
+
+    Employees, projects and deliverables are resolved once per batch and work
+    logs are upserted with one bulk INSERT ... ON CONFLICT per batch, keyed on
+    (employee, deliverable, start_time). Deliverable status, start date and
+    time rollups are refreshed once per affected deliverable at the end,
+    instead of by WorkLog.save() for every row.
+
+    Returns ``{'created': int, 'updated': int, 'errors': [str]}``.
+    """
+    resolver = _WorkLogBatchResolver()
+    affected_deliverables = set()
+    created_count = 0
+    updated_count = 0
+    rows_processed = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal created_count, updated_count
+        resolver.resolve([values for _, values in batch])
+
+        worklogs = {}
+        for row_num, (email, project_name, deliverable_name, start_time, end_time) in batch:
+            employee_id = resolver.employees.get(email)
+            if employee_id is None:
+                errors.append((row_num, f"Row {row_num}: Employee with email '{email}' not found"))
+                continue
+            matches = resolver.projects[project_name]
+            if not matches:
+                errors.append((row_num, f"Row {row_num}: Project '{project_name}' not found"))
+                continue
+            if len(matches) > 1:
+                errors.append((row_num, f"Row {row_num}: Multiple projects named '{project_name}'"))
+                continue
+            deliverable_id = resolver.deliverables[(matches[0][0], deliverable_name)]
+
+            # A key repeated within the batch behaves like successive update_or_create calls
+            key = (employee_id, deliverable_id, start_time)
+            if key in worklogs:
+                worklogs[key].end_time = end_time
+                updated_count += 1
+            else:
+                worklogs[key] = WorkLog(
+                    employee_id=employee_id,
+                    deliverable_id=deliverable_id,
+                    start_time=start_time,
+                    end_time=end_time,
+                )
+        batch.clear()
+        if not worklogs:
+            return
+
+        existing = set(WorkLog.objects.filter(
+            employee_id__in={key[0] for key in worklogs},
+            deliverable_id__in={key[1] for key in worklogs},
+            start_time__in={key[2] for key in worklogs},
+        ).values_list('employee_id', 'deliverable_id', 'start_time'))
+        updated = sum(1 for key in worklogs if key in existing)
+        updated_count += updated
+        created_count += len(worklogs) - updated
+
+        WorkLog.objects.bulk_create(
+            worklogs.values(),
+            update_conflicts=True,
+            unique_fields=['employee', 'deliverable', 'start_time'],
+            update_fields=['end_time', 'edited_time'],
+        )
+        affected_deliverables.update(key[1] for key in worklogs)
+
+    with transaction.atomic():
+        for row_num, row in enumerate(reader, start=2):
+            rows_processed += 1
+            values = _parse_worklog_row(row_num, row, errors)
+            if values is not None:
+                batch.append((row_num, values))
+            if len(batch) >= batch_size:
+                flush()
+                if progress:
+                    progress(rows_processed=rows_processed, created=created_count, updated=updated_count, failed=len(errors))
+        if batch:
+            flush()
+
+        worklogs_changed(affected_deliverables)
+
+    errors = [message for _, message in sorted(errors, key=lambda error: error[0])]
+    return {'created': created_count, 'updated': updated_count, 'errors': errors}
+
+
+def import_deliverables(reader, progress=None):
+    """
+    Create or update deliverables from a csv.DictReader-like iterable of rows.
+
+    Returns ``{'created': int, 'updated': int, 'errors': [str]}``.
+    """
+    created_count = 0
+    updated_count = 0
+    errors = []
+
+    with transaction.atomic():
+        for row_num, row in enumerate(reader, start=2):
+            if progress and row_num % PROGRESS_EVERY == 0:
+                progress(rows_processed=row_num - 2, created=created_count, updated=updated_count, failed=len(errors))
+            try:
+                project_name = row['Project'].strip()
+                name = row['Name'].strip()
+                stage = row['Stage'].strip()
+                status_val = (row.get('Status') or 'not_started').strip()
+                remarks = (row.get('Remarks') or '').strip()
+                start_date_str = (row.get('Start Date') or '').strip()
+                end_date_str = (row.get('End Date') or '').strip()
+
+                # Validate project
+                try:
+                    project = Project.objects.get(name=project_name)
+                except Project.DoesNotExist:
+                    errors.append(f"Row {row_num}: Project '{project_name}' not found")
+                    continue
+
+                # Parse dates
+                try:
+                    start_date = datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None
+                    end_date = datetime.strptime(end_date_str, '%Y-%m-%d') if end_date_str else None
+                except ValueError:
+                    errors.append(f"Row {row_num}: Invalid date format. Use 'YYYY-MM-DD'")
+                    continue
+
+                # Create or update deliverable
+                deliverable, created = Deliverable.objects.update_or_create(
+                    project=project,
+                    name=name,
+                    defaults={'stage': stage, 'status': status_val, 'remarks': remarks, 'start_date': start_date, 'end_date': end_date}
+                )
+
+                if created:
+                    created_count += 1
+                else:
+                    updated_count += 1
+
+            except Exception as e:
+                errors.append(f"Row {row_num}: {str(e)}")
+                continue
+
+    return {'created': created_count, 'updated': updated_count, 'errors': errors}
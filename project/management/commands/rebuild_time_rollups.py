@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from project.models import WorkLog, DeliverableTimeRollup
+from project.services import compute_time_rollups, save_time_rollups
+
+ROLLUP_FIELDS = ['total_duration', 'worklog_count', 'first_activity', 'last_activity']
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the deliverable time rollups from work logs, or check them for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report rollups that differ from the work logs; exit non-zero on drift')
+
+    def handle(self, *args, **options):
+        expected = {rollup.deliverable_id: rollup for rollup in compute_time_rollups(WorkLog.objects.all())}
+        stored = {rollup.deliverable_id: rollup for rollup in DeliverableTimeRollup.objects.all()}
+
+        drifted = [
+            pk for pk, rollup in expected.items()
+            if pk not in stored or any(getattr(rollup, f) != getattr(stored[pk], f) for f in ROLLUP_FIELDS)
+        ]
+        stale = [pk for pk in stored if pk not in expected]
+
+        if options['verify']:
+            for pk in drifted:
+                self.stdout.write(f"Deliverable {pk}: rollup out of date")
+            for pk in stale:
+                self.stdout.write(f"Deliverable {pk}: rollup without work logs")
+            if drifted or stale:
+                raise CommandError(f"{len(drifted) + len(stale)} rollups drifted")
+            self.stdout.write(self.style.SUCCESS(f"{len(stored)} rollups match the work logs"))
+            return
+
+        with transaction.atomic():
+            save_time_rollups(list(expected.values()))
+            DeliverableTimeRollup.objects.filter(deliverable_id__in=stale).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(expected)} rollups ({len(drifted)} corrected, {len(stale)} removed)"
+        ))
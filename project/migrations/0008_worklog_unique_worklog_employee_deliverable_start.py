@@ -0,0 +1,62 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+# Conflicting groups spelled out in the error; the rest are only counted
+MAX_REPORTED_DUPLICATES = 50
+
+
+def check_duplicate_worklogs(apps, schema_editor):
+    """
+    Stop before adding the unique constraint if work logs share an
+    (employee, deliverable, start_time). Which of them is right is for
+    someone to decide, so nothing is deleted here: the error lists the
+    conflicting rows to merge or remove before migrating again.
+    """
+    WorkLog = apps.get_model('project', 'WorkLog')
+    duplicates = (
+        WorkLog.objects.order_by('employee_id', 'deliverable_id', 'start_time')
+        .values('employee_id', 'deliverable_id', 'start_time')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+    )
+    conflicts = []
+    total = 0
+    for key in duplicates.iterator():
+        total += 1
+        if len(conflicts) < MAX_REPORTED_DUPLICATES:
+            ids = WorkLog.objects.filter(
+                employee_id=key['employee_id'],
+                deliverable_id=key['deliverable_id'],
+                start_time=key['start_time'],
+            ).order_by('id').values_list('id', flat=True)
+            conflicts.append(
+                f"  employee {key['employee_id']}, deliverable {key['deliverable_id']}, "
+                f"start {key['start_time'].isoformat()}: work logs {', '.join(map(str, ids))}"
+            )
+    if total:
+        if total > len(conflicts):
+            conflicts.append(f"  ... and {total - len(conflicts)} more")
+        raise RuntimeError(
+            "Cannot add unique_worklog_employee_deliverable_start: work logs in each group below "
+            f"share an employee, deliverable and start time ({total} groups). Keep one work log per "
+            "group, then run the migration again.\n" + "\n".join(conflicts)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0007_worklog_edited_time_worklog_entered_time'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_worklogs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='worklog',
+            constraint=models.UniqueConstraint(fields=('employee', 'deliverable', 'start_time'), name='unique_worklog_employee_deliverable_start'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:49
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_rollups(apps, schema_editor):
+    WorkLog = apps.get_model('project', 'WorkLog')
+    DeliverableTimeRollup = apps.get_model('project', 'DeliverableTimeRollup')
+    rows = (
+        WorkLog.objects.order_by()
+        .values('deliverable_id')
+        .annotate(
+            total_duration=Sum(
+                ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField()),
+                filter=Q(end_time__isnull=False),
+            ),
+            worklog_count=Count('id'),
+            first_activity=Min('start_time'),
+            last_activity=Max(Coalesce('end_time', 'start_time')),
+        )
+    )
+    DeliverableTimeRollup.objects.bulk_create([
+        DeliverableTimeRollup(
+            deliverable_id=row['deliverable_id'],
+            total_duration=row['total_duration'] or datetime.timedelta(0),
+            worklog_count=row['worklog_count'],
+            first_activity=row['first_activity'],
+            last_activity=row['last_activity'],
+        )
+        for row in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0008_worklog_unique_worklog_employee_deliverable_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliverableTimeRollup',
+            fields=[
+                ('deliverable', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='time_rollup', serialize=False, to='project.deliverable')),
+                ('total_duration', models.DurationField(default=datetime.timedelta(0), verbose_name='Total Duration')),
+                ('worklog_count', models.PositiveIntegerField(default=0, verbose_name='Work Logs')),
+                ('first_activity', models.DateTimeField(blank=True, null=True, verbose_name='First Activity')),
+                ('last_activity', models.DateTimeField(blank=True, null=True, verbose_name='Last Activity')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Deliverable Time Rollup',
+                'verbose_name_plural': 'Deliverable Time Rollups',
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
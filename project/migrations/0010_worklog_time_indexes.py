@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0009_deliverabletimerollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='worklog',
+            index=models.Index(fields=['employee', 'start_time'], include=('end_time',), name='worklog_employee_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='worklog',
+            index=models.Index(fields=['deliverable', 'start_time'], include=('end_time',), name='worklog_deliv_start_idx'),
+        ),
+    ]
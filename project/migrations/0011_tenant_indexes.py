@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0010_worklog_time_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliverable',
+            index=models.Index(fields=['project', 'stage', 'status'], name='deliverable_proj_stage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['organisation', 'name'], name='project_org_name_idx'),
+        ),
+    ]
@@ -1,8 +1,20 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
 
 User = get_user_model()
 
+# Kept short: a role map is an authorization decision, so even a missed
+# invalidation must not outlive this by much
+MEMBERSHIP_CACHE_TIMEOUT = 30
+
+
+def membership_cache_key(user_id):
+    return f'project:organisation-roles:{user_id}'
+
 
 class Organisation(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -35,9 +47,27 @@ class OrganisationMembership(models.Model):
     class Meta:
         unique_together = ('organisation', 'user')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # User as loaded, so reassigning a membership invalidates both users' role maps
+        self._loaded_user_id = self.__dict__.get('user_id')
+
     def __str__(self):
         return f"{self.user.email} - {self.organisation.name} ({self.role})"
 
+    @classmethod
+    def roles_for_user(cls, user_id):
+        """
+        Map of organisation id -> role for ``user_id``, cached in the shared
+        cache until the user's memberships change (or MEMBERSHIP_CACHE_TIMEOUT).
+        """
+        key = membership_cache_key(user_id)
+        roles = cache.get(key)
+        if roles is None:
+            roles = dict(cls.objects.filter(user_id=user_id).values_list('organisation_id', 'role'))
+            cache.set(key, roles, MEMBERSHIP_CACHE_TIMEOUT)
+        return roles
+
 
 class Project(models.Model):
     STAGE_CHOICES = [
@@ -57,6 +87,10 @@ class Project(models.Model):
     class Meta:
         verbose_name = "Project"
         verbose_name_plural = "Projects"
+        indexes = [
+            # Organisation-scoped project lists, ordered by name
+            models.Index(fields=['organisation', 'name'], name='project_org_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.client_name})"
@@ -94,6 +128,10 @@ class Deliverable(models.Model):
         verbose_name_plural = "Deliverables"
         unique_together = ('project', 'name', 'stage')
         ordering = ['project', 'stage', 'name']
+        indexes = [
+            # Per-project listings filtered by stage and status
+            models.Index(fields=['project', 'stage', 'status'], name='deliverable_proj_stage_idx'),
+        ]
 
     def __str__(self):
         return f"{self.project.name} - {self.name} (Stage {self.stage}) - {self.get_status_display()}"
@@ -128,25 +166,14 @@ class Deliverable(models.Model):
 
     def update_status_based_on_worklogs(self):
         """Updates status to 'ongoing' if worklogs exist, else 'not_started'"""
-        has_worklogs = self.worklogs.exists()
-        
-        if has_worklogs:
-            if self.status == 'not_started':
-                self.status = 'ongoing'
-            # Update start_date if not set
-            if not self.start_date:
-                first_worklog = self.worklogs.earliest('start_time')
-                self.start_date = first_worklog.start_time.date()
-        elif self.status == 'ongoing':
-            self.status = 'not_started'
-        
-        if has_worklogs or self.status != 'not_started':
-            update_fields = ['status']
-            if not self.start_date and has_worklogs:
-                update_fields.append('start_date')
-            self.save(update_fields=update_fields)
-            
-            
+        from .services import reconcile_deliverable_status
+
+        reconcile_deliverable_status([self.pk])
+        self.refresh_from_db(fields=['status', 'start_date'])
+
+
+from datetime import timedelta
+
 from django.utils import timezone
 from django.db import models
 
@@ -165,11 +192,27 @@ class WorkLog(models.Model):
     class Meta:
         verbose_name = "Work Log"
         verbose_name_plural = "Work Logs"
+        indexes = [
+            # Per-employee / per-deliverable time range scans (analytics, exports);
+            # end_time is included so duration sums can be served from the index
+            models.Index(fields=['employee', 'start_time'], include=['end_time'], name='worklog_employee_start_idx'),
+            models.Index(fields=['deliverable', 'start_time'], include=['end_time'], name='worklog_deliv_start_idx'),
+        ]
+        constraints = [
+            # Key used by the CSV import's bulk upsert
+            models.UniqueConstraint(
+                fields=['employee', 'deliverable', 'start_time'],
+                name='unique_worklog_employee_deliverable_start'
+            ),
+        ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Initialize time fields for existing records when model is loaded
         self._initialize_time_fields()
+        # Deliverable as loaded, so moving a log reconciles the one it left too
+        # (read from __dict__ so a deferred field doesn't cost a query)
+        self._loaded_deliverable_id = self.__dict__.get('deliverable_id')
 
     def _initialize_time_fields(self):
         """Set fallback values only if missing."""
@@ -198,23 +241,10 @@ class WorkLog(models.Model):
 
         super().save(*args, **kwargs)
         
-        # Original deliverable status update logic
-        if is_new:
-            if not self.deliverable.start_date:
-                self.deliverable.start_date = self.start_time.date()
-                update_fields = ['start_date']
-                if self.deliverable.status == 'not_started':
-                    self.deliverable.status = 'ongoing'
-                    update_fields.append('status')
-                self.deliverable.save(update_fields=update_fields)
-            else:
-                self.deliverable.update_status_based_on_worklogs()
-
-    # Rest of your existing methods remain unchanged
-    def delete(self, *args, **kwargs):
-        deliverable = self.deliverable
-        super().delete(*args, **kwargs)
-        deliverable.update_status_based_on_worklogs()
+        from .services import worklogs_changed
+
+        worklogs_changed({self.deliverable_id, self._loaded_deliverable_id})
+        self._loaded_deliverable_id = self.deliverable_id
 
     @property
     def duration(self):
@@ -223,10 +253,37 @@ class WorkLog(models.Model):
             return delta.total_seconds()
         return None
 
+    @property
+    def duration_hours(self):
+        seconds = self.duration
+        return seconds / 3600 if seconds is not None else None
+
     @property
     def project(self):
         return self.deliverable.project if self.deliverable else None
 
+
+class DeliverableTimeRollup(models.Model):
+    """
+    Work log totals for one deliverable, kept current by
+    project.services.refresh_time_rollups whenever its work logs change.
+    Queryset update() calls bypass that; run `manage.py rebuild_time_rollups`
+    periodically (e.g. nightly) to correct any drift.
+    """
+    deliverable = models.OneToOneField(Deliverable, on_delete=models.CASCADE, primary_key=True, related_name='time_rollup')
+    total_duration = models.DurationField("Total Duration", default=timedelta(0))  # completed work logs only
+    worklog_count = models.PositiveIntegerField("Work Logs", default=0)
+    first_activity = models.DateTimeField("First Activity", null=True, blank=True)
+    last_activity = models.DateTimeField("Last Activity", null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Deliverable Time Rollup"
+        verbose_name_plural = "Deliverable Time Rollups"
+
+    def __str__(self):
+        return f"{self.deliverable_id}: {self.worklog_count} logs, {self.total_duration}"
+
 class Expense(models.Model):
     CATEGORY_CHOICES = [
         ('travel', 'Travel'),
@@ -255,4 +312,44 @@ class Expense(models.Model):
     def clean(self):
         """Add validation for amount"""
         if self.amount <= 0:
-            raise ValidationError("Amount must be greater than zero.")
\ No newline at end of file
+            raise ValidationError("Amount must be greater than zero.")
+
+
+# --- MEMBERSHIP CACHE INVALIDATION (see OrganisationMembership.roles_for_user) ---
+@receiver(post_save, sender=OrganisationMembership)
+@receiver(post_delete, sender=OrganisationMembership)
+def invalidate_membership_cache(sender, instance, **kwargs):
+    keys = {membership_cache_key(instance.user_id), membership_cache_key(instance._loaded_user_id)}
+    cache.delete_many(keys)
+    # Again once committed: a request running meanwhile may have cached the old roles
+    transaction.on_commit(lambda: cache.delete_many(keys))
+    instance._loaded_user_id = instance.user_id
+
+
+# --- WORK LOG DELETION (see project.services.worklogs_changed) ---
+# Deliverables whose work logs a delete() call is removing, keyed by the call's origin
+_deleting_worklogs = {}
+
+
+@receiver(pre_delete, sender=WorkLog)
+def collect_deleted_worklog(sender, instance, origin=None, **kwargs):
+    _deleting_worklogs.setdefault(id(origin), set()).add(instance.deliverable_id)
+
+
+@receiver(post_delete, sender=WorkLog)
+def reconcile_deleted_worklog(sender, instance, origin=None, **kwargs):
+    """
+    Covers every way a work log is deleted: on its own, by a queryset, or in
+    a cascade from its employee, deliverable or project. A delete() removes
+    all its work logs before the first post_delete, so each deliverable is
+    reconciled once, on its first signal.
+    """
+    from .services import worklogs_changed
+
+    pending = _deleting_worklogs.get(id(origin))
+    if pending is None or instance.deliverable_id not in pending:
+        return
+    pending.discard(instance.deliverable_id)
+    if not pending:
+        del _deleting_worklogs[id(origin)]
+    worklogs_changed([instance.deliverable_id])
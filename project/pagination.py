@@ -0,0 +1,18 @@
+"""
+Pagination for the project API.
+
+Work logs (and per-user deliverables) use keyset (cursor) pagination: the
+cursor encodes the position of the last row, so every page is one index
+range scan whatever its depth, unlike OFFSET pages that get slower the
+further a client pages into a long history. Other lists use the
+project-wide limit/offset default (webdjango.pagination).
+"""
+from webdjango.pagination import TimeOrderedCursorPagination
+
+
+class WorkLogCursorPagination(TimeOrderedCursorPagination):
+    ordering = ('start_time', 'id')
+
+
+class DeliverableCursorPagination(TimeOrderedCursorPagination):
+    ordering = ('id',)
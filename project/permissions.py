@@ -0,0 +1,56 @@
+"""
+Organisation-based permissions for the project API.
+
+Decisions are answered from the requesting user's organisation -> role map
+(OrganisationMembership.roles_for_user), which is cached across requests
+and memoised on the request, so a permission check costs no queries once
+the cache is warm.
+"""
+from rest_framework.permissions import BasePermission
+
+from .models import OrganisationMembership
+
+
+def get_organisation_roles(request):
+    """The requesting user's organisation id -> role map, loaded at most once per request."""
+    roles = getattr(request, '_organisation_roles', None)
+    if roles is None:
+        roles = OrganisationMembership.roles_for_user(request.user.pk) if request.user.is_authenticated else {}
+        request._organisation_roles = roles
+    return roles
+
+
+def shares_organisation(request, user_id):
+    """Whether the requesting user and ``user_id`` are members of a common organisation."""
+    return not get_organisation_roles(request).keys().isdisjoint(OrganisationMembership.roles_for_user(user_id))
+
+
+def has_organisation_role(request, organisation_id, *roles):
+    """Whether the requesting user belongs to ``organisation_id``, with one of ``roles`` if any are given."""
+    role = get_organisation_roles(request).get(int(organisation_id))
+    return role is not None and (not roles or role in roles)
+
+
+class SharesOrganisation(BasePermission):
+    """Allows access when the requesting user shares an organisation with the ``user_id`` in the URL."""
+    message = 'Not authorized to view this user.'
+
+    def has_permission(self, request, view):
+        return shares_organisation(request, view.kwargs['user_id'])
+
+
+class HasOrganisationRole(BasePermission):
+    """
+    Allows access to members of the ``organisation_id`` in the URL. Subclass
+    with ``roles`` (or use ``HasOrganisationRole.with_roles('admin', ...)``)
+    to require specific roles.
+    """
+    message = 'Not authorized for this organisation.'
+    roles = ()
+
+    def has_permission(self, request, view):
+        return has_organisation_role(request, view.kwargs['organisation_id'], *self.roles)
+
+    @classmethod
+    def with_roles(cls, *roles):
+        return type(f"{cls.__name__}({', '.join(roles)})", (cls,), {'roles': roles})
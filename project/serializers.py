@@ -98,7 +98,20 @@ class UserOrganisationMembershipSerializer(serializers.ModelSerializer):
         model = OrganisationMembership
         fields = ['id', 'organisation', 'role']
 
-class UserDeliverableSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Serializer mixin taking a ``fields`` argument (e.g. from ``?fields=id,name``)
+    that limits the output to those fields.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class UserDeliverableSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     project = SimpleProjectSerializer()
     stage_name = serializers.CharField(source='get_stage_display', read_only=True)
     status_name = serializers.CharField(source='get_status_display', read_only=True)
@@ -108,30 +121,16 @@ class UserDeliverableSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'project', 'stage', 'stage_name', 'status', 'status_name', 
                  'start_date', 'end_date', 'validation_date']
 
-class UserWorkLogSerializer(serializers.ModelSerializer):
+class UserWorkLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     deliverable = serializers.StringRelatedField()
-    project = serializers.SerializerMethodField()
-    organisation = serializers.SerializerMethodField()
-    duration = serializers.SerializerMethodField()
-    duration = serializers.SerializerMethodField()
+    project = serializers.CharField(source='deliverable.project.name', read_only=True)
+    organisation = serializers.CharField(source='deliverable.project.organisation.name', read_only=True)
+    duration = serializers.FloatField(source='duration_hours', read_only=True)  # in hours
 
     class Meta:
         model = WorkLog
         fields = ['id', 'deliverable', 'project', 'organisation', 'start_time', 'end_time', 'duration', 'remarks']
 
-    def get_project(self, obj):
-        return obj.deliverable.project.name if obj.deliverable and obj.deliverable.project else None
-
-    def get_organisation(self, obj):
-        if obj.deliverable and obj.deliverable.project and obj.deliverable.project.organisation:
-            return obj.deliverable.project.organisation.name
-        return None
-
-    def get_duration(self, obj):
-        if obj.end_time and obj.start_time:
-            return (obj.end_time - obj.start_time).total_seconds() / 3600  # in hours
-        return None
-
 
 class ExpenseSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -0,0 +1,124 @@
+"""
+Set-based maintenance of data derived from work logs.
+
+Deliverable status/start date, the per-deliverable time rollups and the
+cached analytics all depend on the deliverable's work logs. Rather than
+re-deriving them per row, callers collect the affected deliverable IDs and
+pass them to worklogs_changed() once: work log saves, CSV imports and
+every delete, including queryset deletes and cascades (see the WorkLog
+delete signals in project.models), route through it. Queryset update()
+calls do not; `manage.py rebuild_time_rollups` corrects the rollups after
+them and should run periodically.
+"""
+from datetime import timedelta
+
+from django.db.models import (
+    Case, When, Value, F, Q, Min, Max, Sum, Count, DateField, DurationField, ExpressionWrapper,
+)
+from django.db.models.functions import Coalesce
+
+from .analytics import bump_worklog_data_version
+from .models import Deliverable, WorkLog, DeliverableTimeRollup
+
+
+def worklogs_changed(deliverable_ids):
+    """Update everything derived from the work logs of the given deliverables."""
+    deliverable_ids = {pk for pk in deliverable_ids if pk is not None}
+    reconcile_deliverable_status(deliverable_ids)
+    refresh_time_rollups(deliverable_ids)
+    if deliverable_ids:
+        bump_worklog_data_version()
+
+
+def reconcile_deliverable_status(deliverable_ids):
+    """
+    Bring status and start_date of the given deliverables in line with their
+    work logs.
+
+    One grouped query finds which deliverables have work logs and their
+    earliest start time; one UPDATE then applies the transitions:
+    not_started -> ongoing when work logs exist, ongoing -> not_started when
+    none remain, and start_date is filled from the earliest work log when
+    it is not set. Validation statuses are left untouched.
+    """
+    deliverable_ids = {pk for pk in deliverable_ids if pk is not None}
+    if not deliverable_ids:
+        return
+    first_starts = dict(
+        WorkLog.objects.filter(deliverable_id__in=deliverable_ids)
+        .order_by()
+        .values('deliverable_id')
+        .annotate(first_start=Min('start_time'))
+        .values_list('deliverable_id', 'first_start')
+    )
+    with_logs = list(first_starts)
+    Deliverable.objects.filter(pk__in=deliverable_ids).update(
+        status=Case(
+            When(Q(pk__in=with_logs, status='not_started'), then=Value('ongoing')),
+            When(Q(status='ongoing') & ~Q(pk__in=with_logs), then=Value('not_started')),
+            default=F('status'),
+        ),
+        start_date=Case(
+            *[
+                When(pk=pk, start_date__isnull=True, then=Value(first_start.date()))
+                for pk, first_start in first_starts.items()
+            ],
+            default=F('start_date'),
+            output_field=DateField(),
+        ),
+    )
+
+
+def compute_time_rollups(worklogs):
+    """
+    Aggregate ``worklogs`` (a WorkLog queryset) per deliverable in one grouped
+    query; returns unsaved DeliverableTimeRollup objects.
+    """
+    rows = (
+        worklogs.order_by()
+        .values('deliverable_id')
+        .annotate(
+            total_duration=Sum(
+                ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField()),
+                filter=Q(end_time__isnull=False),
+            ),
+            worklog_count=Count('id'),
+            first_activity=Min('start_time'),
+            last_activity=Max(Coalesce('end_time', 'start_time')),
+        )
+    )
+    return [
+        DeliverableTimeRollup(
+            deliverable_id=row['deliverable_id'],
+            total_duration=row['total_duration'] or timedelta(0),
+            worklog_count=row['worklog_count'],
+            first_activity=row['first_activity'],
+            last_activity=row['last_activity'],
+        )
+        for row in rows
+    ]
+
+
+def save_time_rollups(rollups):
+    DeliverableTimeRollup.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=['deliverable'],
+        update_fields=['total_duration', 'worklog_count', 'first_activity', 'last_activity', 'updated_at'],
+    )
+
+
+def refresh_time_rollups(deliverable_ids):
+    """
+    Recompute the time rollups of the given deliverables from their work
+    logs: one grouped query, one upsert, and one DELETE for deliverables
+    that no longer have any work logs.
+    """
+    deliverable_ids = {pk for pk in deliverable_ids if pk is not None}
+    if not deliverable_ids:
+        return
+    rollups = compute_time_rollups(WorkLog.objects.filter(deliverable_id__in=deliverable_ids))
+    save_time_rollups(rollups)
+    DeliverableTimeRollup.objects.filter(deliverable_id__in=deliverable_ids).exclude(
+        deliverable_id__in=[rollup.deliverable_id for rollup in rollups]
+    ).delete()
@@ -1,3 +1,492 @@
-from django.test import TestCase
+import csv
+import io
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .importers import import_worklogs
+from .models import (
+    MEMBERSHIP_CACHE_TIMEOUT, Deliverable, DeliverableTimeRollup, Expense, Organisation, OrganisationMembership, Project,
+    WorkLog,
+    membership_cache_key,
+)
+from .permissions import has_organisation_role
+from .services import compute_time_rollups, reconcile_deliverable_status
+
+User = get_user_model()
+
+
+class ProjectTestCase(TestCase):
+    """One organisation with a project and a deliverable, and a user to log time."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='employee@example.com', password='x')
+        cls.organisation = Organisation.objects.create(name='Org')
+        cls.project = Project.objects.create(
+            name='Project', location='Site', client_name='Client', organisation=cls.organisation
+        )
+        cls.deliverable = Deliverable.objects.create(project=cls.project, name='Plan', stage='1')
+
+
+class ImportWorkLogsTests(ProjectTestCase):
+    """import_worklogs upserts on (employee, deliverable, start time)."""
+
+    def row(self, start, end=''):
+        return {
+            'Employee': self.user.email, 'Project': 'Project', 'Deliverable': 'Plan',
+            'Start Time': start, 'End Time': end,
+        }
+
+    def test_reimport_updates_instead_of_duplicating(self):
+        result = import_worklogs([self.row('2024-01-01 09:00:00'), self.row('2024-01-02 09:00:00')])
+        self.assertEqual((result['created'], result['updated'], result['errors']), (2, 0, []))
+
+        result = import_worklogs([
+            self.row('2024-01-01 09:00:00', '2024-01-01 12:00:00'),
+            self.row('2024-01-03 09:00:00'),
+        ])
+        self.assertEqual((result['created'], result['updated'], result['errors']), (1, 1, []))
+
+        self.assertEqual(WorkLog.objects.count(), 3)
+        updated = WorkLog.objects.get(start_time__day=1)
+        self.assertEqual(updated.duration_hours, 3)
+
+    def test_repeated_key_within_one_batch_counts_as_update(self):
+        result = import_worklogs([
+            self.row('2024-01-01 09:00:00'),
+            self.row('2024-01-01 09:00:00', '2024-01-01 10:00:00'),
+        ])
+        self.assertEqual((result['created'], result['updated']), (1, 1))
+        self.assertEqual(WorkLog.objects.get().duration_hours, 1)
+
+    def test_unknown_employee_is_reported_per_row(self):
+        rows = [self.row('2024-01-01 09:00:00'), dict(self.row('2024-01-02 09:00:00'), Employee='nobody@example.com')]
+        result = import_worklogs(rows)
+        self.assertEqual((result['created'], result['updated']), (1, 0))
+        self.assertEqual(result['errors'], ["Row 3: Employee with email 'nobody@example.com' not found"])
+
+
+class ReconcileDeliverableStatusTests(ProjectTestCase):
+    """Deliverable status and start date follow the deliverable's work logs."""
+
+    def log(self, deliverable, day=1):
+        return WorkLog.objects.create(
+            employee=self.user,
+            deliverable=deliverable,
+            start_time=timezone.make_aware(datetime(2024, 1, day, 9)),
+        )
+
+    def status(self, deliverable):
+        deliverable.refresh_from_db(fields=['status', 'start_date'])
+        return deliverable.status
+
+    def test_first_log_starts_the_deliverable_and_sets_start_date(self):
+        self.log(self.deliverable, day=5)
+        self.log(self.deliverable, day=3)
+        self.assertEqual(self.status(self.deliverable), 'ongoing')
+        self.assertEqual(self.deliverable.start_date, date(2024, 1, 5))
+
+    def test_deleting_the_last_log_resets_to_not_started(self):
+        first, second = self.log(self.deliverable, day=1), self.log(self.deliverable, day=2)
+        first.delete()
+        self.assertEqual(self.status(self.deliverable), 'ongoing')
+        second.delete()
+        self.assertEqual(self.status(self.deliverable), 'not_started')
+
+    def test_moving_a_log_reconciles_both_deliverables(self):
+        other = Deliverable.objects.create(project=self.project, name='Section', stage='1')
+        worklog = self.log(self.deliverable)
+
+        worklog.deliverable = other
+        worklog.save()
+
+        self.assertEqual(self.status(self.deliverable), 'not_started')
+        self.assertEqual(self.status(other), 'ongoing')
+
+    def test_validation_statuses_are_left_alone(self):
+        worklog = self.log(self.deliverable)
+        Deliverable.objects.filter(pk=self.deliverable.pk).update(status='passed')
+        worklog.delete()
+        reconcile_deliverable_status([self.deliverable.pk])
+        self.assertEqual(self.status(self.deliverable), 'passed')
+
+
+class TimeRollupTests(ProjectTestCase):
+    """DeliverableTimeRollup stays equal to a fresh aggregate of the work logs."""
+
+    def assertRollupsCurrent(self, *deliverables):
+        for deliverable in deliverables:
+            fresh = compute_time_rollups(WorkLog.objects.filter(deliverable=deliverable))
+            stored = DeliverableTimeRollup.objects.filter(deliverable=deliverable)
+            self.assertEqual(
+                [(r.total_duration, r.worklog_count, r.first_activity, r.last_activity) for r in stored],
+                [(r.total_duration, r.worklog_count, r.first_activity, r.last_activity) for r in fresh],
+            )
+
+    def test_rollups_follow_save_move_and_delete(self):
+        other = Deliverable.objects.create(project=self.project, name='Section', stage='1')
+        start = timezone.make_aware(datetime(2024, 1, 1, 9))
+
+        worklog = WorkLog.objects.create(employee=self.user, deliverable=self.deliverable, start_time=start)
+        WorkLog.objects.create(
+            employee=self.user, deliverable=self.deliverable,
+            start_time=start + timedelta(days=1), end_time=start + timedelta(days=1, hours=2),
+        )
+        self.assertRollupsCurrent(self.deliverable, other)
+        self.assertEqual(self.deliverable.time_rollup.total_duration, timedelta(hours=2))
+
+        worklog.end_time = start + timedelta(hours=3)
+        worklog.save()
+        self.assertRollupsCurrent(self.deliverable, other)
+
+        worklog.deliverable = other
+        worklog.save()
+        self.assertRollupsCurrent(self.deliverable, other)
+        self.assertEqual(DeliverableTimeRollup.objects.get(deliverable=other).total_duration, timedelta(hours=3))
+
+        worklog.delete()
+        self.assertRollupsCurrent(self.deliverable, other)
+        self.assertFalse(DeliverableTimeRollup.objects.filter(deliverable=other).exists())
+
+    def log(self, employee, deliverable, day):
+        start = timezone.make_aware(datetime(2024, 1, day, 9))
+        return WorkLog.objects.create(employee=employee, deliverable=deliverable, start_time=start, end_time=start + timedelta(hours=1))
+
+    def test_rollups_follow_queryset_and_cascade_deletes(self):
+        other = Deliverable.objects.create(project=self.project, name='Section', stage='1')
+        leaver = User.objects.create_user(email='leaver@example.com', password='x')
+        for day in (1, 2, 3):
+            self.log(self.user, self.deliverable, day)
+            self.log(leaver, self.deliverable, day)
+            self.log(leaver, other, day)
+
+        WorkLog.objects.filter(employee=self.user, start_time__day=1).delete()
+        self.assertRollupsCurrent(self.deliverable, other)
+        self.assertEqual(DeliverableTimeRollup.objects.get(deliverable=self.deliverable).worklog_count, 5)
+
+        # Each deliverable is reconciled once per delete, not once per work log
+        with mock.patch('project.services.worklogs_changed') as worklogs_changed:
+            User.objects.filter(pk=leaver.pk).delete()
+        self.assertCountEqual([c.args[0] for c in worklogs_changed.call_args_list], [[self.deliverable.pk], [other.pk]])
+
+        leaver = User.objects.create_user(email='leaver2@example.com', password='x')
+        self.log(leaver, self.deliverable, 4)
+        self.log(leaver, other, 4)
+        leaver.delete()
+        self.assertRollupsCurrent(self.deliverable, other)
+        self.assertEqual(DeliverableTimeRollup.objects.get(deliverable=self.deliverable).worklog_count, 2)
+        self.assertFalse(DeliverableTimeRollup.objects.filter(deliverable=other).exists())
+        self.assertEqual(Deliverable.objects.get(pk=other.pk).status, 'not_started')
+
+
+class MembershipCacheTests(ProjectTestCase):
+    """Membership changes take effect on the next permission check."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/organisations/{self.organisation.pk}/projects/'
+
+    def roles_request(self, user=None):
+        # A fresh request, so nothing is memoised from an earlier check
+        return SimpleNamespace(user=user or self.user)
+
+    def test_granting_and_revoking_membership_applies_at_once(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get('/api/projects/').json()['results'], [])
+
+        membership = OrganisationMembership.objects.create(organisation=self.organisation, user=self.user, role='member')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(len(self.client.get('/api/projects/').json()['results']), 1)
+
+        membership.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get('/api/projects/').json()['results'], [])
+
+    def test_role_change_applies_at_once(self):
+        membership = OrganisationMembership.objects.create(organisation=self.organisation, user=self.user, role='member')
+        self.assertFalse(has_organisation_role(self.roles_request(), self.organisation.pk, 'admin'))
+
+        membership.role = 'admin'
+        membership.save()
+        self.assertTrue(has_organisation_role(self.roles_request(), self.organisation.pk, 'admin'))
+
+    def test_reassigned_membership_moves_access_between_users(self):
+        other = User.objects.create_user(email='other@example.com', password='x')
+        membership = OrganisationMembership.objects.create(organisation=self.organisation, user=self.user, role='member')
+        self.assertTrue(has_organisation_role(self.roles_request(), self.organisation.pk))
+        self.assertFalse(has_organisation_role(self.roles_request(other), self.organisation.pk))
+
+        membership.user = other
+        membership.save()
+        self.assertFalse(has_organisation_role(self.roles_request(), self.organisation.pk))
+        self.assertTrue(has_organisation_role(self.roles_request(other), self.organisation.pk))
+
+    def test_roles_cached_before_commit_are_evicted_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            OrganisationMembership.objects.create(organisation=self.organisation, user=self.user, role='member')
+            # What a concurrent request could cache before this transaction commits
+            cache.set(membership_cache_key(self.user.pk), {}, MEMBERSHIP_CACHE_TIMEOUT)
+        self.assertTrue(has_organisation_role(self.roles_request(), self.organisation.pk))
+
+
+class CrossTenantWriteTests(ProjectTestCase):
+    """Objects cannot be created in, or moved into, an organisation the user doesn't belong to."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        OrganisationMembership.objects.create(organisation=cls.organisation, user=cls.user, role='member')
+        cls.other_organisation = Organisation.objects.create(name='Other Org')
+        cls.other_project = Project.objects.create(
+            name='Other Project', location='Elsewhere', client_name='Client', organisation=cls.other_organisation
+        )
+        cls.other_deliverable = Deliverable.objects.create(project=cls.other_project, name='Survey', stage='1')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def project_data(self, organisation):
+        return {'name': 'New', 'location': 'Site', 'client_name': 'Client', 'current_stage': '1', 'organisation': organisation.pk}
+
+    def test_project_create_and_move(self):
+        response = self.client.post('/api/projects/', self.project_data(self.other_organisation))
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Project.objects.filter(name='New').exists())
+
+        self.assertEqual(self.client.post('/api/projects/', self.project_data(self.organisation)).status_code, 201)
+
+        url = f'/api/projects/{self.project.pk}/'
+        self.assertEqual(self.client.patch(url, {'organisation': self.other_organisation.pk}).status_code, 403)
+        self.assertEqual(self.client.patch(url, {'name': 'Renamed'}).status_code, 200)
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.organisation_id, self.project.name), (self.organisation.pk, 'Renamed'))
+
+    def test_deliverable_create_and_move(self):
+        data = {'name': 'Elevation', 'stage': '1', 'status': 'not_started'}
+        response = self.client.post('/api/deliverables/', dict(data, project=self.other_project.pk))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.post('/api/deliverables/', dict(data, project=self.project.pk)).status_code, 201)
+
+        url = f'/api/deliverables/{self.deliverable.pk}/'
+        self.assertEqual(self.client.patch(url, {'project': self.other_project.pk}).status_code, 403)
+        self.deliverable.refresh_from_db()
+        self.assertEqual(self.deliverable.project_id, self.project.pk)
+
+    def test_worklog_create_and_move(self):
+        data = {'start_time': '2024-01-01T09:00:00Z'}
+        response = self.client.post('/api/work-logs/', dict(data, deliverable=self.other_deliverable.pk))
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(self.other_deliverable.worklogs.exists())
+
+        response = self.client.post('/api/work-logs/', dict(data, deliverable=self.deliverable.pk))
+        self.assertEqual(response.status_code, 201)
+
+        url = f"/api/work-logs/{response.json()['id']}/"
+        self.assertEqual(self.client.patch(url, {'deliverable': self.other_deliverable.pk}).status_code, 403)
+        self.assertEqual(WorkLog.objects.get().deliverable_id, self.deliverable.pk)
+
+    def test_expense_create_and_move(self):
+        data = {'amount': '12.50', 'category': 'travel', 'date': '2024-01-01'}
+        response = self.client.post('/api/expenses/', dict(data, project_id=self.other_project.pk))
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.post('/api/expenses/', dict(data, project_id=self.project.pk))
+        self.assertEqual(response.status_code, 201)
+
+        url = f"/api/expenses/{response.json()['id']}/"
+        self.assertEqual(self.client.patch(url, {'project_id': self.other_project.pk}).status_code, 403)
+        self.assertEqual(Expense.objects.get().project_id, self.project.pk)
+
+
+class CSVExportTests(ProjectTestCase):
+    """The CSV exports stream joined rows and honour the project and date filters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        OrganisationMembership.objects.create(organisation=cls.organisation, user=cls.user, role='member')
+        other_project = Project.objects.create(
+            name='Other', location='Site', client_name='Client', organisation=cls.organisation
+        )
+        cls.other_deliverable = Deliverable.objects.create(
+            project=other_project, name='Survey', stage='1', start_date=date(2024, 2, 1)
+        )
+        for deliverable, day in ((cls.deliverable, 1), (cls.deliverable, 2), (cls.other_deliverable, 3)):
+            WorkLog.objects.create(
+                employee=cls.user, deliverable=deliverable, remarks=f'Day {day}',
+                start_time=timezone.make_aware(datetime(2024, 1, day, 23, 30)),
+                end_time=timezone.make_aware(datetime(2024, 1, day + 1, 0, 30)),
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_worklog_export(self):
+        rows = self.export('/api/work-logs/download_csv/')
+        self.assertEqual(rows[0], ['Employee', 'Project', 'Deliverable', 'Start Time', 'End Time', 'remarks'])
+        self.assertEqual([row[5] for row in rows[1:]], ['Day 1', 'Day 2', 'Day 3'])
+        self.assertEqual(rows[3][:3], [self.user.email, 'Other', 'Survey'])
+
+        rows = self.export('/api/work-logs/download_csv/', project=self.project.pk, start_date='2024-01-02')
+        self.assertEqual([row[5] for row in rows[1:]], ['Day 2'])
+        # The end date is inclusive, up to midnight
+        rows = self.export('/api/work-logs/download_csv/', end_date='2024-01-02')
+        self.assertEqual([row[5] for row in rows[1:]], ['Day 1', 'Day 2'])
+
+    def test_deliverable_export(self):
+        rows = self.export('/api/deliverables/download_csv/', start_date='2024-02-01')
+        self.assertEqual(rows, [
+            ['Project', 'Name', 'Stage', 'Status', 'Remarks', 'Start Date', 'End Date'],
+            ['Other', 'Survey', '1', 'ongoing', '', '2024-02-01', ''],
+        ])
+
+    def test_malformed_filters_are_rejected(self):
+        for params in ({'project': 'abc'}, {'start_date': '01/02/2024'}):
+            response = self.client.get('/api/work-logs/download_csv/', params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class WorkLogAnalyticsTests(ProjectTestCase):
+    """Work log durations bucketed by period and grouped in SQL, cached until logs change."""
+
+    url = '/api/work-logs/analytics/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        OrganisationMembership.objects.create(organisation=cls.organisation, user=cls.user, role='member')
+        cls.other_deliverable = Deliverable.objects.create(project=cls.project, name='Section', stage='1')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def log(self, deliverable, day, hours, month=1, hour=9):
+        start = timezone.make_aware(datetime(2024, month, day, hour))
+        return WorkLog.objects.create(
+            employee=self.user, deliverable=deliverable, start_time=start,
+            end_time=start + timedelta(hours=hours) if hours else None,
+        )
+
+    def series(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(r['period'], r['name'], r['duration_seconds'], r['worklog_count']) for r in response.json()['results']]
+
+    def test_day_and_month_buckets(self):
+        self.log(self.deliverable, 1, 2)
+        self.log(self.deliverable, 1, 1, hour=14)
+        self.log(self.other_deliverable, 2, 3)
+        self.log(self.deliverable, 3, 4, month=2)
+        self.log(self.deliverable, 4, None)  # still running: not counted
+
+        self.assertEqual(self.series(bucket='day', group_by='deliverable'), [
+            ('2024-01-01', 'Plan', 3 * 3600, 2),
+            ('2024-01-02', 'Section', 3 * 3600, 1),
+            ('2024-02-03', 'Plan', 4 * 3600, 1),
+        ])
+        self.assertEqual(self.series(bucket='month', group_by='project'), [
+            ('2024-01-01', 'Project', 6 * 3600, 3),
+            ('2024-02-01', 'Project', 4 * 3600, 1),
+        ])
+        self.assertEqual(self.series(bucket='month', start_date='2024-02-01'), [('2024-02-01', 'Project', 4 * 3600, 1)])
+
+    def test_cached_series_is_invalidated_by_new_logs(self):
+        self.log(self.deliverable, 1, 2)
+        self.assertEqual(self.series(), [('2024-01-01', 'Project', 2 * 3600, 1)])
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        self.log(self.deliverable, 1, 1, hour=14)
+        self.assertEqual(self.series(), [('2024-01-01', 'Project', 3 * 3600, 2)])
+
+    def test_revoked_membership_is_not_served_from_the_cache(self):
+        self.log(self.deliverable, 1, 2)
+        self.assertEqual(len(self.series()), 1)
+
+        OrganisationMembership.objects.filter(organisation=self.organisation, user=self.user).delete()
+        self.assertEqual(self.series(), [])
+
+    def test_invalid_parameters(self):
+        for params in ({'bucket': 'year'}, {'group_by': 'shop'}, {'employee': 'me'}, {'end_date': 'tomorrow'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+class UserListPaginationTests(ProjectTestCase):
+    """Per-user work logs and deliverables are paged by cursor, with optional field selection."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        OrganisationMembership.objects.create(organisation=cls.organisation, user=cls.user, role='member')
+        # Created out of order so the cursor has to follow start_time, not id
+        for day in (4, 2, 5, 1, 3):
+            WorkLog.objects.create(
+                employee=cls.user, deliverable=cls.deliverable,
+                start_time=timezone.make_aware(datetime(2024, 1, day, 9)),
+                end_time=timezone.make_aware(datetime(2024, 1, day, 11)),
+            )
+        for name in ('Section', 'Elevation', 'Detail'):
+            Deliverable.objects.create(project=cls.project, name=name, stage='1', assignee=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def pages(self, url):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append(data['results'])
+            url = data['next']
+        return pages
+
+    def test_worklogs_are_paged_in_start_time_order(self):
+        pages = self.pages(f'/api/users/{self.user.pk}/worklogs/?page_size=2&fields=start_time,duration')
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        results = [row for page in pages for row in page]
+        self.assertEqual([row['start_time'][:10] for row in results], [f'2024-01-0{day}' for day in range(1, 6)])
+        self.assertEqual(set(results[0]), {'start_time', 'duration'})
+        self.assertEqual(results[0]['duration'], 2.0)
+
+    def test_page_queries_do_not_grow_with_depth(self):
+        url = f'/api/users/{self.user.pk}/worklogs/?page_size=1'
+        with CaptureQueriesContext(connection) as first:
+            url = self.client.get(url).json()['next']
+        for _ in range(3):
+            url = self.client.get(url).json()['next']
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(url)
+        self.assertEqual(len(first), len(deep))
+
+    def test_deliverables_are_paged_by_id(self):
+        pages = self.pages(f'/api/users/{self.user.pk}/deliverables/?page_size=2&fields=id,name')
+
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        self.assertEqual([row['name'] for page in pages for row in page], ['Section', 'Elevation', 'Detail'])
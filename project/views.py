@@ -1,17 +1,23 @@
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import viewsets, status
-from django.db.models import Sum, F, ExpressionWrapper, DurationField
-from django.http import HttpResponse
-import csv
-from io import TextIOWrapper
-from datetime import datetime
+from django.db.models import Sum
+from datetime import date, datetime, time, timedelta
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db import transaction
 
-from .models import Project, WorkLog, Deliverable
+from .models import Project, WorkLog, Deliverable, DeliverableTimeRollup
+from .permissions import SharesOrganisation, HasOrganisationRole, get_organisation_roles, has_organisation_role
+from .pagination import WorkLogCursorPagination, DeliverableCursorPagination
+from .analytics import BUCKETS, GROUPS, cached_worklog_time_series
+from .importers import import_worklogs, import_deliverables, WORKLOG_CSV_FIELDS, DELIVERABLE_CSV_FIELDS
+from imports.background import should_run_in_background, enqueue_import
+from webdjango.csv_ingest import csv_dict_reader
+from webdjango.pagination import cursor_pagination
+from webdjango.streaming import stream_csv, StreamingExportMixin
 from .serializers import ProjectSerializer, WorkLogSerializer, DeliverableSerializer, OrganisationMembershipSerializer, UserDetailSerializer,UserOrganisationMembershipSerializer,  UserDeliverableSerializer, UserWorkLogSerializer
 from rest_framework.views import APIView
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from .models import OrganisationMembership,Organisation, Project, Expense
 from .serializers import OrganisationSerializer, SimpleProjectSerializer, ExpenseSerializer
@@ -21,6 +27,9 @@ from .serializers import OrganisationSerializer, SimpleProjectSerializer, Expens
 
 User = get_user_model()
 
+# Rows fetched per round trip when streaming CSV exports
+CSV_EXPORT_CHUNK_SIZE = 2000
+
 class MyMembershipsView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -41,46 +50,92 @@ class OrganisationListView(APIView):
         return Response(serializer.data)
 
 class OrganisationProjectsView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasOrganisationRole]
 
     def get(self, request, organisation_id):
-        # Check if user is a member of this organisation
-        if not OrganisationMembership.objects.filter(user=request.user, organisation_id=organisation_id).exists():
-            return Response({'detail': 'Not authorized for this organisation.'}, status=403)
-
         # Get projects inside this organisation
         projects = Project.objects.filter(organisation_id=organisation_id)
         serializer = SimpleProjectSerializer(projects, many=True)
         return Response(serializer.data)
     
 
-from django.db.models import F, Sum, ExpressionWrapper, DurationField
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import viewsets
 from .models import Project, WorkLog
 from .serializers import ProjectSerializer
 
-class ProjectViewSet(viewsets.ModelViewSet):
-    queryset = Project.objects.all()
+def check_organisation_access(request, organisation_id):
+    """Raise PermissionDenied unless the requesting user may write to ``organisation_id``."""
+    user = request.user
+    if user.is_staff or user.is_superuser:
+        return
+    if organisation_id is None or not has_organisation_role(request, organisation_id):
+        raise PermissionDenied('Not authorized for this organisation.')
+
+
+class OrganisationScopedMixin:
+    """
+    Limits a viewset's queryset to the organisations the requesting user
+    belongs to (staff and superusers see everything), and refuses creates
+    and updates that would place an object in any other organisation.
+    ``organisation_field`` is the lookup from the model to its organisation id.
+    """
+    organisation_field = 'organisation_id'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_staff or user.is_superuser:
+            return queryset
+        return queryset.filter(**{f'{self.organisation_field}__in': list(get_organisation_roles(self.request))})
+
+    def target_organisation_id(self, serializer):
+        """
+        The organisation the object will belong to once saved, following
+        ``organisation_field`` from the validated data (or, for fields not
+        being changed, from the instance).
+        """
+        names = self.organisation_field.split('__')
+        first = names[0].removesuffix('_id')
+        value = serializer.validated_data.get(first, getattr(serializer.instance, first, None))
+        for name in names[1:]:
+            if value is None:
+                return None
+            value = getattr(value, name)
+        return getattr(value, 'pk', value)
+
+    def check_target_organisation(self, serializer):
+        check_organisation_access(self.request, self.target_organisation_id(serializer))
+
+    def perform_create(self, serializer):
+        self.check_target_organisation(serializer)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        self.check_target_organisation(serializer)
+        super().perform_update(serializer)
+
+
+class ProjectViewSet(OrganisationScopedMixin, StreamingExportMixin, viewsets.ModelViewSet):
+    queryset = Project.objects.order_by('name', 'id')
     serializer_class = ProjectSerializer
 
     @action(detail=True, methods=['get'])
     def summary(self, request, pk=None):
         project = self.get_object()
-        logs = WorkLog.objects.filter(deliverable__project=project, end_time__isnull=False)
 
-        total_duration = logs.aggregate(
-            duration=Sum(
-                ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
-            )
-        )['duration']
+        # Durations come from the maintained per-deliverable rollups rather
+        # than a scan of the project's work logs
+        rollups = DeliverableTimeRollup.objects.filter(
+            deliverable__project=project, worklog_count__gt=0
+        ).values_list('deliverable__name', 'total_duration')
 
-        work_summary = logs.values('deliverable__name').annotate(
-            duration=Sum(
-                ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
-            )
-        )
+        total_duration = timedelta(0)
+        work_summary = {}
+        for name, duration in rollups:
+            total_duration += duration
+            work_summary[name] = work_summary.get(name, timedelta(0)) + duration
 
         # Include assignee's name in deliverables
         deliverables = project.deliverables.select_related('assignee').values(
@@ -103,269 +158,192 @@ class ProjectViewSet(viewsets.ModelViewSet):
         return Response({
             'project': project.name,
             'current_stage': project.current_stage,
-            'total_duration_seconds': total_duration.total_seconds() if total_duration else 0,
+            'total_duration_seconds': total_duration.total_seconds(),
             'deliverables_summary': [
                 {
-                    'name': item['deliverable__name'],
-                    'duration_seconds': item['duration'].total_seconds() if item['duration'] else 0
+                    'name': name,
+                    'duration_seconds': duration.total_seconds()
                 }
-                for item in work_summary
+                for name, duration in work_summary.items()
             ],
             'deliverables': deliverables_list
         })
 
-class WorkLogViewSet(viewsets.ModelViewSet):
-    queryset = WorkLog.objects.all()
+def _export_filters(request, project_field, date_field, on_datetime=False):
+    """
+    Queryset filters for the CSV exports from the ``project``, ``start_date``
+    and ``end_date`` query parameters (dates inclusive). With ``on_datetime``
+    the dates become a half-open range of aware datetimes so an index on
+    ``date_field`` can still be used. Raises ValueError on malformed values.
+    """
+    filters = {}
+    project_id = request.query_params.get('project')
+    if project_id:
+        if not project_id.isdigit():
+            raise ValueError("'project' must be a project id")
+        filters[project_field] = int(project_id)
+    for param in ('start_date', 'end_date'):
+        value = request.query_params.get(param)
+        if not value:
+            continue
+        try:
+            day = date.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"'{param}' must be a date in YYYY-MM-DD format")
+        if param == 'end_date' and on_datetime:
+            filters[f'{date_field}__lt'] = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+        elif on_datetime:
+            filters[f'{date_field}__gte'] = timezone.make_aware(datetime.combine(day, time.min))
+        else:
+            filters[f'{date_field}__{"lte" if param == "end_date" else "gte"}'] = day
+    return filters
+
+def _upload_csv(request, kind, required_fields, importer):
+    """Shared body of the work log / deliverable upload_csv actions."""
+    if 'file' not in request.FILES:
+        return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Check file size (e.g., max 5MB)
+    if request.FILES['file'].size > 5 * 1024 * 1024:
+        return Response({'error': 'File size exceeds the 5MB limit.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    reader = csv_dict_reader(request.FILES['file'])
+    if not all(field in (reader.fieldnames or []) for field in required_fields):
+        return Response(
+            {'error': f'CSV file must contain these columns: {", ".join(required_fields)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Large uploads are handed to the import worker instead of blocking this request
+    if should_run_in_background(request, request.FILES['file']):
+        return enqueue_import(request, kind, request.FILES['file'])
+
+    result = importer(reader)
+
+    response_data = {
+        'message': 'CSV import completed',
+        'created': result['created'],
+        'updated': result['updated'],
+    }
+
+    errors = result['errors']
+    if errors:
+        response_data['error_count'] = len(errors)
+        response_data['errors'] = errors
+        return Response(response_data, status=status.HTTP_207_MULTI_STATUS)
+
+    return Response(response_data, status=status.HTTP_201_CREATED)
+
+class WorkLogViewSet(OrganisationScopedMixin, StreamingExportMixin, viewsets.ModelViewSet):
+    queryset = WorkLog.objects.select_related('deliverable')
     serializer_class = WorkLogSerializer
+    pagination_class = WorkLogCursorPagination
+    organisation_field = 'deliverable__project__organisation_id'
 
     def perform_create(self, serializer):
+        self.check_target_organisation(serializer)
         serializer.save(employee=self.request.user)
 
     @action(detail=False, methods=['get'])
     def download_csv(self, request):
-        logs = self.get_queryset()
+        """
+        Stream work logs as CSV from one server-side cursor.
+        Optional filters: ?project=<id>&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+        (inclusive, on the start time).
+        """
+        try:
+            filters = _export_filters(request, 'deliverable__project_id', 'start_time', on_datetime=True)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="worklogs.csv"'
+        rows = self.get_queryset().filter(**filters).order_by('start_time', 'id').values_list(
+            'employee__email',
+            'deliverable__project__name',
+            'deliverable__name',
+            'start_time',
+            'end_time',
+            'remarks',
+        ).iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE)
 
-        writer = csv.writer(response)
-        writer.writerow(['Employee', 'Project', 'Deliverable', 'Start Time', 'End Time', 'remarks'])
+        return stream_csv('worklogs.csv', ['Employee', 'Project', 'Deliverable', 'Start Time', 'End Time', 'remarks'], rows)
 
-        for log in logs:
-            writer.writerow([
-                log.employee.email if log.employee else '',
-                log.deliverable.project.name if log.deliverable and log.deliverable.project else '',
-                log.deliverable.name if log.deliverable else '',
-                log.start_time,
-                log.end_time,
-            ])
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Completed work log durations per time bucket and group.
+        GET /work-logs/analytics/?bucket=day|week|month&group_by=employee|project|deliverable|organisation
+        Optional filters: project=<id>, employee=<id>, start_date / end_date (YYYY-MM-DD).
+        """
+        bucket = request.query_params.get('bucket', 'day')
+        group_by = request.query_params.get('group_by', 'project')
+        if bucket not in BUCKETS:
+            return Response({'error': f"'bucket' must be one of: {', '.join(BUCKETS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if group_by not in GROUPS:
+            return Response({'error': f"'group_by' must be one of: {', '.join(GROUPS)}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        return response
+        try:
+            filters = _export_filters(request, 'deliverable__project_id', 'start_time', on_datetime=True)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        employee_id = request.query_params.get('employee')
+        if employee_id:
+            if not employee_id.isdigit():
+                return Response({'error': "'employee' must be a user id"}, status=status.HTTP_400_BAD_REQUEST)
+            filters['employee_id'] = int(employee_id)
+
+        user = request.user
+        # get_queryset() scopes to these, so a revoked membership must miss the cache
+        organisations = 'all' if user.is_staff or user.is_superuser else sorted(get_organisation_roles(request))
+        results = cached_worklog_time_series(
+            self.get_queryset().filter(**filters),
+            signature={'user': user.pk, 'organisations': organisations, 'filters': filters},
+            bucket=bucket,
+            group_by=group_by,
+        )
+        return Response({'bucket': bucket, 'group_by': group_by, 'results': results})
 
     @action(detail=False, methods=['post'])
     def upload_csv(self, request):
-        # Check file size (e.g., max 5MB)
-        if request.FILES['file'].size > 5 * 1024 * 1024:
-            return Response({'error': 'File size exceeds the 5MB limit.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if 'file' not in request.FILES:
-            return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+        return _upload_csv(request, 'worklogs', WORKLOG_CSV_FIELDS, import_worklogs)
 
-        csv_file = TextIOWrapper(request.FILES['file'].file, encoding='utf-8')
-        reader = csv.DictReader(csv_file)
-
-        required_fields = ['Employee', 'Project', 'Deliverable', 'Start Time']
-        if not all(field in reader.fieldnames for field in required_fields):
-            return Response(
-                {'error': f'CSV file must contain these columns: {", ".join(required_fields)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        created_count = 0
-        updated_count = 0
-        errors = []
-
-        with transaction.atomic():
-            for row_num, row in enumerate(reader, start=2):
-                try:
-                    employee_email = row['Employee'].strip()
-                    project_name = row['Project'].strip()
-                    deliverable_name = row['Deliverable'].strip()
-                    start_time_str = row['Start Time'].strip()
-                    end_time_str = row.get('End Time', '').strip()
-
-                    # Validate employee
-                    try:
-                        employee = User.objects.get(email=employee_email)
-                    except User.DoesNotExist:
-                        errors.append(f"Row {row_num}: Employee with email '{employee_email}' not found")
-                        continue
-
-                    # Validate project
-                    try:
-                        project = Project.objects.get(name=project_name)
-                    except Project.DoesNotExist:
-                        errors.append(f"Row {row_num}: Project '{project_name}' not found")
-                        continue
-
-                    # Get or create deliverable
-                    deliverable, _ = Deliverable.objects.get_or_create(
-                        project=project,
-                        name=deliverable_name,
-                        defaults={'stage': project.current_stage, 'status': 'ongoing'}
-                    )
-
-                    # Parse timestamps
-                    try:
-                        start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S%z')
-                    except ValueError:
-                        try:
-                            start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            errors.append(f"Row {row_num}: Invalid Start Time format. Use 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD HH:MM:SS+TZ'")
-                            continue
-
-                    end_time = None
-                    if end_time_str:
-                        try:
-                            end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S%z')
-                        except ValueError:
-                            try:
-                                end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S')
-                            except ValueError:
-                                errors.append(f"Row {row_num}: Invalid End Time format. Use 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD HH:MM:SS+TZ'")
-                                continue
-
-                    # Create or update worklog
-                    _, created = WorkLog.objects.update_or_create(
-                        employee=employee,
-                        deliverable=deliverable,
-                        start_time=start_time,
-                        defaults={'end_time': end_time}
-                    )
-
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-
-                except Exception as e:
-                    errors.append(f"Row {row_num}: {str(e)}")
-                    continue
-
-        response_data = {
-            'message': 'CSV import completed',
-            'created': created_count,
-            'updated': updated_count,
-        }
-
-        if errors:
-            response_data['error_count'] = len(errors)
-            response_data['errors'] = errors
-            return Response(response_data, status=status.HTTP_207_MULTI_STATUS)
-
-        return Response(response_data, status=status.HTTP_201_CREATED)
-
-class DeliverableViewSet(viewsets.ModelViewSet):
+class DeliverableViewSet(OrganisationScopedMixin, StreamingExportMixin, viewsets.ModelViewSet):
     queryset = Deliverable.objects.all()
     serializer_class = DeliverableSerializer
+    organisation_field = 'project__organisation_id'
 
     @action(detail=False, methods=['get'])
     def download_csv(self, request):
-        deliverables = self.get_queryset()
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="deliverables.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(['Project', 'Name', 'Stage', 'Status', 'Remarks', 'Start Date', 'End Date'])
+        """
+        Stream deliverables as CSV from one server-side cursor.
+        Optional filters: ?project=<id>&start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+        (inclusive, on the deliverable start date).
+        """
+        try:
+            filters = _export_filters(request, 'project_id', 'start_date')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        for deliverable in deliverables:
-            writer.writerow([
-                deliverable.project.name if deliverable.project else '',
-                deliverable.name,
-                deliverable.stage,
-                deliverable.status,
-                deliverable.remarks,
-                deliverable.start_date.strftime('%Y-%m-%d') if deliverable.start_date else '',
-                deliverable.end_date.strftime('%Y-%m-%d') if deliverable.end_date else '',
-            ])
+        rows = self.get_queryset().filter(**filters).values_list(
+            'project__name',
+            'name',
+            'stage',
+            'status',
+            'remarks',
+            'start_date',
+            'end_date',
+        ).iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE)
 
-        return response
+        return stream_csv('deliverables.csv', ['Project', 'Name', 'Stage', 'Status', 'Remarks', 'Start Date', 'End Date'], rows)
 
     @action(detail=False, methods=['post'])
     def upload_csv(self, request):
-        # Check file size (e.g., max 5MB)
-        if request.FILES['file'].size > 5 * 1024 * 1024:
-            return Response({'error': 'File size exceeds the 5MB limit.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if 'file' not in request.FILES:
-            return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
-
-        csv_file = TextIOWrapper(request.FILES['file'].file, encoding='utf-8')
-        reader = csv.DictReader(csv_file)
-
-        required_fields = ['Project', 'Name', 'Stage']
-        if not all(field in reader.fieldnames for field in required_fields):
-            return Response(
-                {'error': f'CSV file must contain these columns: {", ".join(required_fields)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        created_count = 0
-        updated_count = 0
-        errors = []
-
-        with transaction.atomic():
-            for row_num, row in enumerate(reader, start=2):
-                try:
-                    project_name = row['Project'].strip()
-                    name = row['Name'].strip()
-                    stage = row['Stage'].strip()
-                    status_val = row.get('Status', 'not_started').strip()
-                    remarks = row.get('Remarks', '').strip()
-                    start_date_str = row.get('Start Date', '').strip()
-                    end_date_str = row.get('End Date', '').strip()
-
-                    # Validate project
-                    try:
-                        project = Project.objects.get(name=project_name)
-                    except Project.DoesNotExist:
-                        errors.append(f"Row {row_num}: Project '{project_name}' not found")
-                        continue
-
-                    # Parse dates
-                    try:
-                        start_date = datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None
-                        end_date = datetime.strptime(end_date_str, '%Y-%m-%d') if end_date_str else None
-                    except ValueError:
-                        errors.append(f"Row {row_num}: Invalid date format. Use 'YYYY-MM-DD'")
-                        continue
-
-                    # Create or update deliverable
-                    deliverable, created = Deliverable.objects.update_or_create(
-                        project=project,
-                        name=name,
-                        defaults={'stage': stage, 'status': status_val, 'remarks': remarks, 'start_date': start_date, 'end_date': end_date}
-                    )
-
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-
-                except Exception as e:
-                    errors.append(f"Row {row_num}: {str(e)}")
-                    continue
-
-        response_data = {
-            'message': 'CSV import completed',
-            'created': created_count,
-            'updated': updated_count,
-        }
-
-        if errors:
-            response_data['error_count'] = len(errors)
-            response_data['errors'] = errors
-            return Response(response_data, status=status.HTTP_207_MULTI_STATUS)
-
-        return Response(response_data, status=status.HTTP_201_CREATED)
+        return _upload_csv(request, 'deliverables', DELIVERABLE_CSV_FIELDS, import_deliverables)
 
 # Add this class to your views.py
 class OrganisationMembersView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasOrganisationRole]
 
     def get(self, request, organisation_id):
-        # Check if user is a member of this organisation
-        if not OrganisationMembership.objects.filter(
-            user=request.user, 
-            organisation_id=organisation_id
-        ).exists():
-            return Response(
-                {'detail': 'Not authorized for this organisation.'}, 
-                status=status.HTTP_403_FORBIDDEN
-            )
-
         # Get all members of this organisation
         members = OrganisationMembership.objects.filter(
             organisation_id=organisation_id
@@ -379,17 +357,10 @@ class OrganisationMembersView(APIView):
     
 # Add these new views to your existing views.py
 class UserDetailView(APIView):
-    permission_classes = [IsAuthenticated]
+    # Allowed if the requesting user shares any organisation with this user
+    permission_classes = [IsAuthenticated, SharesOrganisation]
 
     def get(self, request, user_id):
-        # Check if requesting user has permission to view this user's details
-        # For simplicity, we'll allow if they share any organization
-        if not OrganisationMembership.objects.filter(
-            user=request.user,
-            organisation__in=OrganisationMembership.objects.filter(user_id=user_id).values('organisation')
-        ).exists():
-            return Response({'detail': 'Not authorized to view this user.'}, status=status.HTTP_403_FORBIDDEN)
-
         try:
             user = User.objects.get(id=user_id)
         except User.DoesNotExist:
@@ -399,53 +370,61 @@ class UserDetailView(APIView):
         return Response(serializer.data)
 
 class UserOrganisationMembershipsView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, SharesOrganisation]
 
     def get(self, request, user_id):
-        # Similar permission check as above
-        if not OrganisationMembership.objects.filter(
-            user=request.user,
-            organisation__in=OrganisationMembership.objects.filter(user_id=user_id).values('organisation')
-        ).exists():
-            return Response({'detail': 'Not authorized to view this user.'}, status=status.HTTP_403_FORBIDDEN)
-
         memberships = OrganisationMembership.objects.filter(user_id=user_id).select_related('organisation')
         serializer = UserOrganisationMembershipSerializer(memberships, many=True)
         return Response(serializer.data)
 
+def _paginated_response(view, queryset, serializer_class):
+    """
+    One cursor page of ``queryset`` serialized with ``serializer_class``,
+    limited to the comma-separated ``?fields=`` when given.
+    """
+    paginator = view.pagination_class()
+    page = paginator.paginate_queryset(queryset, view.request, view=view)
+    fields = [name for name in view.request.query_params.get('fields', '').split(',') if name] or None
+    serializer = serializer_class(page, many=True, fields=fields)
+    return paginator.get_paginated_response(serializer.data)
+
 class UserAssignedDeliverablesView(APIView):
-    permission_classes = [IsAuthenticated]
+    """
+    Deliverables assigned to a user, one cursor page at a time.
+    Optional: ?project=<id>&start_date=&end_date= (YYYY-MM-DD), ?fields=id,name,...
+    """
+    permission_classes = [IsAuthenticated, SharesOrganisation]
+    pagination_class = DeliverableCursorPagination
 
     def get(self, request, user_id):
-        # Similar permission check
-        if not OrganisationMembership.objects.filter(
-            user=request.user,
-            organisation__in=OrganisationMembership.objects.filter(user_id=user_id).values('organisation')
-        ).exists():
-            return Response({'detail': 'Not authorized to view this user.'}, status=status.HTTP_403_FORBIDDEN)
-
-        deliverables = Deliverable.objects.filter(assignee_id=user_id).select_related('project', 'project__organisation')
-        serializer = UserDeliverableSerializer(deliverables, many=True)
-        return Response(serializer.data)
+        try:
+            filters = _export_filters(request, 'project_id', 'start_date')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        deliverables = Deliverable.objects.filter(assignee_id=user_id, **filters).select_related('project')
+        return _paginated_response(self, deliverables, UserDeliverableSerializer)
 
 class UserWorkLogsView(APIView):
-    permission_classes = [IsAuthenticated]
+    """
+    A user's work logs ordered by start time, one cursor page at a time.
+    Optional: ?project=<id>&start_date=&end_date= (YYYY-MM-DD), ?fields=id,start_time,...
+    """
+    permission_classes = [IsAuthenticated, SharesOrganisation]
+    pagination_class = WorkLogCursorPagination
 
     def get(self, request, user_id):
-        # Check if request.user shares any organisation with the user_id
-        if not OrganisationMembership.objects.filter(
-            user=request.user,
-            organisation__in=OrganisationMembership.objects.filter(user_id=user_id).values('organisation')
-        ).exists():
-            return Response({'detail': 'Not authorized to view this user.'}, status=status.HTTP_403_FORBIDDEN)
-
-        worklogs = WorkLog.objects.filter(employee_id=user_id).select_related(
+        try:
+            filters = _export_filters(request, 'deliverable__project_id', 'start_time', on_datetime=True)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        worklogs = WorkLog.objects.filter(employee_id=user_id, **filters).select_related(
             'deliverable',
             'deliverable__project',
             'deliverable__project__organisation'
         )
-        serializer = UserWorkLogSerializer(worklogs, many=True)
-        return Response(serializer.data)
+        return _paginated_response(self, worklogs, UserWorkLogSerializer)
 
     
     
@@ -456,9 +435,10 @@ from rest_framework.response import Response
 from django.db.models import Q, Sum, Count
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(StreamingExportMixin, viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = cursor_pagination('-created_at', '-id')
 
     def get_queryset(self):
         """
@@ -473,8 +453,14 @@ class ExpenseViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         """Automatically set the user to the current user when creating an expense"""
+        check_organisation_access(self.request, serializer.validated_data['project'].organisation_id)
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        project = serializer.validated_data.get('project', serializer.instance.project)
+        check_organisation_access(self.request, project.organisation_id)
+        serializer.save()
+
     def get_permissions(self):
         """
         Only allow admin users to use the 'admin_list' action
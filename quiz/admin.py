@@ -4,7 +4,7 @@ from .models import Question, Exam, QuestionCategory, Score
 
 @admin.register(Exam)
 class ExamAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name']
+    list_display = ['id', 'name', 'negative_marking']
     search_fields = ['name']
 
 
@@ -0,0 +1,51 @@
+"""
+Server-side grading for quiz submissions.
+
+A submission is graded in one pass over parallel vectors (selected option,
+correct option, penalty) built from the questions fetched for it, so the
+score no longer depends on values calculated by the client.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from operator import eq
+
+CENT = Decimal('0.01')
+
+
+def grade_submission(answers, questions, served_ids=None):
+    """
+    Grade ``answers`` ({question_id: selected_option}) against ``questions``
+    ({question_id: Question}, with ``exam`` loaded for negative marking).
+
+    ``served_ids`` are the questions the quiz was made of; unanswered ones
+    count as skipped, so the percentage is over the whole quiz rather than
+    only the questions answered. Without it, the answered questions are the
+    quiz. Each correct answer scores 1, each wrong answer loses the
+    question's ``exam.negative_marking`` and blank or skipped answers score
+    0. Questions not in ``questions`` are ignored. Score and percentage are
+    rounded half up to two decimals.
+    """
+    graded = [qid for qid in (answers if served_ids is None else served_ids) if qid in questions]
+
+    selected = [answers.get(qid) for qid in graded]
+    correct = [questions[qid].correct_option for qid in graded]
+    penalties = [questions[qid].exam.negative_marking for qid in graded]
+
+    is_correct = list(map(eq, selected, correct))
+    marks = [
+        Decimal(1) if ok else (-penalty if answer not in (None, '') else Decimal(0))
+        for ok, answer, penalty in zip(is_correct, selected, penalties)
+    ]
+
+    total = len(graded)
+    score = sum(marks, Decimal(0))
+    percentage = score * 100 / total if total else Decimal(0)
+
+    return {
+        'score': float(score.quantize(CENT, ROUND_HALF_UP)),
+        'total': total,
+        'percentage': float(percentage.quantize(CENT, ROUND_HALF_UP)),
+        'results': [
+            {'id': qid, 'selected': answer, 'is_correct': ok}
+            for qid, answer, ok in zip(graded, selected, is_correct)
+        ],
+    }
@@ -0,0 +1,115 @@
+"""
+Bulk CSV import of quiz questions.
+
+Exam and category names are resolved once per batch against an in-memory
+name cache (missing ones are bulk-created) and questions are inserted with
+``bulk_create``, all inside one transaction. A large upload therefore costs
+a handful of queries per batch instead of three per row.
+"""
+from django.db import transaction
+
+from .models import Exam, QuestionCategory, Question
+
+QUESTION_CSV_FIELDS = [
+    'exam_name', 'category_name', 'question_text',
+    'option_1', 'option_2', 'option_3', 'correct_option'
+]
+
+QUESTION_BATCH_SIZE = 1000
+
+# CSV column -> model field whose max_length bounds it
+_LENGTH_LIMITS = {
+    'exam_name': Exam._meta.get_field('name').max_length,
+    'category_name': QuestionCategory._meta.get_field('name').max_length,
+    'option_1': Question._meta.get_field('option_1').max_length,
+    'option_2': Question._meta.get_field('option_2').max_length,
+    'option_3': Question._meta.get_field('option_3').max_length,
+    'correct_option': Question._meta.get_field('correct_option').max_length,
+}
+
+
+def _validate_row(row):
+    if not all(row.get(field) for field in QUESTION_CSV_FIELDS):
+        return "Missing required field values"
+    too_long = [field for field, limit in _LENGTH_LIMITS.items() if len(row[field]) > limit]
+    if too_long:
+        return f"Values too long for: {', '.join(too_long)}"
+    return None
+
+
+def _resolve_names(model, names, cache):
+    """Fill ``cache`` (name -> id) for ``names``, creating the missing ones in bulk."""
+    missing = set(names) - cache.keys()
+    if not missing:
+        return
+    for name, pk in model.objects.filter(name__in=missing).order_by('-id').values_list('name', 'id'):
+        cache[name] = pk  # ordered so the oldest row wins when names are duplicated
+    new = [model(name=name) for name in missing - cache.keys()]
+    for obj in model.objects.bulk_create(new):
+        cache[obj.name] = obj.pk
+
+
+def _flush(batch, user, exams, categories):
+    _resolve_names(Exam, {row['exam_name'] for row in batch}, exams)
+    _resolve_names(QuestionCategory, {row['category_name'] for row in batch}, categories)
+    Question.objects.bulk_create([
+        Question(
+            exam_id=exams[row['exam_name']],
+            category_id=categories[row['category_name']],
+            question_text=row['question_text'],
+            option_1=row['option_1'],
+            option_2=row['option_2'],
+            option_3=row['option_3'],
+            correct_option=row['correct_option'],
+            explanation=row.get('explanation', ''),
+            user=user
+        )
+        for row in batch
+    ])
+    return len(batch)
+
+
+def import_questions(reader, user, batch_size=QUESTION_BATCH_SIZE, progress=None):
+    """
+    Import questions from a csv.DictReader-like iterable of rows.
+
+    Invalid rows are skipped and reported; everything else is written in
+    one atomic block. Returns a summary dict with ``created``, ``failed``,
+    ``errors`` and ``total_rows_processed``. ``progress``, if given, is
+    called with the running counts after every batch.
+    """
+    exams = {}
+    categories = {}
+    created_count = 0
+    errors = []
+    total_rows = 0
+    batch = []
+
+    with transaction.atomic():
+        for row_num, row in enumerate(reader, start=2):  # Start at 2 for 1-based + header row
+            total_rows += 1
+            error = _validate_row(row)
+            if error:
+                errors.append({
+                    'row': row_num,
+                    'error': error,
+                    'data': {k: v for k, v in row.items() if k in QUESTION_CSV_FIELDS}
+                })
+                continue
+
+            batch.append(row)
+            if len(batch) >= batch_size:
+                created_count += _flush(batch, user, exams, categories)
+                batch = []
+                if progress:
+                    progress(rows_processed=total_rows, created=created_count, failed=len(errors))
+
+        if batch:
+            created_count += _flush(batch, user, exams, categories)
+
+    return {
+        'created': created_count,
+        'failed': len(errors),
+        'errors': errors,
+        'total_rows_processed': total_rows,
+    }
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:40
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_question_created_at_question_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='negative_marking',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Marks deducted for each wrong answer (0 disables negative marking)', max_digits=3, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)]),
+        ),
+    ]
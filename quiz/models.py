@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings  # Recommended way to refer to custom user model
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
 class QuestionCategory(models.Model):
@@ -10,6 +11,13 @@ class QuestionCategory(models.Model):
 
 class Exam(models.Model):
     name = models.CharField(max_length=100)
+    negative_marking = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(1)],
+        help_text="Marks deducted for each wrong answer (0 disables negative marking)"
+    )
 
     def __str__(self):
         return self.name
@@ -37,7 +45,6 @@ class Question(models.Model):
         return self.question_text[:80]
 
 
-
 class Score(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     exam = models.ForeignKey('Exam', on_delete=models.CASCADE, null=True, blank=True)
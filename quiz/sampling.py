@@ -0,0 +1,59 @@
+"""
+Random question sampling for quizzes.
+
+Questions are drawn in the database without ``ORDER BY RANDOM()`` over the
+whole question table. The candidates are counted, distinct random offsets
+are drawn in Python, and each offset is resolved to the question at that
+position in the pool's ID order, so every candidate is equally likely
+however the pool's IDs are spread. Nothing is cached, so every worker sees
+new and deleted questions straight away.
+"""
+import random
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q, Subquery
+
+from .models import Question
+
+
+def pool_queryset(exam_id=None, category_id=None):
+    queryset = Question.objects.order_by()
+    if exam_id:
+        queryset = queryset.filter(exam_id=exam_id)
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    return queryset
+
+
+def _sample(candidates, count):
+    """Up to ``count`` distinct IDs from ``candidates``, each equally likely."""
+    total = candidates.count()
+    if not total:
+        return []
+    ids = candidates.order_by('id').values('id')
+    offsets = random.sample(range(total), min(count, total))
+    picks = [Q(id=Subquery(ids[offset:offset + 1])) for offset in offsets]
+    return list(candidates.filter(reduce(or_, picks)).values_list('id', flat=True))
+
+
+def sample_question_ids(count, exam_id=None, category_id=None, seen_ids=(), exclude_ids=()):
+    """
+    Pick up to ``count`` random question IDs from a pool, preferring unseen
+    ones and never returning any of ``exclude_ids``.
+
+    Seen questions are only used to fill up a quiz when the pool runs out of
+    unseen ones. A question deleted between the count and the pick is simply
+    left out, so fewer than ``count`` IDs may come back.
+    """
+    pool = pool_queryset(exam_id, category_id)
+    excluded = set(exclude_ids)
+    seen = set(seen_ids) - excluded
+
+    picked = _sample(pool.exclude(id__in=excluded | seen), count)
+    if len(picked) < count and seen:
+        picked += _sample(pool.filter(id__in=seen), count - len(picked))
+
+    # Picks come back in ID order
+    random.shuffle(picked)
+    return picked
@@ -21,6 +21,13 @@ class QuestionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class QuizQuestionSerializer(serializers.ModelSerializer):
+    """Question as served to quiz takers; answers are graded server-side."""
+    class Meta:
+        model = Question
+        exclude = ['correct_option']
+
+
 class ScoreSerializer(serializers.ModelSerializer):
     exam = serializers.SerializerMethodField()
     category = serializers.SerializerMethodField()
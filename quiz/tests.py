@@ -1,3 +1,293 @@
+from decimal import Decimal
+import csv
+import io
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import StreamingHttpResponse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from webdjango.csv_ingest import csv_dict_reader
+from webdjango.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+from .grading import grade_submission
+from .importers import import_questions
+from .models import Exam, Question, QuestionCategory, Score
+from .sampling import sample_question_ids
+
+User = get_user_model()
+
+
+class QuizTestCase(TestCase):
+    """An exam and category with a bank of questions whose correct answer is option_1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='quiz@example.com', password='x')
+        cls.exam = Exam.objects.create(name='Architect')
+        cls.category = QuestionCategory.objects.create(name='Compute')
+        cls.questions = cls.add_questions(10)
+
+    @classmethod
+    def add_questions(cls, count, exam=None):
+        return [
+            Question.objects.create(
+                exam=exam or cls.exam, category=cls.category, user=cls.user,
+                question_text=f'Question {i}', option_1='A', option_2='B', option_3='C', correct_option='A',
+            )
+            for i in range(count)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class QuestionSamplingTests(QuizTestCase):
+    """Quizzes are sampled in the database, unseen questions first."""
+
+    def test_samples_distinct_questions_from_the_pool(self):
+        other_exam = Exam.objects.create(name='Developer')
+        self.add_questions(10, exam=other_exam)
+        pool = {question.pk for question in self.questions}
+
+        for _ in range(20):
+            ids = sample_question_ids(5, exam_id=self.exam.pk)
+            self.assertEqual(len(set(ids)), 5)
+            self.assertLessEqual(set(ids), pool)
+
+    def test_unseen_questions_come_first(self):
+        seen = [question.pk for question in self.questions[:7]]
+        unseen = {question.pk for question in self.questions[7:]}
+
+        ids = sample_question_ids(5, exam_id=self.exam.pk, seen_ids=seen)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertLessEqual(unseen, set(ids))
+
+    def test_new_questions_are_sampled_straight_away(self):
+        seen = [question.pk for question in self.questions]
+        new = self.add_questions(1)[0]
+        self.assertIn(new.pk, sample_question_ids(1, exam_id=self.exam.pk, seen_ids=seen))
+
+    def test_empty_pool(self):
+        self.assertEqual(sample_question_ids(5, exam_id=Exam.objects.create(name='Empty').pk), [])
+
+    def test_gaps_in_the_pools_ids_do_not_bias_the_draw(self):
+        exam = Exam.objects.create(name='Interleaved')
+        before_gap = self.add_questions(5, exam=exam)
+        # Another exam's questions leave a wide gap in this pool's IDs
+        self.add_questions(50, exam=Exam.objects.create(name='Other'))
+        after_gap = self.add_questions(5, exam=exam)
+        pool = {question.pk for question in before_gap + after_gap}
+
+        draws = Counter(sample_question_ids(1, exam_id=exam.pk)[0] for _ in range(300))
+        self.assertLessEqual(set(draws), pool)
+        # Each question is expected 30 times
+        self.assertLess(draws[after_gap[0].pk], 60)
+
+    def test_questions_deleted_after_sampling_are_replaced(self):
+        deleted = self.questions[0]
+        first_draw = [question.pk for question in self.questions[:5]]
+
+        def sample(count, *args, **kwargs):
+            if not kwargs.get('exclude_ids'):
+                # Another request deletes a drawn question before it is fetched
+                Question.objects.filter(pk=deleted.pk).delete()
+                return list(first_draw)
+            return sample_question_ids(count, *args, **kwargs)
+
+        with mock.patch('quiz.views.sample_question_ids', side_effect=sample):
+            response = self.client.post('/api/get-quiz/', {'count': 5, 'exam': self.exam.pk}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        ids = [question['id'] for question in response.json()]
+        self.assertEqual(len(set(ids)), 5)
+        self.assertNotIn(deleted.pk, ids)
+
+
+def graded_questions(count, negative_marking='0'):
+    exam = SimpleNamespace(negative_marking=Decimal(negative_marking))
+    return {qid: SimpleNamespace(correct_option='A', exam=exam) for qid in range(1, count + 1)}
+
+
+class GradeSubmissionTests(TestCase):
+    """Scores use Decimal arithmetic over every question served."""
+
+    def test_wrong_answers_lose_the_exams_negative_marking(self):
+        result = grade_submission({1: 'A', 2: 'A', 3: 'B'}, graded_questions(3, '0.25'))
+        self.assertEqual((result['score'], result['total'], result['percentage']), (1.75, 3, 58.33))
+        self.assertEqual([r['is_correct'] for r in result['results']], [True, True, False])
+
+    def test_blank_answers_are_not_penalised(self):
+        result = grade_submission({1: 'A', 2: '', 3: None}, graded_questions(3, '1'))
+        self.assertEqual((result['score'], result['percentage']), (1.0, 33.33))
+
+    def test_skipped_questions_count_towards_the_total(self):
+        questions = graded_questions(50)
+        result = grade_submission({1: 'A'}, questions, served_ids=list(questions))
+        self.assertEqual((result['score'], result['total'], result['percentage']), (1.0, 50, 2.0))
+        self.assertEqual(result['results'][1], {'id': 2, 'selected': None, 'is_correct': False})
+
+    def test_answers_outside_the_quiz_are_ignored(self):
+        result = grade_submission({1: 'A', 99: 'A'}, graded_questions(2), served_ids=[1, 2, 99])
+        self.assertEqual((result['total'], result['percentage']), (2, 50.0))
+
+    def test_percentage_rounds_half_up(self):
+        # 0.65 * 100 / 8 = 8.125, which float rounding would turn into 8.12
+        answers = {1: 'A', 2: 'B'}
+        result = grade_submission(answers, graded_questions(8, '0.35'), served_ids=range(1, 9))
+        self.assertEqual((result['score'], result['percentage']), (0.65, 8.13))
+        self.assertEqual(grade_submission({1: 'A', 2: 'A'}, graded_questions(3), range(1, 4))['percentage'], 66.67)
+
+
+class EvaluateQuizTests(QuizTestCase):
+    def evaluate(self, questions):
+        answers = {f'question_{question.pk}': 'A' for question in questions}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/evaluate/', {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_answered_questions_are_loaded_in_one_query(self):
+        few, few_queries = self.evaluate(self.questions[:2])
+        many, many_queries = self.evaluate(self.questions)
+
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual((few['total'], many['total']), (2, 10))
+        self.assertEqual([e['id'] for e in many['explanations']], [q.pk for q in self.questions])
+        self.assertEqual(many['exam'], self.exam.pk)
+
+    def test_percentage_is_over_the_served_quiz(self):
+        served = self.client.post('/api/get-quiz/', {'count': 5, 'exam': self.exam.pk}, format='json').json()
+        answered = served[0]['id']
+
+        response = self.client.post('/api/evaluate/', {'answers': {f'question_{answered}': 'A'}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['score'], data['total'], data['percentage']), (1.0, 5, 20.0))
+        self.assertEqual(len(data['explanations']), 5)
+        self.assertEqual(self.user.score_set.get().score, Decimal('20.00'))
+
+
+class QuestionExportTests(QuizTestCase):
+    def test_csv_export_streams_every_question_in_id_order(self):
+        response = self.client.get('/api/download-csv/')
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="questions_export.csv"')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['exam_name', 'category_name', 'question_text'])
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[1], ['Architect', 'Compute', 'Question 0', 'A', 'B', 'C', 'A', ''])
+        self.assertEqual([row[2] for row in rows[1:]], [question.question_text for question in self.questions])
+
+
+def question_rows(count, exam='Architect', category='Compute'):
+    header = 'exam_name,category_name,question_text,option_1,option_2,option_3,correct_option,explanation\n'
+    return header + ''.join(f'{exam},{category},Imported {i},A,B,C,A,Because\n' for i in range(count))
+
+
+class ImportQuestionsTests(QuizTestCase):
+    def import_csv(self, text, **kwargs):
+        return import_questions(csv.DictReader(io.StringIO(text)), self.user, **kwargs)
+
+    def test_counts_and_row_errors(self):
+        text = question_rows(3, category='Storage') + 'Developer,Storage,No options,,,,\n' + 'Developer,Storage,Q,A,B,C,A,\n'
+        result = self.import_csv(text, batch_size=2)
+
+        self.assertEqual((result['created'], result['failed'], result['total_rows_processed']), (4, 1, 5))
+        self.assertEqual(result['errors'][0]['row'], 5)
+        self.assertEqual(result['errors'][0]['error'], 'Missing required field values')
+        # Existing names are reused, new ones created once
+        self.assertEqual(Exam.objects.filter(name='Architect').count(), 1)
+        self.assertEqual(QuestionCategory.objects.filter(name='Storage').count(), 1)
+        self.assertEqual(Question.objects.filter(exam__name='Developer').count(), 1)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            self.import_csv(question_rows(5))
+        with CaptureQueriesContext(connection) as many:
+            self.import_csv(question_rows(60))
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(Question.objects.filter(question_text__startswith='Imported').count(), 65)
+
+
+class ChunkedFile:
+    """An upload that hands its content back in fixed-size byte chunks."""
+
+    def __init__(self, content, chunk_size):
+        self.content, self.chunk_size = content, chunk_size
+
+    def chunks(self):
+        for start in range(0, len(self.content), self.chunk_size):
+            yield self.content[start:start + self.chunk_size]
+
+
+class CSVIngestTests(QuizTestCase):
+    def test_rows_survive_any_chunk_boundary(self):
+        content = '\ufeffname,note\r\nCafé,"two\nlines"\r\nNaïve,plain'.encode()
+        for chunk_size in (1, 2, 3, 7, len(content)):
+            rows = list(csv_dict_reader(ChunkedFile(content, chunk_size)))
+            self.assertEqual(rows, [{'name': 'Café', 'note': 'two\nlines'}, {'name': 'Naïve', 'note': 'plain'}])
+
+    def test_invalid_utf8_raises(self):
+        with self.assertRaises(UnicodeDecodeError):
+            list(csv_dict_reader(ChunkedFile(b'name\n\xff\n', 4)))
+
+    def test_upload_endpoint_parses_the_file_incrementally(self):
+        upload = SimpleUploadedFile('questions.csv', question_rows(3).encode('utf-8-sig'), content_type='text/csv')
+        response = self.client.post('/api/upload-csv/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['created'], 3)
+
+        bad = SimpleUploadedFile('questions.csv', question_rows(1).encode() + b'\xff\n', content_type='text/csv')
+        response = self.client.post('/api/upload-csv/', {'file': bad}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'File must be UTF-8 encoded')
+
+
+class ListPaginationTests(QuizTestCase):
+    """Lists are always paginated; ?export=ndjson streams everything instead."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        start = timezone.make_aware(datetime(2024, 1, 1))
+        Score.objects.bulk_create([
+            Score(user=cls.user, exam=cls.exam, category=cls.category, score=day * 10, date=start + timedelta(days=day))
+            for day in range(5)
+        ])
+
+    def test_limit_offset_lists_are_capped(self):
+        QuestionCategory.objects.bulk_create([QuestionCategory(name=f'Category {i}') for i in range(MAX_PAGE_SIZE)])
+
+        data = self.client.get('/api/categories/').json()
+        self.assertEqual((data['count'], len(data['results'])), (MAX_PAGE_SIZE + 1, DEFAULT_PAGE_SIZE))
+        data = self.client.get('/api/categories/', {'limit': MAX_PAGE_SIZE * 2}).json()
+        self.assertEqual(len(data['results']), MAX_PAGE_SIZE)
+        self.assertIsNotNone(data['next'])
+
+    def test_scores_are_paged_by_cursor(self):
+        url, scores = '/api/scores/?page_size=2', []
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            scores += [float(row['score']) for row in data['results']]
+            url = data['next']
+        self.assertEqual(scores, [40.0, 30.0, 20.0, 10.0, 0.0])
+
+    def test_ndjson_export_streams_every_row(self):
+        response = self.client.get('/api/scores/', {'export': 'ndjson', 'page_size': 2})
 
-# Create your tests here.
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([float(row['score']) for row in rows], [40.0, 30.0, 20.0, 10.0, 0.0])
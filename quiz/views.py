@@ -2,11 +2,16 @@ from django.utils import timezone
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
+from django.db import IntegrityError, transaction
 from django.db.models import Avg, Count, Max, Min
 
 from .models import Question, QuestionCategory, Exam, Score
+from .grading import grade_submission
+from .importers import import_questions, QUESTION_CSV_FIELDS
+from .sampling import sample_question_ids
 from .serializers import (
     QuestionSerializer,
+    QuizQuestionSerializer,
     QuestionCategorySerializer,
     ExamSerializer,
     ScoreSerializer
@@ -15,6 +20,12 @@ from .serializers import (
 import csv
 from io import StringIO
 from django.http import HttpResponse
+from imports.background import should_run_in_background, enqueue_import
+from webdjango.csv_ingest import csv_dict_reader
+from webdjango.pagination import cursor_pagination
+from webdjango.streaming import stream_csv, StreamingExportMixin
+
+CSV_EXPORT_CHUNK_SIZE = 2000
 
 @api_view(['GET'])
 def download_questions_template(request):
@@ -55,19 +66,22 @@ def download_questions_template(request):
 def download_questions_csv(request):
     """
     Download all questions as CSV with specific fields
-    GET /download-questions-csv/
+    GET /download-csv/
+    Rows are streamed straight from a database cursor, so memory use stays
+    constant however large the question bank is.
     """
-    # Create the HttpResponse object with the appropriate CSV header
-    response = HttpResponse(
-        content_type='text/csv',
-        headers={'Content-Disposition': 'attachment; filename="questions_export.csv"'},
-    )
-
-    # Create a CSV writer
-    writer = csv.writer(response)
-    
-    # Write headers
-    writer.writerow([
+    rows = Question.objects.order_by('id').values_list(
+        'exam__name',
+        'category__name',
+        'question_text',
+        'option_1',
+        'option_2',
+        'option_3',
+        'correct_option',
+        'explanation'
+    ).iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE)
+
+    return stream_csv('questions_export.csv', [
         'exam_name',
         'category_name',
         'question_text',
@@ -76,25 +90,7 @@ def download_questions_csv(request):
         'option_3',
         'correct_option',
         'explanation'
-    ])
-    
-    # Get all questions with related exam and category
-    questions = Question.objects.select_related('exam', 'category').all()
-    
-    # Write data rows
-    for question in questions:
-        writer.writerow([
-            question.exam.name if question.exam else '',
-            question.category.name if question.category else '',
-            question.question_text,
-            question.option_1,
-            question.option_2,
-            question.option_3,
-            question.correct_option,
-            question.explanation
-        ])
-    
-    return response
+    ], rows)
 
 @api_view(['POST'])
 def upload_questions_csv(request):
@@ -106,64 +102,25 @@ def upload_questions_csv(request):
     if not request.FILES.get('file'):
         return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
     
-    required_fields = [
-        'exam_name', 'category_name', 'question_text',
-        'option_1', 'option_2', 'option_3', 'correct_option'
-    ]
-    
     try:
-        # Process file directly from memory
-        file = request.FILES['file']
-        decoded_file = file.read().decode('utf-8').splitlines()
-        reader = csv.DictReader(decoded_file)
+        # Decode and parse the upload incrementally, one chunk at a time
+        reader = csv_dict_reader(request.FILES['file'])
         
         # Validate headers
-        missing_headers = [field for field in required_fields if field not in reader.fieldnames]
+        missing_headers = [field for field in QUESTION_CSV_FIELDS if field not in (reader.fieldnames or [])]
         if missing_headers:
             return Response(
                 {'error': f'Missing required columns: {", ".join(missing_headers)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        created_count = 0
-        errors = []
-        
-        for row_num, row in enumerate(reader, start=2):  # Start at 2 for 1-based + header row
-            try:
-                # Validate required fields
-                if not all(row.get(field) for field in required_fields):
-                    raise ValueError("Missing required field values")
-                
-                exam, _ = Exam.objects.get_or_create(name=row['exam_name'])
-                category, _ = QuestionCategory.objects.get_or_create(name=row['category_name'])
-                
-                Question.objects.create(
-                    exam=exam,
-                    category=category,
-                    question_text=row['question_text'],
-                    option_1=row['option_1'],
-                    option_2=row['option_2'],
-                    option_3=row['option_3'],
-                    correct_option=row['correct_option'],
-                    explanation=row.get('explanation', ''),
-                    user=request.user
-                )
-                created_count += 1
-                
-            except Exception as e:
-                errors.append({
-                    'row': row_num,
-                    'error': str(e),
-                    'data': {k: v for k, v in row.items() if k in required_fields}
-                })
-        
-        return Response({
-            'status': 'success',
-            'created': created_count,
-            'failed': len(errors),
-            'errors': errors,
-            'total_rows_processed': row_num - 1  # Subtract header row
-        }, status=status.HTTP_201_CREATED)
+        # Large uploads are handed to the import worker instead of blocking this request
+        if should_run_in_background(request, request.FILES['file']):
+            return enqueue_import(request, 'quiz_questions', request.FILES['file'])
+
+        result = import_questions(reader, request.user)
+
+        return Response({'status': 'success', **result}, status=status.HTTP_201_CREATED)
     
     except UnicodeDecodeError:
         return Response(
@@ -182,20 +139,20 @@ def upload_questions_csv(request):
         )
 # -------------------- CRUD ViewSets --------------------
 
-class QuestionViewSet(viewsets.ModelViewSet):
-    queryset = Question.objects.all()
+class QuestionViewSet(StreamingExportMixin, viewsets.ModelViewSet):
+    queryset = Question.objects.order_by('id')
     serializer_class = QuestionSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
 class QuestionCategoryViewSet(viewsets.ModelViewSet):
-    queryset = QuestionCategory.objects.all()
+    queryset = QuestionCategory.objects.order_by('id')
     serializer_class = QuestionCategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
 class ExamViewSet(viewsets.ModelViewSet):
-    queryset = Exam.objects.all()
+    queryset = Exam.objects.order_by('id')
     serializer_class = ExamSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -223,35 +180,38 @@ def get_questions(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Build base queryset with optional filters
-    queryset = Question.objects.all()
-    
-    exam_id = request.data.get('exam')
-    if exam_id:
-        queryset = queryset.filter(exam_id=exam_id)
-    
-    category_id = request.data.get('category')
-    if category_id:
-        queryset = queryset.filter(category_id=category_id)
+    # Optional pool filters
+    try:
+        exam_id = int(request.data.get('exam') or 0) or None
+        category_id = int(request.data.get('category') or 0) or None
+    except (ValueError, TypeError):
+        return Response(
+            {"error": "Invalid exam or category parameter. Must be an integer ID."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
     # Get seen question IDs from session
     seen_ids = request.session.get('seen_question_ids', [])
-    
-    # First try to get unseen questions
-    unseen_questions = queryset.exclude(id__in=seen_ids).order_by('?')
-    questions = list(unseen_questions[:count])
-    
-    # If we didn't get enough, fill with random questions (may repeat)
-    if len(questions) < count:
-        remaining = count - len(questions)
-        questions += list(queryset.order_by('?')[:remaining])
-    
+
+    # Sample in the database (unseen first, then repeats) and fetch in one query
+    question_ids = sample_question_ids(count, exam_id, category_id, seen_ids)
+    questions_by_id = Question.objects.in_bulk(question_ids)
+    missing = len(question_ids) - len(questions_by_id)
+    if missing:
+        # Deleted between sampling and fetching; draw replacements
+        replacements = sample_question_ids(missing, exam_id, category_id, seen_ids, exclude_ids=question_ids)
+        questions_by_id.update(Question.objects.in_bulk(replacements))
+        question_ids += replacements
+    questions = [questions_by_id[qid] for qid in question_ids if qid in questions_by_id]
+
     # Update seen questions in session (keep last 100 max)
     new_seen_ids = [q.id for q in questions]
     request.session['seen_question_ids'] = (seen_ids + new_seen_ids)[-100:]
+    # The quiz being taken, so evaluate_quiz scores skipped questions too
+    request.session['quiz_question_ids'] = new_seen_ids
     request.session.modified = True
 
-    serializer = QuestionSerializer(questions, many=True)
+    serializer = QuizQuestionSerializer(questions, many=True)
     return Response(serializer.data)
 
 
@@ -259,11 +219,13 @@ def get_questions(request):
 def evaluate_quiz(request):
     """
     Evaluate quiz answers with negative marking and save score
+    The score is computed server-side; negative marking comes from each
+    question's exam (Exam.negative_marking). The percentage is over the
+    quiz last served to this session, so unanswered questions count as
+    skipped; without one, over the questions answered.
     POST data:
     {
         "answers": {"question_1": "option_1", ...},
-        "calculated_score": 5.33,
-        "calculated_percentage": 53.3,
         "exam": 1,        # optional
         "category": 2     # optional
     }
@@ -277,39 +239,40 @@ def evaluate_quiz(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    try:
-        calculated_score = float(data.get('calculated_score', 0))
-        calculated_percentage = float(data.get('calculated_percentage', 0))
-    except (ValueError, TypeError):
-        return Response(
-            {"error": "Invalid score values"},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-
     explanations = []
     exam_id = data.get('exam')
     category_id = data.get('category')
 
-    # Process each answer
+    # Parse all question IDs up front
+    answers = {}
     for key, selected_option in data.get('answers', {}).items():
         if not key.startswith("question_"):
             continue
-            
         try:
-            qid = int(key.split("_")[1])
-            question = Question.objects.get(id=qid)
-        except (Question.DoesNotExist, ValueError, IndexError):
+            answers[int(key.split("_")[1])] = selected_option
+        except (ValueError, IndexError):
             continue
 
-        is_correct = selected_option == question.correct_option
-        
+    served_ids = request.session.get('quiz_question_ids')
+
+    # Fetch every graded question in one query, with only the columns needed for grading
+    questions = Question.objects.select_related('exam').only(
+        'id', 'question_text', 'correct_option', 'explanation', 'category_id',
+        'exam__id', 'exam__negative_marking'
+    ).in_bulk(list(answers) if served_ids is None else served_ids)
+
+    result = grade_submission(answers, questions, served_ids)
+
+    for graded in result['results']:
+        question = questions[graded['id']]
+
         explanations.append({
             'id': question.id,
             'question': question.question_text,
-            'selected': selected_option,
+            'selected': graded['selected'],
             'correct': question.correct_option,
             'explanation': question.explanation or '',
-            'is_correct': is_correct
+            'is_correct': graded['is_correct']
         })
 
         # Auto-detect exam/category from questions if not provided
@@ -323,18 +286,25 @@ def evaluate_quiz(request):
         score_data = {
             'exam': exam_id,
             'category': category_id,
-            'score': calculated_percentage,
+            'score': result['percentage'],
             'date': timezone.now()
         }
         serializer = ScoreSerializer(data=score_data)
         if serializer.is_valid():
-            serializer.save(user=request.user)
+            # exam/category are read-only on the serializer, so pass the detected IDs explicitly
+            try:
+                with transaction.atomic():
+                    serializer.save(user=request.user, exam_id=exam_id, category_id=category_id)
+            except (ValueError, IntegrityError):
+                pass
         # Silently fail if score save fails to not disrupt quiz experience
 
     return Response({
-        'score': calculated_score,
-        'total': len(data.get('answers', {})),
-        'percentage': calculated_percentage,
+        'score': result['score'],
+        'total': result['total'],
+        'percentage': result['percentage'],
+        'exam': exam_id,
+        'category': category_id,
         'explanations': explanations
     })
     
@@ -371,7 +341,7 @@ from django.db import models
 from .models import Score
 from .serializers import ScoreSerializer
 
-class ScoreViewSet(viewsets.ReadOnlyModelViewSet):
+class ScoreViewSet(StreamingExportMixin, viewsets.ReadOnlyModelViewSet):
     """
     Allows authenticated users to view their quiz scores with filtering options
     Includes endpoints for:
@@ -383,6 +353,7 @@ class ScoreViewSet(viewsets.ReadOnlyModelViewSet):
     """
     serializer_class = ScoreSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = cursor_pagination('-date', '-id')
 
     def get_queryset(self):
         queryset = Score.objects.filter(user=self.request.user)
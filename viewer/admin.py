@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Viewer, ProjectAccessKey, Tag, ViewerFile
+from .models import Viewer, ViewerImageDerivative, ProjectAccessKey, StoredBlob, Tag, ViewerFile, ChunkedUpload
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -9,12 +9,24 @@ class TagAdmin(admin.ModelAdmin):
     readonly_fields = ('id',)
 
 
+class ViewerImageDerivativeInline(admin.TabularInline):
+    model = ViewerImageDerivative
+    fields = ('format', 'width', 'height', 'size', 'file')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Viewer)
 class ViewerAdmin(admin.ModelAdmin):
-    list_display = ('view_name', 'project', 'organisation', 'user', 'view_date')
-    list_filter = ('project', 'organisation', 'view_date')
+    list_display = ('view_name', 'project', 'organisation', 'user', 'view_date', 'image_status')
+    list_filter = ('project', 'organisation', 'view_date', 'image_status')
     search_fields = ('view_name', 'project__name', 'organisation__name')
-    readonly_fields = ('id', 'created_at')
+    readonly_fields = ('id', 'image_status', 'processing_started_at', 'processing_error', 'created_at')
+    inlines = [ViewerImageDerivativeInline]
 
 
 @admin.register(ViewerFile)
@@ -26,6 +38,21 @@ class ViewerFileAdmin(admin.ModelAdmin):
     readonly_fields = ('id', 'created_at')
 
 
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'size', 'refcount', 'created_at')
+
+
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'target', 'user', 'offset', 'size', 'status', 'updated_at')
+    list_filter = ('target', 'status')
+    search_fields = ('filename', 'user__email')
+    readonly_fields = ('id', 'created_at', 'updated_at')
+
+
 @admin.register(ProjectAccessKey)
 class ProjectAccessKeyAdmin(admin.ModelAdmin):
     list_display = ('access_key', 'project', 'organisation')
@@ -0,0 +1,83 @@
+"""
+Caching for the public access-key gallery endpoints.
+
+Each project has a content version in the cache: the time (ns) of the last
+change to its viewers, SVG files or tags, bumped by the receivers in
+viewer/models.py. Access keys resolve to their project/organisation
+through the cache, and gallery payloads are cached under the project's
+current version, so a repeat visit is served without touching the
+database and the version doubles as the ETag and Last-Modified of the
+response.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import ProjectAccessKey, project_content_version_key, access_key_cache_key
+
+# Upper bound on staleness for changes the receivers do not see (e.g. a
+# project or organisation rename) and for caches not shared between workers.
+PUBLIC_CACHE_TIMEOUT = 60 * 60
+
+# Unknown access keys are remembered briefly so guessing does not reach the database
+INVALID_KEY_TIMEOUT = 60
+
+
+def get_content_version(project_id):
+    key = project_content_version_key(project_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def resolve_access_key(access_key):
+    """
+    Return ``{'project_id', 'project_name', 'organisation_id',
+    'organisation_name'}`` for a valid access key, or None.
+    """
+    key = access_key_cache_key(access_key)
+    access = cache.get(key)
+    if access is None:
+        access = (
+            ProjectAccessKey.objects.filter(access_key=access_key)
+            .values('project_id', 'organisation_id', project_name=F('project__name'), organisation_name=F('organisation__name'))
+            .first()
+        ) or {}
+        cache.set(key, access, PUBLIC_CACHE_TIMEOUT if access else INVALID_KEY_TIMEOUT)
+    return access or None
+
+
+def gallery_etag(kind, access_key):
+    access = resolve_access_key(access_key)
+    if access is None:
+        return None
+    version = get_content_version(access['project_id'])
+    digest = hashlib.sha256(f"{kind}:{access_key}:{version}".encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def gallery_last_modified(access_key):
+    access = resolve_access_key(access_key)
+    if access is None:
+        return None
+    return datetime.fromtimestamp(get_content_version(access['project_id']) / 1e9, tz=timezone.utc)
+
+
+def cached_gallery(kind, access, host, build):
+    """
+    The gallery payload for ``access``, built with ``build()`` when the
+    project's content version has moved on. ``host`` is part of the key
+    because serialized file URLs are absolute.
+    """
+    version = get_content_version(access['project_id'])
+    key = f"viewer:gallery:{kind}:{access['project_id']}:{access['organisation_id']}:{version}:{host}"
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, PUBLIC_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,190 @@
+"""
+Image processing for Viewer 360 panoramas.
+
+After upload the image worker (viewer/processing.py) cuts the
+equirectangular image into a multi-resolution tile pyramid: level 0 is the
+smallest (fits a single tile), each further level doubles the resolution
+up to the original, and every level is split into TILE_SIZE x TILE_SIZE
+JPEG tiles. A tiny preview is written alongside, so
+a client can render the preview at once, then the coarse levels, and only
+fetch full-resolution tiles for the part of the sphere in view.
+
+Tiles live under ``viewer/360_tiles/<viewer id>/<token>/`` in the default
+storage; the manifest stored on the Viewer describes the layout.
+
+The same decoded image also yields the derivatives: metadata-free
+progressive JPEG, WebP and (where Pillow has it) AVIF encodings at a few
+target widths (and JPEG at the full width), recorded as ViewerImageDerivative rows so clients can pick
+the smallest format and size they can display.
+"""
+import io
+import math
+import uuid
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+TILE_SIZE = 512
+TILE_QUALITY = 82
+PREVIEW_WIDTH = 256
+PREVIEW_QUALITY = 60
+TILES_ROOT = 'viewer/360_tiles'
+
+# Target widths of the derivatives; never upscaled
+DERIVATIVE_WIDTHS = (2048, 4096)
+
+# Formats also encoded at the image's full width. WebP and AVIF take tens of
+# seconds at the full 12288 px, so they stop at the largest DERIVATIVE_WIDTHS.
+FULL_WIDTH_FORMATS = ('jpeg',)
+
+# format -> (Pillow format, file extension, content type, encoder options)
+DERIVATIVE_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 78, 'method': 4}),
+    'avif': ('AVIF', 'avif', 'image/avif', {'quality': 60, 'speed': 8}),
+}
+
+
+def _save_jpeg(image, path, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def _pyramid_levels(width, height):
+    """Level sizes from the single-tile level 0 up to the full image."""
+    count = max(1, math.ceil(math.log2(max(width, height) / TILE_SIZE)) + 1)
+    levels = []
+    for level in range(count):
+        scale = 2 ** (count - 1 - level)
+        levels.append((max(1, math.ceil(width / scale)), max(1, math.ceil(height / scale))))
+    return levels
+
+
+def build_tile_pyramid(image, prefix):
+    """
+    Write the tiles and preview of ``image`` (an RGB PIL image) under
+    ``prefix`` and return the manifest. If writing fails part way, the
+    files already written are removed.
+    """
+    width, height = image.size
+    levels = []
+    for level, (level_width, level_height) in enumerate(_pyramid_levels(width, height)):
+        levels.append({
+            'level': level,
+            'width': level_width,
+            'height': level_height,
+            'columns': math.ceil(level_width / TILE_SIZE),
+            'rows': math.ceil(level_height / TILE_SIZE),
+        })
+    manifest = {
+        'projection': 'equirectangular',
+        'width': width,
+        'height': height,
+        'tile_size': TILE_SIZE,
+        'format': 'jpg',
+        'path': prefix,
+        'levels': levels,
+    }
+
+    try:
+        # Build from the largest level down, halving the previous level each time
+        current = image
+        for level in reversed(levels):
+            if current.size != (level['width'], level['height']):
+                current = current.resize((level['width'], level['height']), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            for y in range(level['rows']):
+                for x in range(level['columns']):
+                    box = (x * TILE_SIZE, y * TILE_SIZE, min((x + 1) * TILE_SIZE, level['width']), min((y + 1) * TILE_SIZE, level['height']))
+                    _save_jpeg(current.crop(box), f"{prefix}/{level['level']}/{x}_{y}.jpg", TILE_QUALITY)
+
+        preview = current.copy()
+        preview.thumbnail((PREVIEW_WIDTH, PREVIEW_WIDTH), Image.Resampling.LANCZOS)
+        _save_jpeg(preview, f'{prefix}/preview.jpg', PREVIEW_QUALITY)
+    except Exception:
+        delete_tiles(manifest)
+        raise
+    return manifest
+
+
+def open_panorama(field_file):
+    """Decode an uploaded panorama once, upright, in RGB and without metadata."""
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        # Encoders write comments, EXIF etc. from .info unless it is cleared
+        image.info = {}
+        return image
+    finally:
+        field_file.close()
+
+
+def generate_viewer_tiles(viewer, image=None):
+    """Build the tile pyramid for ``viewer.image_360`` and return its manifest."""
+    if image is None:
+        image = open_panorama(viewer.image_360)
+    # A fresh token per upload, so replaced images never share cached tile URLs
+    prefix = f'{TILES_ROOT}/{viewer.pk}/{uuid.uuid4().hex[:12]}'
+    return build_tile_pyramid(image, prefix)
+
+
+def derivative_formats():
+    """The derivative formats this Pillow build can encode."""
+    return [name for name in DERIVATIVE_FORMATS if name != 'avif' or features.check('avif')]
+
+
+def encode_derivatives(image):
+    """
+    Yield ``(format, width, height, content)`` for every derivative of
+    ``image`` (an RGB PIL image). Nothing but pixels is written: EXIF, XMP
+    and comments of the upload are dropped (orientation was applied on decode).
+    """
+    width, height = image.size
+    widths = sorted({min(target, width) for target in DERIVATIVE_WIDTHS} | {width})
+    for target_width in widths:
+        target_height = max(1, round(height * target_width / width))
+        resized = image if target_width == width else image.resize(
+            (target_width, target_height), Image.Resampling.LANCZOS, reducing_gap=2.0
+        )
+        for name in derivative_formats():
+            if target_width > max(DERIVATIVE_WIDTHS) and name not in FULL_WIDTH_FORMATS:
+                continue
+            pillow_format, _, _, options = DERIVATIVE_FORMATS[name]
+            buffer = io.BytesIO()
+            resized.save(buffer, pillow_format, **options)
+            yield name, target_width, target_height, buffer.getvalue()
+
+
+def derivative_filename(viewer, name, width):
+    extension = DERIVATIVE_FORMATS[name][1]
+    return f'{viewer.pk}_{width}_{uuid.uuid4().hex[:12]}.{extension}'
+
+
+def delete_tiles(manifest):
+    """Remove every file described by ``manifest`` from storage."""
+    if not manifest:
+        return
+    prefix = manifest['path']
+    for level in manifest['levels']:
+        for y in range(level['rows']):
+            for x in range(level['columns']):
+                default_storage.delete(f"{prefix}/{level['level']}/{x}_{y}.jpg")
+    default_storage.delete(f'{prefix}/preview.jpg')
+
+
+def manifest_urls(manifest):
+    """The client-facing form of a manifest: storage paths replaced by URLs."""
+    if not manifest:
+        return None
+    base = default_storage.url(manifest['path'])
+    return {
+        'projection': manifest['projection'],
+        'width': manifest['width'],
+        'height': manifest['height'],
+        'tile_size': manifest['tile_size'],
+        'levels': manifest['levels'],
+        'preview_url': f'{base}/preview.jpg',
+        'tile_url_template': base + '/{level}/{x}_{y}.' + manifest['format'],
+    }
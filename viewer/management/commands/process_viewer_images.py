@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from viewer.models import Viewer
+from viewer.processing import claim_next_viewer, process_viewer
+
+
+class Command(BaseCommand):
+    help = 'Build the tile pyramid and derivatives of pending Viewer 360 images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue until empty, then exit')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--all', action='store_true',
+                            help='Queue every viewer for reprocessing first, not only new uploads')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            queued = Viewer.objects.exclude(image_360='').exclude(image_status='processing').update(image_status='pending')
+            self.stdout.write(f"Queued {queued} viewers")
+
+        while True:
+            close_old_connections()
+            viewer = claim_next_viewer()
+            if viewer is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f"Processing viewer {viewer.pk}")
+            if process_viewer(viewer):
+                self.stdout.write(self.style.SUCCESS(f"Viewer {viewer.pk}: ready"))
+            else:
+                viewer.refresh_from_db(fields=['image_status', 'processing_error'])
+                self.stdout.write(self.style.ERROR(
+                    f"Viewer {viewer.pk}: {viewer.image_status} {viewer.processing_error}".rstrip()
+                ))
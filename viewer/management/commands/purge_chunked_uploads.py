@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from viewer.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads (and their part files) that have not been touched for a while'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24,
+                            help='Age after the last chunk at which an upload is abandoned (default 24)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        # Deleted one by one so the post_delete receiver removes each part file
+        count = 0
+        for upload in ChunkedUpload.objects.filter(updated_at__lt=cutoff).iterator():
+            upload.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} chunked uploads"))
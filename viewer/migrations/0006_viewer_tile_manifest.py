@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0005_remove_viewerfile_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='viewer',
+            name='tile_manifest',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
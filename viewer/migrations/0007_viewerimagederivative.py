@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:59
+
+import django.db.models.deletion
+import viewer.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0006_viewer_tile_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewerImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('jpeg', 'JPEG'), ('webp', 'WEBP'), ('avif', 'AVIF')], max_length=10)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('file', models.FileField(upload_to=viewer.models.derivative_upload)),
+                ('size', models.PositiveIntegerField(help_text='File size in bytes')),
+                ('viewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='viewer.viewer')),
+            ],
+            options={
+                'ordering': ['width', 'format'],
+                'unique_together': {('viewer', 'format', 'width')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:01
+
+import viewer.models
+import viewer.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0007_viewerimagederivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='viewerfile',
+            name='optimized_file',
+            field=models.FileField(blank=True, editable=False, upload_to=viewer.models.svg_optimized_upload),
+        ),
+        migrations.AddField(
+            model_name='viewerfile',
+            name='thumbnail',
+            field=models.FileField(blank=True, editable=False, upload_to=viewer.models.svg_thumbnail_upload),
+        ),
+        migrations.AlterField(
+            model_name='viewerfile',
+            name='file',
+            field=models.FileField(help_text='SVG file for viewing', upload_to=viewer.models.svg_file_upload, validators=[viewer.validators.validate_svg_file]),
+        ),
+    ]
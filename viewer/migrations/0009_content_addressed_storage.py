@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:02
+
+import viewer.models
+import viewer.storage
+import viewer.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0008_viewerfile_optimized_svg'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='viewer',
+            name='image_360',
+            field=models.ImageField(storage=viewer.storage.viewer_media_storage, upload_to=viewer.models.unique_filename, validators=[viewer.validators.validate_360_image]),
+        ),
+        migrations.AlterField(
+            model_name='viewerfile',
+            name='file',
+            field=models.FileField(help_text='SVG file for viewing', storage=viewer.storage.viewer_media_storage, upload_to=viewer.models.svg_file_upload, validators=[viewer.validators.validate_svg_file]),
+        ),
+    ]
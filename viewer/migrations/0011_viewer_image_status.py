@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_processed_viewers_ready(apps, schema_editor):
+    """Viewers that already have tiles and derivatives are ready; the rest are left for the image worker."""
+    Viewer = apps.get_model('viewer', 'Viewer')
+    Viewer.objects.filter(tile_manifest__isnull=False, derivatives__isnull=False).update(image_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0011_tenant_indexes'),
+        ('viewer', '0010_chunkedupload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='viewer',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='viewer',
+            name='processing_error',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='viewer',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='viewer',
+            index=models.Index(fields=['image_status'], name='viewer_image_status_idx'),
+        ),
+        migrations.RunPython(mark_processed_viewers_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0011_viewer_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='viewer',
+            name='image_progressive',
+            field=models.BooleanField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,30 +1,68 @@
 import os
+import time
 import uuid
 import re
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_delete
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
 from project.models import Project, Organisation
-from .validators import validate_360_image
+from .imaging import DERIVATIVE_FORMATS, delete_tiles
+from .storage import viewer_media_storage
+from .uploads import discard_part
+from .svg import SVGError, delete_compressed_siblings, optimize_svg, render_thumbnail, save_compressed_siblings
+from .validators import read_image_header, validate_360_image, validate_svg_file
 
 User = get_user_model()
 
 
+# --- CONTENT-ADDRESSED FILE REFERENCES (see viewer/storage.py) ---
+def store_pending_upload(field_file):
+    """
+    Write a newly assigned upload to storage now rather than in pre_save, so
+    that save() compares stored names: the same content uploaded again keeps
+    its name and is not a change.
+    """
+    if field_file and not field_file._committed:
+        field_file.save(field_file.name, field_file.file, save=False)
+
+
+def swap_stored_file(old_file, new_file):
+    """Take a reference to the blob ``new_file`` now names and give up ``old_file``'s."""
+    if new_file:
+        new_file.storage.retain(new_file.name)
+    if old_file:
+        old_file.delete(save=False)
+
+
 # --- CUSTOM UPLOAD FUNCTION (original filename + UUID) ---
+# image_360 and ViewerFile.file use ContentAddressedStorage, which keeps only
+# the directory and extension of these names (see viewer/storage.py)
 def unique_filename(instance, filename):
     base, ext = os.path.splitext(filename)  # split name and extension
     base = re.sub(r'[^a-zA-Z0-9_-]', '', base)  # clean up invalid chars
     new_filename = f"{base}_{uuid.uuid4().hex}{ext}"
     return os.path.join("viewer/360_images", new_filename)
 
+def derivative_upload(instance, filename):
+    return os.path.join("viewer/360_derivatives", filename)
+
 def svg_file_upload(instance, filename):
     base, ext = os.path.splitext(filename)
     base = re.sub(r'[^a-zA-Z0-9_-]', '', base)
     new_filename = f"{base}_{uuid.uuid4().hex}{ext}"
     return os.path.join("viewer/svg_files", new_filename)
 
+def svg_optimized_upload(instance, filename):
+    return os.path.join("viewer/svg_optimized", filename)
+
+def svg_thumbnail_upload(instance, filename):
+    return os.path.join("viewer/svg_thumbnails", filename)
+
 
 class Viewer(models.Model):
     user = models.ForeignKey(
@@ -48,38 +86,133 @@ class Viewer(models.Model):
 
     image_360 = models.ImageField(
         upload_to=unique_filename,
+        storage=viewer_media_storage,
         validators=[validate_360_image],
     )
+    # Whether image_360 is a progressive JPEG, read from its headers on upload
+    image_progressive = models.BooleanField(null=True, blank=True, editable=False)
+    # Tile pyramid of image_360, written by the image worker (see viewer/processing.py)
+    tile_manifest = models.JSONField(null=True, blank=True, editable=False)
+
+    IMAGE_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    image_status = models.CharField(max_length=20, choices=IMAGE_STATUS_CHOICES, default='pending', editable=False)
+    processing_started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    processing_error = models.TextField(blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-view_date']
+        indexes = [
+            # Queue scans of the image worker
+            models.Index(fields=['image_status'], name='viewer_image_status_idx'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Project as loaded, so moving a viewer refreshes both projects' galleries
+        self._loaded_project_id = self.__dict__.get('project_id')
 
     def __str__(self):
         return f"{self.project.name} - {self.view_name} ({self.view_date})"
 
     def save(self, *args, **kwargs):
-        """Delete old file when updating with a new one."""
+        """
+        Delete old files when updating with a new one. A new image is only
+        queued here: tiles and derivatives are built by `manage.py
+        process_viewer_images`, as that takes longer than a request may run.
+        """
+        store_pending_upload(self.image_360)
+        replacing = False
+        old_file = old_manifest = None
         if self.pk:
             try:
-                old_file = Viewer.objects.get(pk=self.pk).image_360
+                old = Viewer.objects.only('image_360', 'tile_manifest').get(pk=self.pk)
+                old_file, old_manifest = old.image_360, old.tile_manifest
+                replacing = True
             except Viewer.DoesNotExist:
-                old_file = None
+                pass
+        image_changed = not replacing or old_file != self.image_360
 
-            new_file = self.image_360
-            if old_file and old_file != new_file:
-                old_file.delete(save=False)
+        if image_changed:
+            self.image_progressive = self.read_progressive_flag() if self.image_360 else None
+            self.tile_manifest = None
+            self.image_status = 'pending'
+            self.processing_started_at = None
+            self.processing_error = ''
 
         super().save(*args, **kwargs)
 
+        if image_changed:
+            swap_stored_file(old_file, self.image_360)
+        if image_changed and replacing:
+            delete_tiles(old_manifest)
+            self.derivatives.all().delete()
+
+    def read_progressive_flag(self):
+        """The progressive-JPEG flag from image_360's headers, or None if they can't be read."""
+        try:
+            return read_image_header(self.image_360)['progressive']
+        except ValidationError:
+            return None
+
 
 # --- CLEANUP HANDLER ON DELETE (covers both instance.delete() & queryset.delete()) ---
 @receiver(post_delete, sender=Viewer)
 def delete_file_on_instance_delete(sender, instance, **kwargs):
     if instance.image_360:
         instance.image_360.delete(save=False)
+    delete_tiles(instance.tile_manifest)
+
+
+class ViewerImageDerivative(models.Model):
+    """A re-encoded, metadata-free copy of a Viewer's 360 image at one format and width."""
+    FORMAT_CHOICES = [(name, name.upper()) for name in DERIVATIVE_FORMATS]
+
+    viewer = models.ForeignKey(
+        Viewer,
+        on_delete=models.CASCADE,
+        related_name='derivatives'
+    )
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(upload_to=derivative_upload)
+    size = models.PositiveIntegerField(help_text="File size in bytes")
+
+    class Meta:
+        ordering = ['width', 'format']
+        unique_together = ('viewer', 'format', 'width')
+
+    def __str__(self):
+        return f"{self.viewer_id} - {self.format} {self.width}x{self.height}"
+
+    @property
+    def content_type(self):
+        return DERIVATIVE_FORMATS[self.format][2]
+
+
+@receiver(post_delete, sender=ViewerImageDerivative)
+def delete_derivative_file_on_delete(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
+
+
 
+class StoredBlob(models.Model):
+    """A content-addressed file in ContentAddressedStorage and how many fields reference it."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
 
 
 class ProjectAccessKey(models.Model):
@@ -99,6 +232,11 @@ class ProjectAccessKey(models.Model):
         help_text="Custom or auto-generated key to share viewer access."
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Key as loaded, so changing it also evicts the old key's cached lookup
+        self._loaded_access_key = self.__dict__.get('access_key')
+
     def save(self, *args, **kwargs):
         if not self.access_key:
             # Generate a 10-character unique access key
@@ -129,6 +267,10 @@ class Tag(models.Model):
     
     class Meta:
         unique_together = ('name', 'organisation', 'project')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaded_project_id = self.__dict__.get('project_id')
     
     def __str__(self):
         return f"{self.name} ({self.project.name})"
@@ -156,8 +298,13 @@ class ViewerFile(models.Model):
 
     file = models.FileField(
         upload_to=svg_file_upload,
+        storage=viewer_media_storage,
+        validators=[validate_svg_file],
         help_text="SVG file for viewing"
     )
+    # Sanitized, minified copy of file (with .gz/.br siblings) and its PNG thumbnail; see viewer/svg.py
+    optimized_file = models.FileField(upload_to=svg_optimized_upload, blank=True, editable=False)
+    thumbnail = models.FileField(upload_to=svg_thumbnail_upload, blank=True, editable=False)
     description = models.TextField(blank=True, null=True)
 
     tags = models.ManyToManyField(
@@ -171,30 +318,154 @@ class ViewerFile(models.Model):
     class Meta:
         ordering = ['-view_date']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Project as loaded, so moving a drawing refreshes both projects' galleries
+        self._loaded_project_id = self.__dict__.get('project_id')
+
     def __str__(self):
         return f"{self.project.name} - {self.view_name} ({self.view_date})"
 
     def save(self, *args, **kwargs):
-        """Delete old file when updating with a new one."""
+        """Delete old files when updating with a new one, and optimize new drawings."""
+        store_pending_upload(self.file)
+        old = None
         if self.pk:
             try:
-                old_file = ViewerFile.objects.get(pk=self.pk).file
+                old = ViewerFile.objects.only('file', 'optimized_file', 'thumbnail').get(pk=self.pk)
             except ViewerFile.DoesNotExist:
-                old_file = None
-
-            new_file = self.file
-            if old_file and old_file != new_file:
-                old_file.delete(save=False)
+                pass
+        file_changed = old is None or old.file != self.file
 
         super().save(*args, **kwargs)
 
+        if file_changed:
+            if old is not None and old.file:
+                old.delete_processed_files()
+            swap_stored_file(old.file if old is not None else None, self.file)
+            if self.file:
+                self.process_svg()
+
+    def process_svg(self):
+        """Store the optimized drawing, its precompressed siblings and its thumbnail."""
+        self.file.open('rb')
+        try:
+            data = self.file.read()
+        finally:
+            self.file.close()
+        self.optimized_file = self.thumbnail = ''
+        try:
+            optimized = optimize_svg(data)
+        except SVGError:
+            # Drawings stored before uploads were validated; not served until replaced
+            optimized = None
+
+        if optimized is not None:
+            base = os.path.splitext(os.path.basename(self.file.name))[0]
+            self.optimized_file.save(f'{base}.svg', ContentFile(optimized), save=False)
+            save_compressed_siblings(self.optimized_file.name, optimized)
+            thumbnail = render_thumbnail(optimized)
+            if thumbnail is not None:
+                self.thumbnail.save(f'{base}.png', ContentFile(thumbnail), save=False)
+
+        ViewerFile.objects.filter(pk=self.pk).update(optimized_file=self.optimized_file, thumbnail=self.thumbnail)
+        bump_project_content_version(self.project_id)
+
+    def delete_processed_files(self):
+        if self.optimized_file:
+            delete_compressed_siblings(self.optimized_file.name)
+            self.optimized_file.delete(save=False)
+        if self.thumbnail:
+            self.thumbnail.delete(save=False)
+
     @property
     def tag_names(self):
-        """Return list of tag names for API responses."""
-        return list(self.tags.values_list('name', flat=True))
+        """Return list of tag names for API responses (uses prefetched tags when available)."""
+        return [tag.name for tag in self.tags.all()]
     
 # --- CLEANUP HANDLERS ---
 @receiver(post_delete, sender=ViewerFile)
 def delete_viewerfile_file_on_delete(sender, instance, **kwargs):
     if instance.file:
-        instance.file.delete(save=False)
\ No newline at end of file
+        instance.file.delete(save=False)
+    instance.delete_processed_files()
+
+
+# --- RESUMABLE UPLOADS (see viewer/uploads.py) ---
+class ChunkedUpload(models.Model):
+    """A 360 image or SVG drawing being uploaded in chunks, before it is attached."""
+
+    TARGET_CHOICES = [
+        ('viewer', '360 Image'),
+        ('viewer_file', 'SVG File'),
+    ]
+
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('completed', 'Completed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size} bytes, {self.get_status_display()})"
+
+
+@receiver(post_delete, sender=ChunkedUpload)
+def delete_part_file_on_delete(sender, instance, **kwargs):
+    discard_part(instance)
+
+
+# --- PUBLIC GALLERY CACHE INVALIDATION (see viewer/caching.py) ---
+def project_content_version_key(project_id):
+    return f'viewer:content-version:{project_id}'
+
+
+def access_key_cache_key(access_key):
+    return f'viewer:access-key:{access_key}'
+
+
+def bump_project_content_version(project_id):
+    """Move a project's cached public galleries to a new version (also their ETag / Last-Modified)."""
+    cache.set(project_content_version_key(project_id), time.time_ns(), None)
+
+
+@receiver(post_save, sender=Viewer)
+@receiver(post_delete, sender=Viewer)
+@receiver(post_save, sender=ViewerFile)
+@receiver(post_delete, sender=ViewerFile)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_content_version_on_change(sender, instance, **kwargs):
+    # Both projects when the object was moved from one to another
+    for project_id in {instance.project_id, instance._loaded_project_id} - {None}:
+        bump_project_content_version(project_id)
+    instance._loaded_project_id = instance.project_id
+
+
+@receiver(m2m_changed, sender=ViewerFile.tags.through)
+def bump_content_version_on_tagging(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_project_content_version(instance.project_id)
+
+
+@receiver(post_save, sender=ProjectAccessKey)
+@receiver(post_delete, sender=ProjectAccessKey)
+def invalidate_access_key(sender, instance, **kwargs):
+    cache.delete_many({access_key_cache_key(instance.access_key), access_key_cache_key(instance._loaded_access_key)})
+    instance._loaded_access_key = instance.access_key
@@ -0,0 +1,106 @@
+"""
+Background processing of Viewer 360 images.
+
+Decoding a panorama at the size cap and writing its tile pyramid and
+derivatives takes longer than a request may run, so Viewer.save() only
+marks a new image 'pending'. `manage.py process_viewer_images` claims
+pending viewers one at a time and builds everything here; clients see
+``image_status`` move to 'ready' (or 'failed') and the tiles and
+derivatives appear in the API.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .imaging import delete_tiles, derivative_filename, encode_derivatives, generate_viewer_tiles, open_panorama
+from .models import Viewer, ViewerImageDerivative, bump_project_content_version
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'VIEWER_PROCESSING_STALE_SECONDS', 15 * 60))
+
+
+def claim_next_viewer():
+    """
+    Mark the oldest pending viewer as processing and return it, or None if
+    there is nothing to do. Viewers left 'processing' for longer than
+    VIEWER_PROCESSING_STALE_SECONDS (their worker died) are claimed again.
+    """
+    claimable = Q(image_status='pending') | Q(image_status='processing', processing_started_at__lt=_stale_cutoff())
+    viewer = Viewer.objects.filter(claimable).exclude(image_360='').order_by('id').only(
+        'id', 'image_status', 'processing_started_at'
+    ).first()
+    if viewer is None:
+        return None
+    # Conditional update so two workers never pick up the same viewer
+    claimed = Viewer.objects.filter(
+        pk=viewer.pk, image_status=viewer.image_status, processing_started_at=viewer.processing_started_at
+    ).update(image_status='processing', processing_started_at=timezone.now(), processing_error='')
+    if not claimed:
+        return claim_next_viewer()
+    return Viewer.objects.get(pk=viewer.pk)
+
+
+def write_derivatives(viewer, image):
+    """
+    Store the derivatives of ``image`` and return their (unsaved) rows. If
+    encoding fails part way, the files already written are removed.
+    """
+    derivatives = []
+    try:
+        for name, width, height, content in encode_derivatives(image):
+            derivative = ViewerImageDerivative(viewer=viewer, format=name, width=width, height=height, size=len(content))
+            derivative.file.save(derivative_filename(viewer, name, width), ContentFile(content), save=False)
+            derivatives.append(derivative)
+    except Exception:
+        _discard(None, derivatives)
+        raise
+    return derivatives
+
+
+def _discard(manifest, derivatives):
+    delete_tiles(manifest)
+    for derivative in derivatives:
+        derivative.file.delete(save=False)
+
+
+def process_viewer(viewer):
+    """
+    Build the tile pyramid and derivatives of a claimed viewer and publish
+    them. Returns True when the viewer is ready.
+    """
+    claim = Viewer.objects.filter(
+        pk=viewer.pk, image_360=viewer.image_360.name,
+        image_status='processing', processing_started_at=viewer.processing_started_at,
+    )
+    manifest = None
+    try:
+        # Decoded once for both the tile pyramid and the derivatives
+        image = open_panorama(viewer.image_360)
+        manifest = generate_viewer_tiles(viewer, image)
+        derivatives = write_derivatives(viewer, image)
+    except Exception as e:
+        # Unreadable or truncated upload (OSError), storage failure etc.; nothing partial is kept
+        delete_tiles(manifest)
+        claim.update(image_status='failed', processing_error=str(e) or e.__class__.__name__)
+        return False
+
+    with transaction.atomic():
+        current = claim.select_for_update().only('id', 'tile_manifest').first()
+        if current is None:
+            # The image was replaced (or the viewer deleted or reclaimed) meanwhile
+            _discard(manifest, derivatives)
+            return False
+        viewer.derivatives.all().delete()
+        ViewerImageDerivative.objects.bulk_create(derivatives)
+        claim.update(tile_manifest=manifest, image_status='ready')
+    # Only set when reprocessing a viewer that was already ready
+    delete_tiles(current.tile_manifest)
+
+    viewer.tile_manifest, viewer.image_status = manifest, 'ready'
+    bump_project_content_version(viewer.project_id)
+    return True
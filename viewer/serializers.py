@@ -1,7 +1,13 @@
+import os
+import re
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from project.models import Project, Organisation
-from .models import Viewer, ProjectAccessKey, Tag, ViewerFile
+from .imaging import manifest_urls
+from .models import Viewer, ViewerImageDerivative, ProjectAccessKey, Tag, ViewerFile, ChunkedUpload
+from .uploads import CHUNK_SIZE
 
 User = get_user_model()
 
@@ -13,25 +19,41 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class ViewerImageDerivativeSerializer(serializers.ModelSerializer):
+    url = serializers.FileField(source='file', read_only=True)
+    content_type = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = ViewerImageDerivative
+        fields = ['format', 'content_type', 'width', 'height', 'size', 'url']
+
+
 class ViewerSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     organisation = serializers.PrimaryKeyRelatedField(queryset=Organisation.objects.all())
     project = serializers.PrimaryKeyRelatedField(queryset=Project.objects.all())
     image_360_url = serializers.SerializerMethodField(read_only=True)
+    tiles = serializers.SerializerMethodField(read_only=True)
+    derivatives = ViewerImageDerivativeSerializer(many=True, read_only=True)
 
     class Meta:
         model = Viewer
         fields = [
             'id', 'user', 'organisation', 'project', 'view_name', 'view_date',
-            'image_360', 'image_360_url', 'created_at'
+            'image_360', 'image_360_url', 'image_progressive', 'image_status', 'processing_error', 'tiles', 'derivatives',
+            'created_at'
         ]
-        read_only_fields = ['created_at']
+        read_only_fields = ['image_progressive', 'image_status', 'processing_error', 'created_at']
 
     def get_image_360_url(self, obj):
         if obj.image_360:
             return obj.image_360.url
         return None
 
+    def get_tiles(self, obj):
+        # Preview and tile URLs for progressive loading; None until the image worker has built them
+        return manifest_urls(obj.tile_manifest)
+
     def validate(self, data):
         """Validate that project belongs to organisation."""
         organisation = data.get('organisation')
@@ -51,21 +73,37 @@ class ViewerFileSerializer(serializers.ModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True, required=False)
     tag_names = serializers.SerializerMethodField(read_only=True)
     file_url = serializers.SerializerMethodField(read_only=True)
+    optimized_file_url = serializers.SerializerMethodField(read_only=True)
+    thumbnail_url = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = ViewerFile
         fields = [
             'id', 'user', 'organisation', 'project', 'view_name', 'view_date',
-            'file', 'file_url', 'description', 'tags', 'tag_names', 'created_at'
+            'file', 'file_url', 'optimized_file_url', 'thumbnail_url',
+            'description', 'tags', 'tag_names', 'created_at'
         ]
         read_only_fields = ['created_at']
+        extra_kwargs = {'file': {'write_only': True}}
 
     def get_tag_names(self, obj):
-        return list(obj.tags.values_list('name', flat=True))
+        # Reads the prefetched tags rather than querying per file
+        return [tag.name for tag in obj.tags.all()]
 
     def get_file_url(self, obj):
-        if obj.file:
-            return obj.file.url
+        # Only the sanitized copy is served; the upload may carry scripts
+        if obj.optimized_file:
+            return obj.optimized_file.url
+        return None
+
+    def get_optimized_file_url(self, obj):
+        if obj.optimized_file:
+            return obj.optimized_file.url
+        return None
+
+    def get_thumbnail_url(self, obj):
+        if obj.thumbnail:
+            return obj.thumbnail.url
         return None
 
     def validate(self, data):
@@ -103,6 +141,47 @@ class ProjectAccessKeySerializer(serializers.ModelSerializer):
         read_only_fields = ['access_key']
 
 
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField(read_only=True)
+
+    # target -> (allowed extensions, size limit in bytes or None)
+    TARGET_RULES = {
+        'viewer': (('.jpg', '.jpeg'), lambda: getattr(settings, 'VIEWER_360_MAX_UPLOAD_MB', 25) * 1024 * 1024),
+        'viewer_file': (('.svg',), lambda: getattr(settings, 'VIEWER_SVG_MAX_UPLOAD_MB', 50) * 1024 * 1024),
+    }
+
+    class Meta:
+        model = ChunkedUpload
+        fields = [
+            'id', 'target', 'filename', 'content_type', 'size', 'sha256',
+            'offset', 'chunk_size', 'status', 'object_id', 'created_at'
+        ]
+        read_only_fields = ['offset', 'status', 'object_id', 'created_at']
+
+    def get_chunk_size(self, obj):
+        return CHUNK_SIZE
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError("Must be the hex sha256 of the whole file.")
+        return value
+
+    def validate(self, data):
+        """Reject uploads the target would refuse before any chunk is sent."""
+        extensions, max_size = self.TARGET_RULES[data['target']]
+        ext = os.path.splitext(data['filename'])[1].lower()
+        if ext not in extensions:
+            raise serializers.ValidationError(
+                f"Unsupported file extension '{ext}'. Allowed extensions are: {', '.join(extensions)}."
+            )
+        if data['size'] == 0:
+            raise serializers.ValidationError("File is empty.")
+        if data['size'] > max_size():
+            raise serializers.ValidationError(f"File size should not exceed {max_size() // (1024 * 1024)} MB.")
+        return data
+
+
 # Public serializers (for unauthenticated access)
 class PublicTagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -112,33 +191,55 @@ class PublicTagSerializer(serializers.ModelSerializer):
 
 class PublicViewerSerializer(serializers.ModelSerializer):
     image_360_url = serializers.SerializerMethodField(read_only=True)
+    tiles = serializers.SerializerMethodField(read_only=True)
+    derivatives = ViewerImageDerivativeSerializer(many=True, read_only=True)
 
     class Meta:
         model = Viewer
-        fields = ['id', 'view_name', 'view_date', 'image_360_url', 'created_at']
+        fields = [
+            'id', 'view_name', 'view_date', 'image_360_url', 'image_progressive', 'image_status', 'tiles', 'derivatives',
+            'created_at'
+        ]
 
     def get_image_360_url(self, obj):
         if obj.image_360:
             return obj.image_360.url
         return None
 
+    def get_tiles(self, obj):
+        return manifest_urls(obj.tile_manifest)
+
 
 class PublicViewerFileSerializer(serializers.ModelSerializer):
     tags = PublicTagSerializer(many=True, read_only=True)
     tag_names = serializers.SerializerMethodField(read_only=True)
     file_url = serializers.SerializerMethodField(read_only=True)
+    optimized_file_url = serializers.SerializerMethodField(read_only=True)
+    thumbnail_url = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = ViewerFile
         fields = [
-            'id', 'view_name', 'view_date', 'file_url', 
-            'description', 'tags', 'tag_names', 'created_at'
+            'id', 'view_name', 'view_date', 'file_url', 'optimized_file_url',
+            'thumbnail_url', 'description', 'tags', 'tag_names', 'created_at'
         ]
 
     def get_tag_names(self, obj):
-        return list(obj.tags.values_list('name', flat=True))
+        # Reads the prefetched tags rather than querying per file
+        return [tag.name for tag in obj.tags.all()]
 
     def get_file_url(self, obj):
-        if obj.file:
-            return obj.file.url
-        return None
\ No newline at end of file
+        # Only the sanitized copy is served; the upload may carry scripts
+        if obj.optimized_file:
+            return obj.optimized_file.url
+        return None
+
+    def get_optimized_file_url(self, obj):
+        if obj.optimized_file:
+            return obj.optimized_file.url
+        return None
+
+    def get_thumbnail_url(self, obj):
+        if obj.thumbnail:
+            return obj.thumbnail.url
+        return None
@@ -0,0 +1,95 @@
+"""
+Content-addressed storage for viewer uploads.
+
+Files are named by the sha256 of their content inside the directory
+chosen by the field's upload_to (``viewer/360_images/ab/ab12...ef.jpg``),
+so uploading the same panorama or drawing again, in any project, reuses
+the stored blob instead of writing another copy. StoredBlob counts the
+fields referencing each blob: save() only stores the content, a model
+takes a reference with retain() once a row points at the name and gives
+it up with delete(), which removes the file when the last reference goes. Files stored before content addressing have no
+StoredBlob row and are deleted by path as before. Files are removed after
+the surrounding transaction commits, so a rollback never loses a blob
+its rows still point to.
+
+Because a name always maps to the same bytes, nginx can serve these
+paths with immutable, year-long cache headers (see nginx.txt).
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(os.path.dirname(name), digest[:2], f'{digest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        from .models import StoredBlob
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+
+        with transaction.atomic():
+            # Locked so a concurrent delete() of the last reference waits for this save
+            StoredBlob.objects.select_for_update().get_or_create(
+                name=name, defaults={'size': content.size, 'refcount': 0}
+            )
+            # The file can outlive its row if a transaction that created it rolled back
+            if not self.exists(name):
+                stored = self._save(name, content)
+                if stored != name:
+                    # Another process created the path meanwhile and _save() picked a free name
+                    StoredBlob.objects.get_or_create(name=stored, defaults={'size': content.size, 'refcount': 0})
+                    name = stored
+        return name
+
+    def retain(self, name):
+        """Count one more reference to the blob stored as ``name``."""
+        from .models import StoredBlob
+
+        StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+    def delete(self, name):
+        from .models import StoredBlob
+
+        if not name:
+            return
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.refcount > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return
+            if blob is not None:
+                blob.delete()
+        # Last reference, or a file saved before content addressing. Removed only
+        # once the row's deletion is committed, and not if the same content was
+        # uploaded again in the meantime.
+        transaction.on_commit(lambda: self._delete_unreferenced(name))
+
+    def _delete_unreferenced(self, name):
+        from .models import StoredBlob
+
+        if not StoredBlob.objects.filter(name=name).exists():
+            super().delete(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def viewer_media_storage():
+    return content_addressed_storage
@@ -0,0 +1,182 @@
+"""
+Upload-time processing of ViewerFile SVG drawings.
+
+Uploads are parsed with defusedxml (no entity expansion or external
+references) and rewritten without scripts, event handlers, javascript:
+links, metadata, comments or editor-specific markup, with coordinates
+rounded to VIEWER_SVG_PRECISION decimals. CAD exports are mostly
+redundant precision and metadata, so the result is usually a fraction of
+the upload. The optimized drawing is stored with gzip (and, when the
+``brotli`` package is installed, brotli) siblings for nginx to serve
+precompressed, plus a PNG thumbnail when ``cairosvg`` is installed.
+"""
+import gzip
+import re
+import xml.etree.ElementTree as ET
+
+from defusedxml import DefusedXmlException
+from defusedxml.ElementTree import fromstring
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+
+ET.register_namespace('', SVG_NS)
+ET.register_namespace('xlink', XLINK_NS)
+
+THUMBNAIL_WIDTH = 400
+
+# Elements dropped with everything inside them
+REMOVED_ELEMENTS = {'script', 'metadata', 'foreignObject'}
+
+# Markup written by drawing tools for their own use
+EDITOR_NAMESPACES = (
+    'http://www.inkscape.org/namespaces/inkscape',
+    'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd',
+    'http://ns.adobe.com/',
+    'http://www.bohemiancoding.com/sketch/ns',
+    'http://purl.org/dc/elements/1.1/',
+    'http://creativecommons.org/ns#',
+    'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+)
+
+# Attributes whose numbers are rounded
+NUMERIC_ATTRIBUTES = {
+    'd', 'points', 'transform', 'viewBox', 'x', 'y', 'x1', 'y1', 'x2', 'y2',
+    'cx', 'cy', 'r', 'rx', 'ry', 'dx', 'dy', 'width', 'height', 'stroke-width', 'font-size',
+}
+
+# Elements whose text and child tails are content, not formatting
+TEXT_ELEMENTS = {'text', 'tspan', 'textPath', 'style', 'title', 'desc'}
+
+DECIMAL_RE = re.compile(r'-?(?:\d*\.\d+|\d+\.\d*)(?:[eE][-+]?\d+)?')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class SVGError(ValueError):
+    """The upload is not a well-formed, safe SVG document."""
+
+
+def _split(name):
+    """'{namespace}local' -> ('namespace', 'local')."""
+    if name.startswith('{'):
+        namespace, _, local = name[1:].partition('}')
+        return namespace, local
+    return '', name
+
+
+def _is_editor_markup(name):
+    namespace, _ = _split(name)
+    return namespace.startswith(EDITOR_NAMESPACES)
+
+
+def _round_numbers(value, precision):
+    def replace(match):
+        number = f'{round(float(match.group()), precision):.{precision}f}'.rstrip('0').rstrip('.')
+        number = '0' if number in ('-0', '') else number
+        # Path data may run numbers together ("1.5.5"); "2.0" + ".5" must not become "2.5"
+        if '.' not in number and value.startswith('.', match.end()):
+            number += ' '
+        return number
+    return WHITESPACE_RE.sub(' ', DECIMAL_RE.sub(replace, value)).strip()
+
+
+def _is_unsafe_link(value):
+    return WHITESPACE_RE.sub('', value).lower().startswith(('javascript:', 'vbscript:', 'data:text/html'))
+
+
+def _clean(element, precision, keep_text):
+    for name, value in list(element.attrib.items()):
+        _, local = _split(name)
+        if _is_editor_markup(name) or local.lower().startswith('on'):
+            del element.attrib[name]
+        elif local == 'href' and _is_unsafe_link(value):
+            del element.attrib[name]
+        elif local in NUMERIC_ATTRIBUTES:
+            element.attrib[name] = _round_numbers(value, precision)
+
+    # <set>/<animate> can rewrite an href into a javascript: link
+    _, tag = _split(element.tag)
+    if tag in ('set', 'animate') and element.get('attributeName', '').split(':')[-1] == 'href':
+        return False
+
+    if not keep_text and element.text and not element.text.strip():
+        element.text = None
+
+    child_keeps_text = keep_text or tag in TEXT_ELEMENTS
+    for child in list(element):
+        # The parser has already dropped comments and processing instructions
+        _, child_tag = _split(child.tag)
+        if child_tag in REMOVED_ELEMENTS or _is_editor_markup(child.tag) \
+                or not _clean(child, precision, child_keeps_text):
+            # Keep the text that followed the removed element
+            if child.tail and child.tail.strip():
+                index = list(element).index(child)
+                if index:
+                    previous = element[index - 1]
+                    previous.tail = (previous.tail or '') + child.tail
+                else:
+                    element.text = (element.text or '') + child.tail
+            element.remove(child)
+        elif not child_keeps_text and child.tail and not child.tail.strip():
+            child.tail = None
+    return True
+
+
+def parse_svg(data):
+    """Parse the SVG document ``data`` (bytes) safely and return its root element."""
+    try:
+        root = fromstring(data)
+    except (ET.ParseError, DefusedXmlException) as e:
+        raise SVGError(f"Invalid SVG: {e}")
+    if _split(root.tag) != (SVG_NS, 'svg'):
+        raise SVGError("Invalid SVG: the root element must be <svg>.")
+    return root
+
+
+def optimize_svg(data, precision=None):
+    """Return the sanitized, minified form of the SVG document ``data`` (bytes)."""
+    if precision is None:
+        precision = getattr(settings, 'VIEWER_SVG_PRECISION', 3)
+    root = parse_svg(data)
+    _clean(root, precision, keep_text=False)
+    return ET.tostring(root, encoding='utf-8', xml_declaration=False)
+
+
+def render_thumbnail(svg_data):
+    """PNG thumbnail of an SVG document, or None if cairosvg is unavailable or fails."""
+    if cairosvg is None:
+        return None
+    try:
+        return cairosvg.svg2png(bytestring=svg_data, output_width=THUMBNAIL_WIDTH)
+    except Exception:
+        return None
+
+
+def compressed_siblings(name):
+    """Storage names of the precompressed copies of ``name``."""
+    return [f'{name}.gz', f'{name}.br']
+
+
+def save_compressed_siblings(name, data):
+    """Store gzip and brotli copies of ``data`` next to ``name`` for nginx's *_static modules."""
+    default_storage.save(f'{name}.gz', ContentFile(gzip.compress(data, compresslevel=9, mtime=0)))
+    if brotli is not None:
+        default_storage.save(f'{name}.br', ContentFile(brotli.compress(data, mode=brotli.MODE_TEXT)))
+
+
+def delete_compressed_siblings(name):
+    for sibling in compressed_siblings(name):
+        default_storage.delete(sibling)
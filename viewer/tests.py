@@ -1,3 +1,747 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image, ImageFile
+from rest_framework.test import APIClient
+
+from project.models import Organisation, Project
+from webdjango.pagination import TimeOrderedCursorPagination
+from .imaging import derivative_formats
+from .models import ChunkedUpload, ProjectAccessKey, StoredBlob, Tag, Viewer, ViewerFile, ViewerImageDerivative
+from .processing import claim_next_viewer, process_viewer
+from .storage import content_addressed_storage
+from .svg import optimize_svg, parse_svg
+from .uploads import part_path, write_chunk
+from .validators import validate_360_image, validate_svg_file
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# Query-count tests measure the database only, so keep the cache out of it
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"></svg>'
+
+
+def panorama(width=2048, height=1024, **save_options):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (90, 140, 200)).save(buffer, 'JPEG', **save_options)
+    return SimpleUploadedFile('pano.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+def process_images():
+    """Run the image worker until the queue is empty."""
+    call_command('process_viewer_images', once=True, stdout=io.StringIO())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ViewerTestCase(TestCase):
+    """A user, organisation and project to upload drawings and panoramas into."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='viewer@example.com', password='x')
+        cls.organisation = Organisation.objects.create(name='Org')
+        cls.project = cls.add_project('Project')
+
+    @classmethod
+    def add_project(cls, name):
+        return Project.objects.create(name=name, location='Site', client_name='Client', organisation=cls.organisation)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def add_file(self, name='Drawing', content=SVG, project=None):
+        return ViewerFile.objects.create(
+            user=self.user,
+            organisation=self.organisation,
+            project=project or self.project,
+            view_name=name,
+            view_date=date(2024, 1, 1),
+            file=SimpleUploadedFile('drawing.svg', content, content_type='image/svg+xml'),
+        )
+
+    def create_viewer(self, image=None, process=True):
+        viewer = Viewer.objects.create(
+            user=self.user,
+            organisation=self.organisation,
+            project=self.project,
+            view_name='Lobby',
+            view_date=date(2024, 1, 1),
+            image_360=image or panorama(),
+        )
+        if process:
+            process_images()
+            viewer.refresh_from_db()
+        return viewer
+
+
+class Validate360ImageTests(TestCase):
+    """validate_360_image checks format and dimensions from the headers only."""
+
+    def assertRejected(self, upload, message):
+        with self.assertRaisesMessage(ValidationError, message):
+            validate_360_image(upload)
+
+    def test_accepts_equirectangular_jpeg_without_decoding(self):
+        upload = panorama(2000, 1000, progressive=True)
+        with mock.patch.object(ImageFile.ImageFile, 'load', side_effect=AssertionError('decoded')):
+            validate_360_image(upload)
+        self.assertEqual(upload.tell(), 0)
+
+    def test_rejects_wrong_aspect_ratio(self):
+        self.assertRejected(panorama(1600, 1000), 'equirectangular (2:1)')
+
+    def test_rejects_images_over_the_pixel_budget(self):
+        with override_settings(VIEWER_360_MAX_PIXELS=1000 * 500):
+            self.assertRejected(panorama(2000, 1000), 'the maximum is 500,000')
+
+    def test_rejects_non_jpeg_content_with_jpeg_extension(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 100)).save(buffer, 'PNG')
+        self.assertRejected(SimpleUploadedFile('pano.jpg', buffer.getvalue()), 'must be a JPEG')
+        self.assertRejected(SimpleUploadedFile('pano.jpg', b'not an image'), 'not a valid image')
+
+    def test_rejects_unsupported_colour_mode(self):
+        buffer = io.BytesIO()
+        Image.new('CMYK', (200, 100)).save(buffer, 'JPEG')
+        self.assertRejected(SimpleUploadedFile('pano.jpg', buffer.getvalue()), "colour mode 'CMYK'")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ViewerFileListQueryCountTests(ViewerTestCase):
+    """The viewer file lists must not issue per-file tag queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tags = [
+            Tag.objects.create(name=f'tag-{i}', organisation=cls.organisation, project=cls.project)
+            for i in range(3)
+        ]
+        cls.access_key = ProjectAccessKey.objects.create(organisation=cls.organisation, project=cls.project)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def add_files(self, count):
+        for i in range(count):
+            self.add_file(f'Drawing {i}').tags.set(self.tags)
+
+    def test_viewer_file_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.user)
+        url = '/api/viewer/viewer-files/'
+
+        self.add_files(1)
+        with self.assertNumQueries(2):  # page + tags prefetch
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 1)
+
+        self.add_files(5)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        results = response.json()['results']
+        self.assertEqual(len(results), 6)
+        self.assertEqual(sorted(results[0]['tag_names']), ['tag-0', 'tag-1', 'tag-2'])
+        self.assertEqual(sorted(results[0]['tags']), sorted(tag.pk for tag in self.tags))
+
+    def test_public_svg_files_query_count_is_constant(self):
+        url = f'/api/viewer/public/svg-files/{self.access_key.access_key}/'
+
+        self.add_files(1)
+        cache.clear()
+        with self.assertNumQueries(3):  # access key (with project/organisation), files, tags prefetch
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['svg_files']), 1)
+
+        self.add_files(5)
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        svg_files = response.json()['svg_files']
+        self.assertEqual(len(svg_files), 6)
+        self.assertEqual(sorted(svg_files[0]['tag_names']), ['tag-0', 'tag-1', 'tag-2'])
+
+
+class ViewerFileListPaginationTests(ViewerTestCase):
+    """Cursor pages follow a nearly unique field, so files sharing a view date are not skipped."""
+
+    def test_files_with_the_same_view_date_are_all_paged(self):
+        files = [self.add_file(f'Drawing {i}') for i in range(5)]
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        # DRF steps over rows tied on the cursor field by an offset that gives up at offset_cutoff
+        seen, url = [], '/api/viewer/viewer-files/?page_size=2'
+        with mock.patch.object(TimeOrderedCursorPagination, 'offset_cutoff', 1):
+            # Bounded: a cursor stuck on tied rows serves the same page forever
+            while url and len(seen) <= len(files):
+                data = client.get(url).json()
+                seen += [row['id'] for row in data['results']]
+                url = data['next']
+        self.assertEqual(seen, [viewer_file.pk for viewer_file in reversed(files)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PublicGalleryCacheTests(ViewerTestCase):
+    """Public galleries are served from cache and revalidated with ETag / Last-Modified."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.access_key = ProjectAccessKey.objects.create(organisation=cls.organisation, project=cls.project)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = f'/api/viewer/public/svg-files/{self.access_key.access_key}/'
+
+    def test_repeat_requests_hit_the_cache_and_revalidate(self):
+        self.add_file()
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header('ETag'))
+        self.assertTrue(first.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url)
+        self.assertEqual(again.json(), first.json())
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_content_changes_invalidate_the_etag(self):
+        viewer_file = self.add_file()
+        etag = self.client.get(self.url)['ETag']
+
+        tag = Tag.objects.create(name='new', organisation=self.organisation, project=self.project)
+        viewer_file.tags.add(tag)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['svg_files'][0]['tag_names'], ['new'])
+
+    def test_invalid_access_key(self):
+        response = self.client.get('/api/viewer/public/svg-files/missing/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_changing_an_access_key_evicts_the_old_value(self):
+        old_url = self.url
+        self.assertEqual(self.client.get(old_url).status_code, 200)
+        # A lookup of the new value before it exists caches a miss
+        self.assertEqual(self.client.get('/api/viewer/public/svg-files/renamed/').status_code, 401)
+
+        access_key = ProjectAccessKey.objects.get(pk=self.access_key.pk)
+        access_key.access_key = 'renamed'
+        access_key.save()
+
+        self.assertEqual(self.client.get(old_url).status_code, 401)
+        self.assertEqual(self.client.get('/api/viewer/public/svg-files/renamed/').status_code, 200)
+
+    def test_moving_a_file_refreshes_both_projects(self):
+        other_project = self.add_project('Other')
+        other_key = ProjectAccessKey.objects.create(organisation=self.organisation, project=other_project)
+        other_url = f'/api/viewer/public/svg-files/{other_key.access_key}/'
+        viewer_file = self.add_file()
+        etags = [self.client.get(url)['ETag'] for url in (self.url, other_url)]
+
+        viewer_file = ViewerFile.objects.get(pk=viewer_file.pk)
+        viewer_file.project = other_project
+        viewer_file.save()
+
+        source, target = self.client.get(self.url), self.client.get(other_url)
+        self.assertNotEqual(source['ETag'], etags[0])
+        self.assertNotEqual(target['ETag'], etags[1])
+        self.assertEqual(source.json()['svg_files'], [])
+        self.assertEqual(len(target.json()['svg_files']), 1)
+
+
+class ViewerTilePyramidTests(ViewerTestCase):
+    """The image worker cuts 360 images into a tile pyramid and derivatives."""
+
+    def replace_image(self, viewer):
+        # Different content: the same bytes uploaded again are not a new image
+        viewer.image_360 = panorama(quality=50)
+        viewer.save()
+        process_images()
+        viewer.refresh_from_db()
+
+    def tile_paths(self, manifest):
+        for level in manifest['levels']:
+            for y in range(level['rows']):
+                for x in range(level['columns']):
+                    yield f"{manifest['path']}/{level['level']}/{x}_{y}.jpg"
+
+    def test_upload_is_queued_without_decoding(self):
+        with mock.patch('viewer.processing.open_panorama') as open_panorama:
+            viewer = self.create_viewer(process=False)
+        open_panorama.assert_not_called()
+        self.assertEqual((viewer.image_status, viewer.tile_manifest), ('pending', None))
+        self.assertFalse(viewer.derivatives.exists())
+
+        process_images()
+        viewer.refresh_from_db()
+        self.assertEqual(viewer.image_status, 'ready')
+        self.assertIsNotNone(viewer.tile_manifest)
+
+    def test_progressive_flag_is_recorded_from_the_headers(self):
+        viewer = self.create_viewer(panorama(progressive=True), process=False)
+        self.assertIs(viewer.image_progressive, True)
+        self.replace_image(viewer)
+        self.assertIs(viewer.image_progressive, False)
+
+    def test_pyramid_levels_and_tiles(self):
+        manifest = self.create_viewer().tile_manifest
+
+        self.assertEqual(
+            [(level['width'], level['height'], level['columns'], level['rows']) for level in manifest['levels']],
+            [(512, 256, 1, 1), (1024, 512, 2, 1), (2048, 1024, 4, 2)],
+        )
+        for path in self.tile_paths(manifest):
+            self.assertTrue(default_storage.exists(path), path)
+        self.assertTrue(default_storage.exists(f"{manifest['path']}/preview.jpg"))
+
+        with default_storage.open(f"{manifest['path']}/2/3_1.jpg") as tile:
+            self.assertEqual(Image.open(tile).size, (512, 512))
+
+    def test_replacing_and_deleting_the_image_removes_old_tiles(self):
+        viewer = self.create_viewer()
+        old_manifest = viewer.tile_manifest
+
+        viewer.image_360 = panorama(quality=50)
+        viewer.save()
+        self.assertIsNone(viewer.tile_manifest)
+        self.assertFalse(any(default_storage.exists(path) for path in self.tile_paths(old_manifest)))
+
+        process_images()
+        viewer.refresh_from_db()
+        self.assertNotEqual(viewer.tile_manifest['path'], old_manifest['path'])
+
+        manifest = viewer.tile_manifest
+        viewer.delete()
+        self.assertFalse(any(default_storage.exists(path) for path in self.tile_paths(manifest)))
+
+    def test_stale_claim_is_processed_again(self):
+        viewer = self.create_viewer(process=False)
+        Viewer.objects.filter(pk=viewer.pk).update(
+            image_status='processing', processing_started_at=timezone.now() - timedelta(hours=1)
+        )
+        process_images()
+        viewer.refresh_from_db()
+        self.assertEqual(viewer.image_status, 'ready')
+
+    def test_image_replaced_while_processing_discards_the_stale_result(self):
+        viewer = self.create_viewer(process=False)
+        claimed = claim_next_viewer()
+        viewer.image_360 = panorama()
+        viewer.save()
+
+        self.assertFalse(process_viewer(claimed))
+        self.assertEqual(Viewer.objects.get(pk=viewer.pk).image_status, 'pending')
+        self.assertFalse(ViewerImageDerivative.objects.exists())
+
+    def test_serializer_exposes_tile_urls(self):
+        viewer = self.create_viewer()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/viewer/viewers/{viewer.pk}/')
+        self.assertEqual(response.json()['image_status'], 'ready')
+        tiles = response.json()['tiles']
+        self.assertTrue(tiles['preview_url'].endswith('/preview.jpg'))
+        self.assertIn('{level}/{x}_{y}.jpg', tiles['tile_url_template'])
+        self.assertEqual(len(tiles['levels']), 3)
+        self.assertEqual(
+            {d['content_type'] for d in response.json()['derivatives']},
+            {f'image/{name}' for name in derivative_formats()},
+        )
+
+    def test_derivatives_are_metadata_free_and_never_upscaled(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        viewer = self.create_viewer(panorama(4096, 2048, exif=exif.tobytes(), comment=b'editor'))
+
+        derivatives = list(viewer.derivatives.all())
+        self.assertEqual(
+            {(d.format, d.width, d.height) for d in derivatives},
+            {(name, width, width // 2) for name in derivative_formats() for width in (2048, 4096)},
+        )
+        for derivative in derivatives:
+            with derivative.file.open('rb') as f:
+                data = f.read()
+            self.assertEqual(derivative.size, len(data))
+            image = Image.open(io.BytesIO(data))
+            self.assertFalse(image.getexif())
+            self.assertNotIn('comment', image.info)
+            if derivative.format == 'jpeg':
+                self.assertTrue(image.info.get('progressive'))
+
+    def test_only_jpeg_is_encoded_at_full_width(self):
+        viewer = self.create_viewer(panorama(5000, 2500))
+        self.assertEqual(
+            {(d.format, d.width) for d in viewer.derivatives.all()},
+            {(name, width) for name in derivative_formats() for width in (2048, 4096)} | {('jpeg', 5000)},
+        )
+
+    def use_empty_media_root(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def files_under(self, directory):
+        if not default_storage.exists(directory):
+            return []
+        directories, files = default_storage.listdir(directory)
+        for name in directories:
+            files += self.files_under(f'{directory}/{name}')
+        return files
+
+    def test_unreadable_image_fails_without_leaving_files(self):
+        self.use_empty_media_root()
+        content = panorama().read()
+        viewer = self.create_viewer(SimpleUploadedFile('pano.jpg', content[:len(content) // 2]))
+
+        self.assertEqual((viewer.image_status, viewer.tile_manifest), ('failed', None))
+        self.assertIn('truncated', viewer.processing_error)
+        self.assertFalse(viewer.derivatives.exists())
+        self.assertEqual(self.files_under('viewer/360_tiles'), [])
+
+    def test_encoding_failure_removes_partial_output(self):
+        def failing_encoder(image):
+            yield 'jpeg', 2048, 1024, b'partial'
+            raise OSError('disk full')
+
+        self.use_empty_media_root()
+        with mock.patch('viewer.processing.encode_derivatives', failing_encoder):
+            viewer = self.create_viewer()
+
+        self.assertEqual((viewer.image_status, viewer.processing_error), ('failed', 'disk full'))
+        self.assertEqual(self.files_under('viewer/360_derivatives'), [])
+        self.assertEqual(self.files_under('viewer/360_tiles'), [])
+
+    def test_processing_error_is_not_public(self):
+        with mock.patch('viewer.processing.encode_derivatives', side_effect=OSError('/srv/media is full')):
+            viewer = self.create_viewer()
+        access_key = ProjectAccessKey.objects.create(organisation=self.organisation, project=self.project)
+
+        gallery = APIClient().get(f'/api/viewer/public/360-images/{access_key.access_key}/').json()['360_images']
+        self.assertEqual((gallery[0]['id'], gallery[0]['image_status']), (viewer.pk, 'failed'))
+        self.assertNotIn('processing_error', gallery[0])
+
+    def test_replacing_the_image_replaces_derivatives(self):
+        viewer = self.create_viewer()
+        old = list(viewer.derivatives.all())
+
+        self.replace_image(viewer)
+        self.assertFalse(ViewerImageDerivative.objects.filter(pk__in=[d.pk for d in old]).exists())
+        self.assertFalse(any(default_storage.exists(d.file.name) for d in old))
+
+        files = [d.file.name for d in viewer.derivatives.all()]
+        self.assertTrue(files)
+        viewer.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in files))
+
+
+DIRTY_SVG = b"""<?xml version="1.0"?>
+<!-- Generator: CAD export -->
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+     xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" viewBox="0 0 100.123456 50" onload="alert(1)">
+  <metadata>exported</metadata>
+  <script>alert(1)</script>
+  <g inkscape:label="Layer 1">
+    <path d="M 10.123456 20.987654   L 30.5000001,-0.00001 Z" onclick="steal()"/>
+    <a xlink:href=" javascript:alert(1)"><text x="1.23456">Level <tspan>2</tspan> plan</text></a>
+    <set attributeName="xlink:href" to="javascript:alert(1)"/>
+  </g>
+</svg>"""
+
+
+class OptimizeSVGTests(TestCase):
+    def test_strips_unsafe_and_redundant_markup(self):
+        optimized = optimize_svg(DIRTY_SVG, precision=2).decode()
+        for removed in ('script', 'alert', 'onload', 'onclick', 'metadata', 'inkscape', 'CAD export', '<set'):
+            self.assertNotIn(removed, optimized)
+        self.assertIn('viewBox="0 0 100.12 50"', optimized)
+        self.assertIn('d="M 10.12 20.99 L 30.5,0 Z"', optimized)
+        self.assertIn('<text x="1.23">Level <tspan>2</tspan> plan</text>', optimized)
+        self.assertLess(len(optimized), len(DIRTY_SVG) / 2)
+
+    def test_rounding_keeps_compact_path_numbers_apart(self):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg"><path d="M1.0001.5L2.00004.25-.5"/></svg>'
+        self.assertIn(b'd="M1 0.5L2 0.25-0.5"', optimize_svg(svg, precision=2))
+
+    def test_validator_rejects_entities_and_non_svg(self):
+        bomb = b'<!DOCTYPE svg [<!ENTITY a "aaaa">]><svg xmlns="http://www.w3.org/2000/svg">&a;</svg>'
+        for content in (bomb, b'<html></html>', b'not xml'):
+            with self.assertRaises(ValidationError):
+                validate_svg_file(SimpleUploadedFile('drawing.svg', content))
+        validate_svg_file(SimpleUploadedFile('drawing.svg', DIRTY_SVG))
+
+    def test_validator_parses_without_optimizing(self):
+        with mock.patch('viewer.svg._clean') as clean, mock.patch('viewer.validators.parse_svg', wraps=parse_svg) as parse:
+            validate_svg_file(SimpleUploadedFile('drawing.svg', DIRTY_SVG))
+        parse.assert_called_once_with(DIRTY_SVG)
+        clean.assert_not_called()
+
+
+class ViewerFileProcessingTests(ViewerTestCase):
+    def test_optimized_copy_and_siblings_follow_the_upload(self):
+        viewer_file = self.add_file('Plan', DIRTY_SVG)
+        optimized = viewer_file.optimized_file.name
+        self.assertEqual(ViewerFile.objects.get(pk=viewer_file.pk).optimized_file.name, optimized)
+        with default_storage.open(optimized) as f:
+            self.assertNotIn(b'script', f.read())
+        self.assertTrue(default_storage.exists(f'{optimized}.gz'))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = client.get(f'/api/viewer/viewer-files/{viewer_file.pk}/').json()
+        self.assertTrue(data['optimized_file_url'].endswith('.svg'))
+        self.assertIn('thumbnail_url', data)
+        # The upload, scripts and all, is never handed out
+        self.assertEqual(data['file_url'], data['optimized_file_url'])
+        self.assertNotIn('file', data)
+        access_key = ProjectAccessKey.objects.create(organisation=self.organisation, project=self.project)
+        public = APIClient().get(f'/api/viewer/public/svg-files/{access_key.access_key}/').json()
+        self.assertEqual(public['svg_files'][0]['file_url'], data['optimized_file_url'])
+
+        viewer_file.file = SimpleUploadedFile('plan2.svg', SVG, content_type='image/svg+xml')
+        viewer_file.save()
+        self.assertFalse(default_storage.exists(optimized))
+        self.assertFalse(default_storage.exists(f'{optimized}.gz'))
+
+        replaced = viewer_file.optimized_file.name
+        viewer_file.delete()
+        self.assertFalse(default_storage.exists(replaced))
+        self.assertFalse(default_storage.exists(f'{replaced}.gz'))
+
+
+class ContentAddressedStorageTests(ViewerTestCase):
+    """Identical uploads share one blob, removed with its last reference."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_project = cls.add_project('Other')
+
+    def test_identical_uploads_share_a_blob(self):
+        first = self.add_file()
+        second = self.add_file(project=self.other_project)
+        other = self.add_file(content=SVG.replace(b'10', b'20'), project=self.other_project)
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertRegex(first.file.name, r'^viewer/svg_files/[0-9a-f]{2}/[0-9a-f]{64}\.svg$')
+        self.assertEqual(StoredBlob.objects.get(name=first.file.name).refcount, 2)
+
+        name = first.file.name
+        first.delete()
+        self.assertTrue(content_addressed_storage.exists(name))
+        self.assertEqual(StoredBlob.objects.get(name=name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+            # Kept until the deletion commits
+            self.assertTrue(content_addressed_storage.exists(name))
+        self.assertFalse(content_addressed_storage.exists(name))
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+
+    def test_same_content_uploaded_again_to_the_same_file_is_not_counted(self):
+        viewer_file = self.add_file()
+        name, optimized = viewer_file.file.name, viewer_file.optimized_file.name
+
+        viewer_file.file.save('again.svg', ContentFile(SVG))
+        viewer_file.file = SimpleUploadedFile('again.svg', SVG, content_type='image/svg+xml')
+        viewer_file.save()
+        self.assertEqual(viewer_file.file.name, name)
+        self.assertEqual(StoredBlob.objects.get(name=name).refcount, 1)
+        # Not a new drawing, so not processed again
+        self.assertEqual(viewer_file.optimized_file.name, optimized)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            viewer_file.delete()
+        self.assertFalse(content_addressed_storage.exists(name))
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+
+    def test_save_returns_the_name_the_file_was_written_to(self):
+        wanted = content_addressed_storage.content_name('viewer/svg_files/x.svg', ContentFile(SVG))
+        written = 'viewer/svg_files/elsewhere.svg'
+        with mock.patch.object(content_addressed_storage, '_save', return_value=written):
+            name = content_addressed_storage.save('viewer/svg_files/x.svg', ContentFile(SVG))
+        self.assertEqual(name, written)
+        self.assertTrue(StoredBlob.objects.filter(name=written).exists())
+        self.assertNotEqual(name, wanted)
+
+    def test_rolled_back_delete_keeps_the_blob(self):
+        name = self.add_file().file.name
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                ViewerFile.objects.get(file=name).delete()
+                raise DatabaseError('rolled back')
+
+        self.assertTrue(content_addressed_storage.exists(name))
+        self.assertEqual(StoredBlob.objects.get(name=name).refcount, 1)
+
+    def test_blob_uploaded_again_before_commit_is_kept(self):
+        name = self.add_file().file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            ViewerFile.objects.get(file=name).delete()
+            second = self.add_file(project=self.other_project)
+
+        self.assertEqual(second.file.name, name)
+        self.assertTrue(content_addressed_storage.exists(name))
+
+    def test_files_from_before_content_addressing_are_deleted_by_path(self):
+        legacy_name = default_storage.save('viewer/svg_files/legacy_0123.svg', ContentFile(SVG))
+        viewer_file = self.add_file()
+        ViewerFile.objects.filter(pk=viewer_file.pk).update(file=legacy_name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ViewerFile.objects.get(pk=viewer_file.pk).delete()
+        self.assertFalse(default_storage.exists(legacy_name))
+
+
+@override_settings(CHUNKED_UPLOAD_DIR=os.path.join(MEDIA_ROOT, 'parts'))
+class ChunkedUploadTests(ViewerTestCase):
+    """Uploads sent in chunks, resumed at the stored offset and attached on finalize."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, target, filename, content):
+        response = self.client.post('/api/viewer/uploads/', {
+            'target': target,
+            'filename': filename,
+            'size': len(content),
+            'sha256': hashlib.sha256(content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def put_chunk(self, upload_id, offset, data):
+        return self.client.put(
+            f'/api/viewer/uploads/{upload_id}/chunk/', data,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_resumed_upload_creates_a_viewer(self):
+        content = panorama().read()
+        upload_id = self.start('viewer', 'lobby.jpg', content)
+        half = len(content) // 2
+
+        self.assertEqual(self.put_chunk(upload_id, 0, content[:half]).json()['offset'], half)
+        # A retry at a stale offset is refused with the offset to resume from
+        stale = self.put_chunk(upload_id, 0, content[:half])
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.json()['offset'], half)
+        self.assertEqual(self.client.get(f'/api/viewer/uploads/{upload_id}/').json()['offset'], half)
+
+        early = self.client.post(f'/api/viewer/uploads/{upload_id}/finalize/', {}, format='json')
+        self.assertEqual(early.status_code, 400)
+
+        self.assertEqual(self.put_chunk(upload_id, half, content[half:]).json()['offset'], len(content))
+        response = self.client.post(f'/api/viewer/uploads/{upload_id}/finalize/', {
+            'organisation': self.organisation.pk,
+            'project': self.project.pk,
+            'view_name': 'Lobby',
+            'view_date': '2024-01-01',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        viewer = Viewer.objects.get(pk=response.json()['id'])
+        with viewer.image_360.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(viewer.image_status, 'pending')
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        self.assertEqual((upload.status, upload.object_id), ('completed', viewer.pk))
+        self.assertFalse(os.path.exists(part_path(upload)))
+
+    def test_checksum_mismatch_is_rejected(self):
+        upload_id = self.start('viewer_file', 'plan.svg', SVG)
+        tampered = SVG.replace(b'10', b'99')
+        self.put_chunk(upload_id, 0, tampered)
+        response = self.client.post(f'/api/viewer/uploads/{upload_id}/finalize/', {
+            'organisation': self.organisation.pk,
+            'project': self.project.pk,
+            'view_name': 'Plan',
+            'view_date': '2024-01-01',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ViewerFile.objects.exists())
+
+    def test_missing_part_file_is_a_conflict(self):
+        upload_id = self.start('viewer_file', 'plan.svg', SVG)
+        self.put_chunk(upload_id, 0, SVG)
+        os.remove(part_path(ChunkedUpload.objects.get(pk=upload_id)))
+
+        response = self.client.post(f'/api/viewer/uploads/{upload_id}/finalize/', {}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(ChunkedUpload.objects.get(pk=upload_id).status, 'uploading')
+
+    def test_finalize_runs_once(self):
+        upload_id = self.start('viewer_file', 'plan.svg', SVG)
+        self.put_chunk(upload_id, 0, SVG)
+        fields = {
+            'organisation': self.organisation.pk,
+            'project': self.project.pk,
+            'view_name': 'Plan',
+            'view_date': '2024-01-01',
+        }
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update) as lock:
+            response = self.client.post(f'/api/viewer/uploads/{upload_id}/finalize/', fields, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(any(call.args[0].model is ChunkedUpload for call in lock.call_args_list))
+
+        retry = self.client.post(f'/api/viewer/uploads/{upload_id}/finalize/', fields, format='json')
+        self.assertEqual(retry.status_code, 409)
+        self.assertEqual(ViewerFile.objects.count(), 1)
+
+    def test_chunk_is_written_without_a_row_lock(self):
+        upload_id = self.start('viewer_file', 'plan.svg', SVG)
+
+        def racing_write(upload, offset, stream, length):
+            new_offset = write_chunk(upload, offset, stream, length)
+            # Another request for the same offset finishes first
+            ChunkedUpload.objects.filter(pk=upload.pk).update(offset=new_offset)
+            return new_offset
+
+        with mock.patch('viewer.views.write_chunk', side_effect=racing_write), \
+                mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update) as lock:
+            response = self.put_chunk(upload_id, 0, SVG)
+        self.assertFalse(lock.called)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], len(SVG))
+
+    def test_uploads_are_checked_before_any_chunk(self):
+        response = self.client.post('/api/viewer/uploads/', {
+            'target': 'viewer', 'filename': 'lobby.png', 'size': 10, 'sha256': '0' * 64,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        with override_settings(VIEWER_360_MAX_UPLOAD_MB=1):
+            response = self.client.post('/api/viewer/uploads/', {
+                'target': 'viewer', 'filename': 'lobby.jpg', 'size': 2 * 1024 * 1024, 'sha256': '0' * 64,
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,107 @@
+"""
+Resumable chunked uploads of Viewer 360 images and ViewerFile drawings.
+
+The protocol (ChunkedUploadViewSet):
+
+1. ``POST /api/viewer/uploads/`` with target, filename, size and the
+   sha256 of the whole file creates a ChunkedUpload.
+2. ``PUT /api/viewer/uploads/<id>/chunk/`` with a raw body and an
+   ``Upload-Offset`` header appends a chunk. The body is streamed straight
+   into a part file on local disk, so a worker holds at most one read
+   block of it in memory, and no database lock is held meanwhile: the
+   stored offset only advances afterwards, with a conditional UPDATE.
+   ``GET /api/viewer/uploads/<id>/`` returns the current offset to resume
+   from after a dropped connection.
+3. ``POST /api/viewer/uploads/<id>/finalize/`` with the remaining Viewer /
+   ViewerFile fields checks the size and checksum and creates the object
+   through its usual serializer, with the part file as the upload.
+
+Part files live in CHUNKED_UPLOAD_DIR, which all workers serving the API
+must share.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+
+# Suggested to clients; any chunk up to MAX_CHUNK_SIZE is accepted
+CHUNK_SIZE = 4 * 1024 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Bytes read from the request or the part file at a time
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class ChunkError(ValueError):
+    """A chunk that cannot be appended at the requested offset."""
+
+
+def upload_dir():
+    path = getattr(settings, 'CHUNKED_UPLOAD_DIR', None) or os.path.join(tempfile.gettempdir(), 'viewer_uploads')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def part_path(upload):
+    return os.path.join(upload_dir(), f'{upload.pk}.part')
+
+
+def write_chunk(upload, offset, stream, length):
+    """
+    Write ``length`` bytes of ``stream`` into ``upload``'s part file at
+    ``offset`` and return the new offset. The file is never truncated, as
+    another request may be writing further on: bytes left past the offset
+    by an interrupted attempt are overwritten by the chunks that follow,
+    and the checksum at finalize catches anything else.
+    """
+    if offset != upload.offset:
+        raise ChunkError(f"Expected offset {upload.offset}, got {offset}.")
+    if length > MAX_CHUNK_SIZE:
+        raise ChunkError(f"Chunks may not exceed {MAX_CHUNK_SIZE} bytes.")
+    if offset + length > upload.size:
+        raise ChunkError(f"Chunk ends past the declared size of {upload.size} bytes.")
+
+    # Created if missing but, unlike mode 'wb', never truncated
+    with open(os.open(part_path(upload), os.O_RDWR | os.O_CREAT, 0o666), 'r+b') as part:
+        part.seek(offset)
+        remaining = length
+        while remaining:
+            block = stream.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            part.write(block)
+            remaining -= len(block)
+    if remaining:
+        raise ChunkError(f"Chunk ended after {length - remaining} of {length} bytes.")
+    return offset + length
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discard_part(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+class AssembledUpload(UploadedFile):
+    """
+    A finished part file, handed to serializers and storage like a
+    TemporaryUploadedFile: storage moves it into place instead of copying.
+    """
+
+    def __init__(self, path, name, content_type, size):
+        super().__init__(open(path, 'rb'), name, content_type, size)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
@@ -6,7 +6,8 @@ from .views import (
     PublicSVGFilesAPIView,
     TagViewSet,
     ViewerFileViewSet,
-    ProjectAccessKeyViewSet
+    ProjectAccessKeyViewSet,
+    ChunkedUploadViewSet
 )
 
 router = DefaultRouter()
@@ -14,6 +15,7 @@ router.register(r'tags', TagViewSet, basename='tag')
 router.register(r'viewer-files', ViewerFileViewSet, basename='viewerfile')
 router.register(r'access-keys', ProjectAccessKeyViewSet, basename='projectaccesskey')
 router.register(r'viewers', ViewerViewSet, basename='viewer')
+router.register(r'uploads', ChunkedUploadViewSet, basename='chunkedupload')
 
 urlpatterns = [
     path('public/360-images/<str:access_key>/', Public360ImagesAPIView.as_view(), name='public-360-images'),
@@ -1,21 +1,36 @@
 # viewer/validators.py
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from PIL import Image
 import os
 
+from .svg import SVGError, parse_svg
+
+# Width must be twice the height, within this fraction of the height
+ASPECT_TOLERANCE = 0.01
+
+ALLOWED_MODES = ('RGB', 'L')
+
+
 def validate_360_image(image):
     """
-    Validator to check if uploaded image meets size and format requirements.
+    Validator to check if uploaded image is an equirectangular JPEG within
+    the size, format and dimension limits.
+
+    Only the JPEG headers are read (Pillow opens lazily), so dimensions,
+    mode and format are checked without decoding any pixel data.
 
     Args:
         image: Uploaded file object
 
     Raises:
-        ValidationError: If file size or extension is invalid.
+        ValidationError: If file size, extension, format or dimensions are invalid.
     """
 
-    # Maximum file size in megabytes
-    max_size_mb = 5
+    # Maximum file size in megabytes; clients load the tile pyramid first,
+    # so the full image size no longer bounds first-render latency
+    max_size_mb = getattr(settings, 'VIEWER_360_MAX_UPLOAD_MB', 25)
 
     # Check file size
     if image.size > max_size_mb * 1024 * 1024:
@@ -32,3 +47,73 @@ def validate_360_image(image):
             f"Unsupported file extension '{ext}'. "
             f"Allowed extensions are: {', '.join(valid_extensions)}."
         )
+
+    max_pixels = getattr(settings, 'VIEWER_360_MAX_PIXELS', 12288 * 6144)
+
+    header = read_image_header(image)
+
+    if header['format'] != 'JPEG':
+        raise ValidationError(f"Image must be a JPEG file, not {header['format']}.")
+
+    if header['mode'] not in ALLOWED_MODES:
+        raise ValidationError(f"Unsupported colour mode '{header['mode']}'. Use an RGB or greyscale JPEG.")
+
+    width, height = header['width'], header['height']
+    if abs(width - 2 * height) > height * 2 * ASPECT_TOLERANCE:
+        raise ValidationError(
+            f"360 images must be equirectangular (2:1); got {width}x{height}."
+        )
+
+    if width * height > max_pixels:
+        raise ValidationError(
+            f"Image has {width * height:,} pixels; the maximum is {max_pixels:,}."
+        )
+
+
+def read_image_header(image):
+    """
+    Format, dimensions, colour mode and progressive flag of an uploaded
+    image, read from its headers without decoding pixel data.
+
+    Raises:
+        ValidationError: If the file is not a readable image.
+    """
+    image.seek(0)
+    try:
+        with Image.open(image) as header:
+            return {
+                'format': header.format,
+                'width': header.size[0],
+                'height': header.size[1],
+                'mode': header.mode,
+                # Set by the JPEG plugin for progressive (SOF2) files
+                'progressive': bool(header.info.get('progressive')),
+            }
+    except Image.DecompressionBombError:
+        raise ValidationError("Image dimensions are too large.")
+    except (OSError, SyntaxError):
+        raise ValidationError("Uploaded file is not a valid image.")
+    finally:
+        image.seek(0)
+
+
+def validate_svg_file(file):
+    """
+    Validator to check that an uploaded drawing is a well-formed SVG
+    document, parsed safely (no entity expansion or external references).
+
+    Raises:
+        ValidationError: If the file is not a usable SVG.
+    """
+    ext = os.path.splitext(file.name)[1].lower()
+    if ext != '.svg':
+        raise ValidationError(f"Unsupported file extension '{ext}'. Allowed extensions are: .svg.")
+
+    file.seek(0)
+    try:
+        # Parse only; sanitizing and minifying happen once, in ViewerFile.process_svg()
+        parse_svg(file.read())
+    except SVGError as e:
+        raise ValidationError(str(e))
+    finally:
+        file.seek(0)
@@ -1,16 +1,31 @@
+import os
+
 from rest_framework import viewsets, status, mixins
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.db import transaction
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from webdjango.pagination import cursor_pagination
+from webdjango.streaming import StreamingExportMixin
 
-from .models import Viewer, ProjectAccessKey, Tag, ViewerFile
+from .caching import resolve_access_key, gallery_etag, gallery_last_modified, cached_gallery
+from .models import Viewer, ProjectAccessKey, Tag, ViewerFile, ChunkedUpload
 from .serializers import (
     ViewerSerializer, 
     ProjectAccessKeySerializer,
     TagSerializer,
-    ViewerFileSerializer
+    ViewerFileSerializer,
+    PublicViewerSerializer,
+    PublicViewerFileSerializer,
+    ChunkedUploadSerializer
 )
+from .uploads import AssembledUpload, ChunkError, discard_part, file_sha256, part_path, write_chunk
 
 class TagViewSet(viewsets.ModelViewSet):
     """
@@ -24,7 +39,7 @@ class TagViewSet(viewsets.ModelViewSet):
         """
         Filter tags by organisation and project if provided in query params.
         """
-        queryset = Tag.objects.all()
+        queryset = Tag.objects.order_by('id')
         organisation_id = self.request.query_params.get('organisation_id')
         project_id = self.request.query_params.get('project_id')
         
@@ -35,19 +50,20 @@ class TagViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-class ViewerViewSet(viewsets.ModelViewSet):
+class ViewerViewSet(StreamingExportMixin, viewsets.ModelViewSet):
     """
     Default authenticated API access to Viewer model.
     """
     queryset = Viewer.objects.all()
     serializer_class = ViewerSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = cursor_pagination('-created_at', '-id')
 
     def get_queryset(self):
         """
         Optionally filter by organisation and project if provided in query params.
         """
-        queryset = Viewer.objects.all()
+        queryset = Viewer.objects.prefetch_related('derivatives')
         organisation_id = self.request.query_params.get('organisation_id')
         project_id = self.request.query_params.get('project_id')
         
@@ -58,19 +74,20 @@ class ViewerViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-class ViewerFileViewSet(viewsets.ModelViewSet):
+class ViewerFileViewSet(StreamingExportMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing SVG files.
     """
     queryset = ViewerFile.objects.all()
     serializer_class = ViewerFileSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = cursor_pagination('-created_at', '-id')
 
     def get_queryset(self):
         """
         Optionally filter by organisation and project if provided in query params.
         """
-        queryset = ViewerFile.objects.all()
+        queryset = ViewerFile.objects.prefetch_related('tags')
         organisation_id = self.request.query_params.get('organisation_id')
         project_id = self.request.query_params.get('project_id')
         
@@ -122,6 +139,112 @@ class ViewerFileViewSet(viewsets.ModelViewSet):
         viewer_file.tags.remove(*tag_ids)
         return Response(ViewerFileSerializer(viewer_file).data)
 
+class ChunkedUploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet
+):
+    """
+    Resumable uploads of 360 images and SVG drawings (see viewer/uploads.py).
+    """
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    # target -> (serializer, file field)
+    TARGETS = {
+        'viewer': (ViewerSerializer, 'image_360'),
+        'viewer_file': (ViewerFileSerializer, 'file'),
+    }
+
+    def get_queryset(self):
+        return ChunkedUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        """
+        Append the raw request body at the ``Upload-Offset`` header.
+        """
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "Upload-Offset and Content-Length headers are required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        upload = self.get_object()
+        if upload.status != 'uploading':
+            return Response({"detail": "Upload is already finalized."}, status=status.HTTP_409_CONFLICT)
+        # Written without holding the row: the body may take long to arrive
+        try:
+            new_offset = write_chunk(upload, offset, request.stream, length)
+        except ChunkError as e:
+            return Response({"detail": str(e), "offset": upload.offset}, status=status.HTTP_409_CONFLICT)
+
+        # Conditional update so that of two requests for the same offset only one advances it
+        advanced = ChunkedUpload.objects.filter(pk=upload.pk, status='uploading', offset=offset).update(
+            offset=new_offset, updated_at=timezone.now()
+        )
+        if not advanced:
+            upload.refresh_from_db()
+            return Response(
+                {"detail": "Upload changed while this chunk was being written.", "offset": upload.offset},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({"offset": new_offset, "size": upload.size})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """
+        Verify the assembled file and create the Viewer or ViewerFile from
+        it and the remaining fields in the request body.
+        """
+        with transaction.atomic():
+            # Locked so that a retried finalize waits for this one and then sees it completed
+            upload = self.get_queryset().select_for_update().get(pk=self.get_object().pk)
+            if upload.status != 'uploading':
+                return Response({"detail": "Upload is already finalized."}, status=status.HTTP_409_CONFLICT)
+            if upload.offset != upload.size:
+                return Response(
+                    {"detail": f"Upload is incomplete: {upload.offset} of {upload.size} bytes received.", "offset": upload.offset},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            path = part_path(upload)
+            if not os.path.exists(path):
+                return Response(
+                    {"detail": "Upload data is missing; delete the upload and start again."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if file_sha256(path) != upload.sha256:
+                return Response(
+                    {"detail": "Checksum mismatch; delete the upload and start again."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            serializer_class, file_field = self.TARGETS[upload.target]
+            assembled = AssembledUpload(path, upload.filename, upload.content_type, upload.size)
+            try:
+                data = request.data.copy()
+                data.setdefault('user', upload.user_id)
+                data[file_field] = assembled
+                serializer = serializer_class(data=data, context=self.get_serializer_context())
+                serializer.is_valid(raise_exception=True)
+                instance = serializer.save()
+            finally:
+                assembled.close()
+
+            # Storage moved the part file into place (or already held the same content)
+            discard_part(upload)
+            upload.status = 'completed'
+            upload.object_id = instance.pk
+            upload.save(update_fields=['status', 'object_id', 'updated_at'])
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 class ProjectAccessKeyViewSet(
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
@@ -140,7 +263,7 @@ class ProjectAccessKeyViewSet(
         """
         Filter access keys by organisation and project if provided in query params.
         """
-        queryset = ProjectAccessKey.objects.all()
+        queryset = ProjectAccessKey.objects.order_by('id')
         organisation_id = self.request.query_params.get('organisation_id')
         project_id = self.request.query_params.get('project_id')
         
@@ -151,75 +274,85 @@ class ProjectAccessKeyViewSet(
             
         return queryset
 
+def _invalid_access_key():
+    return Response(
+        {"detail": "Invalid access key."},
+        status=status.HTTP_401_UNAUTHORIZED
+    )
+
+
+def _gallery_payload(access, key, items):
+    return {
+        "project": {
+            "id": access['project_id'],
+            "name": access['project_name']
+        },
+        "organisation": {
+            "id": access['organisation_id'],
+            "name": access['organisation_name']
+        },
+        key: items
+    }
+
+
 class Public360ImagesAPIView(APIView):
     """
     Public access to all 360 images for a project using access_key.
+    Responses are cached per project content version and carry an ETag /
+    Last-Modified, so unchanged galleries are answered with 304.
     """
     permission_classes = [AllowAny]
     authentication_classes = []  # Disable authentication for public access
 
+    @method_decorator(condition(
+        etag_func=lambda request, access_key: gallery_etag('360_images', access_key),
+        last_modified_func=lambda request, access_key: gallery_last_modified(access_key),
+    ))
     def get(self, request, access_key):
-        try:
-            access = ProjectAccessKey.objects.get(access_key=access_key)
-        except ProjectAccessKey.DoesNotExist:
-            return Response(
-                {"detail": "Invalid access key."},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        access = resolve_access_key(access_key)
+        if access is None:
+            return _invalid_access_key()
 
-        viewers = Viewer.objects.filter(
-            project=access.project,
-            organisation=access.organisation
-        ).order_by('-view_date')
+        def build():
+            viewers = Viewer.objects.filter(
+                project_id=access['project_id'],
+                organisation_id=access['organisation_id']
+            ).prefetch_related('derivatives').order_by('-view_date')
+            serializer = PublicViewerSerializer(viewers, many=True, context={'request': request})
+            return _gallery_payload(access, "360_images", list(serializer.data))
 
-        serializer = ViewerSerializer(viewers, many=True, context={'request': request})
-        
-        return Response({
-            "project": {
-                "id": access.project.id,
-                "name": access.project.name
-            },
-            "organisation": {
-                "id": access.organisation.id,
-                "name": access.organisation.name
-            },
-            "360_images": serializer.data
-        })
+        response = Response(cached_gallery('360_images', access, request.get_host(), build))
+        patch_cache_control(response, public=True, no_cache=True)  # always revalidate; answered with 304
+        return response
 
 class PublicSVGFilesAPIView(APIView):
     """
     Public access to all SVG files for a project using access_key.
+    Cached and conditional like Public360ImagesAPIView.
     """
     permission_classes = [AllowAny]
     authentication_classes = []  # Disable authentication for public access
 
+    @method_decorator(condition(
+        etag_func=lambda request, access_key: gallery_etag('svg_files', access_key),
+        last_modified_func=lambda request, access_key: gallery_last_modified(access_key),
+    ))
     def get(self, request, access_key):
-        try:
-            access = ProjectAccessKey.objects.get(access_key=access_key)
-        except ProjectAccessKey.DoesNotExist:
-            return Response(
-                {"detail": "Invalid access key."},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        access = resolve_access_key(access_key)
+        if access is None:
+            return _invalid_access_key()
 
-        viewer_files = ViewerFile.objects.filter(
-            project=access.project,
-            organisation=access.organisation
-        ).order_by('-view_date')
+        def build():
+            viewer_files = ViewerFile.objects.filter(
+                project_id=access['project_id'],
+                organisation_id=access['organisation_id']
+            ).prefetch_related('tags').order_by('-view_date')
+            serializer = PublicViewerFileSerializer(viewer_files, many=True, context={'request': request})
+            return _gallery_payload(access, "svg_files", list(serializer.data))
 
-        serializer = ViewerFileSerializer(viewer_files, many=True, context={'request': request})
-        
-        return Response({
-            "project": {
-                "id": access.project.id,
-                "name": access.project.name
-            },
-            "organisation": {
-                "id": access.organisation.id,
-                "name": access.organisation.name
-            },
-            "svg_files": serializer.data
-        })
+        response = Response(cached_gallery('svg_files', access, request.get_host(), build))
+        patch_cache_control(response, public=True, no_cache=True)  # always revalidate; answered with 304
+        return response
 
 class PublicFileAccessAPIView(APIView):
     """
@@ -229,22 +362,18 @@ class PublicFileAccessAPIView(APIView):
     authentication_classes = []
 
     def get(self, request, access_key, file_type, file_id):
-        try:
-            access = ProjectAccessKey.objects.get(access_key=access_key)
-        except ProjectAccessKey.DoesNotExist:
-            return Response(
-                {"detail": "Invalid access key."},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
+        access = resolve_access_key(access_key)
+        if access is None:
+            return _invalid_access_key()
 
         if file_type == '360_image':
             try:
                 viewer = Viewer.objects.get(
                     id=file_id,
-                    project=access.project,
-                    organisation=access.organisation
+                    project_id=access['project_id'],
+                    organisation_id=access['organisation_id']
                 )
-                serializer = ViewerSerializer(viewer, context={'request': request})
+                serializer = PublicViewerSerializer(viewer, context={'request': request})
                 return Response(serializer.data)
             except Viewer.DoesNotExist:
                 return Response(
@@ -256,10 +385,10 @@ class PublicFileAccessAPIView(APIView):
             try:
                 viewer_file = ViewerFile.objects.get(
                     id=file_id,
-                    project=access.project,
-                    organisation=access.organisation
+                    project_id=access['project_id'],
+                    organisation_id=access['organisation_id']
                 )
-                serializer = ViewerFileSerializer(viewer_file, context={'request': request})
+                serializer = PublicViewerFileSerializer(viewer_file, context={'request': request})
                 return Response(serializer.data)
             except ViewerFile.DoesNotExist:
                 return Response(
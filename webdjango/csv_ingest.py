@@ -0,0 +1,35 @@
+"""
+Incremental CSV ingestion for uploaded files.
+
+Uploads are decoded chunk by chunk and fed to csv.DictReader lazily, so
+reading a CSV never holds more than one chunk (plus the current row) of the
+file in memory.
+"""
+import codecs
+import csv
+
+
+def iter_lines(uploaded_file, encoding='utf-8-sig'):
+    """
+    Yield the text lines of ``uploaded_file`` (an UploadedFile or FieldFile),
+    keeping their line endings so quoted multi-line fields survive.
+
+    Raises UnicodeDecodeError when the content is not valid ``encoding``.
+    A leading UTF-8 byte order mark is dropped.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in uploaded_file.chunks():
+        pending += decoder.decode(chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def csv_dict_reader(uploaded_file, encoding='utf-8-sig'):
+    """Return a csv.DictReader that reads ``uploaded_file`` incrementally."""
+    return csv.DictReader(iter_lines(uploaded_file, encoding))
@@ -0,0 +1,40 @@
+"""
+Project-wide pagination for the DRF API.
+
+Every list endpoint is paginated: limit/offset by default (the
+DEFAULT_PAGINATION_CLASS), keyset cursors for time-ordered resources whose
+history keeps growing. Page sizes are capped so no single response can
+return a whole table; clients that really need everything use the
+streaming export mode (webdjango.streaming.StreamingExportMixin).
+"""
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class DefaultPagination(LimitOffsetPagination):
+    default_limit = DEFAULT_PAGE_SIZE
+    max_limit = MAX_PAGE_SIZE
+
+
+class TimeOrderedCursorPagination(CursorPagination):
+    """
+    Cursor pagination for resources listed by time. Subclasses set
+    ``ordering``; see cursor_pagination() for the common case.
+
+    DRF positions the cursor on the first ordering field only: rows sharing
+    its value are stepped over by an offset, which gives up after
+    ``offset_cutoff`` (1000) rows. The first field must therefore be
+    (nearly) unique, such as a creation timestamp or the id, never a plain
+    date; later fields only fix the order of rows within a page.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+def cursor_pagination(*ordering):
+    """A TimeOrderedCursorPagination subclass ordered by ``ordering`` (nearly unique field first)."""
+    return type('TimeOrderedCursorPagination', (TimeOrderedCursorPagination,), {'ordering': ordering})
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'users',
     'quiz',
     'viewer',
+    'imports',
 
     # packages
     'rest_framework',
@@ -101,6 +102,43 @@ DATABASES = {
     }
 }
 
+# Second connection to the same database. Background import jobs publish their
+# progress through it while the import's own transaction is still open.
+DATABASES['import_progress'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+IMPORT_PROGRESS_DB = 'import_progress'
+
+# The cache must be shared by every gunicorn worker and background worker:
+# cached organisation roles, content versions and the like are invalidated
+# by whichever process changes the data. Redis when REDIS_URL is set,
+# otherwise a table in the main database (`python manage.py createcachetable`).
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+# CSV uploads larger than this (or sent with ?background=1) are queued as
+# ImportJobs and processed by `python manage.py process_import_jobs`.
+IMPORT_JOB_THRESHOLD_BYTES = int(os.getenv('IMPORT_JOB_THRESHOLD_BYTES', 1024 * 1024))
+
+# Queued import uploads are kept here, outside MEDIA_ROOT so they are never
+# served; the web and import-worker processes must share it.
+IMPORT_JOB_DIR = os.getenv('IMPORT_JOB_DIR', os.path.join(BASE_DIR, 'private', 'imports'))
+
+# A running job whose worker has not reported progress for this long is
+# assumed dead and handed to another worker, up to IMPORT_JOB_MAX_ATTEMPTS runs.
+IMPORT_JOB_STALE_SECONDS = int(os.getenv('IMPORT_JOB_STALE_SECONDS', 10 * 60))
+IMPORT_JOB_MAX_ATTEMPTS = int(os.getenv('IMPORT_JOB_MAX_ATTEMPTS', 3))
+
 
 
 # Password validation
@@ -155,6 +193,24 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Use an absolute path for MEDIA_ROOT
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # example path
 
+# Upload caps for Viewer 360 images (viewer/validators.py)
+VIEWER_360_MAX_UPLOAD_MB = int(os.getenv('VIEWER_360_MAX_UPLOAD_MB', 25))
+VIEWER_360_MAX_PIXELS = int(os.getenv('VIEWER_360_MAX_PIXELS', 12288 * 6144))
+
+# Tiles and derivatives of new 360 images are built by
+# `python manage.py process_viewer_images`; a viewer left processing for
+# longer than this (its worker died) is picked up again.
+VIEWER_PROCESSING_STALE_SECONDS = int(os.getenv('VIEWER_PROCESSING_STALE_SECONDS', 15 * 60))
+
+# Decimal places kept in coordinates of optimized SVG drawings (viewer/svg.py)
+VIEWER_SVG_PRECISION = int(os.getenv('VIEWER_SVG_PRECISION', 3))
+
+# Chunked uploads of viewer images and drawings (viewer/uploads.py). Part files
+# are written to CHUNKED_UPLOAD_DIR, which must be shared by all API workers and
+# must not be under MEDIA_ROOT; on MEDIA_ROOT's filesystem finished files are moved, not copied.
+VIEWER_SVG_MAX_UPLOAD_MB = int(os.getenv('VIEWER_SVG_MAX_UPLOAD_MB', 50))
+CHUNKED_UPLOAD_DIR = os.getenv('CHUNKED_UPLOAD_DIR', os.path.join(BASE_DIR, 'upload_parts'))
+
 
 # Add to your settings.py
 
@@ -197,7 +253,10 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # Every list is paginated (see webdjango/pagination.py); time-ordered
+    # resources override this with cursor pagination
+    'DEFAULT_PAGINATION_CLASS': 'webdjango.pagination.DefaultPagination',
 }
 
 
@@ -0,0 +1,64 @@
+"""
+Helpers for streaming large exports without materializing them in memory.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+# Rows fetched and serialized per round trip by StreamingExportMixin
+EXPORT_CHUNK_SIZE = 500
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: write() hands the formatted row back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(filename, header, rows):
+    """
+    Return a StreamingHttpResponse that writes ``header`` and then each row
+    of the ``rows`` iterable (e.g. ``queryset.values_list(...).iterator()``)
+    as CSV, one row at a time.
+    """
+    writer = csv.writer(Echo())
+
+    def generate():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    return StreamingHttpResponse(
+        generate(),
+        content_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+
+class StreamingExportMixin:
+    """
+    ViewSet mixin adding an unpaginated export mode to ``list``:
+    ``?export=ndjson`` streams the whole filtered queryset as
+    newline-delimited JSON, one serialized object per line, reading it
+    from the database in chunks instead of building one giant response.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('export') == 'ndjson':
+            return self.stream_ndjson(self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
+
+    def stream_ndjson(self, queryset):
+        rows = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+        def generate():
+            while chunk := list(islice(rows, EXPORT_CHUNK_SIZE)):
+                for item in self.get_serializer(chunk, many=True).data:
+                    yield json.dumps(item, cls=JSONEncoder) + '\n'
+
+        return StreamingHttpResponse(generate(), content_type='application/x-ndjson')